@@ -29,12 +29,74 @@ py2exe options, to be specified in the options keyword to the setup function:
     optimize - string or int (0, 1, or 2)
 
     includes - list of module names to include
-    packages - list of packages to include with subpackages
+    packages - list of packages to include with subpackages (modules
+               imported by __import__("name") or
+               importlib.import_module("name") calls with a constant
+               name are found without this); entries like
+               '!mylib.*.tests' leave out the subpackages and modules
+               matching the glob pattern
     ignores - list of modules to ignore if they are not found
     excludes - list of module names to exclude
     dll_excludes - list of dlls to exclude
 
     dist_dir - directory where to build the final files
+    archive_format - 'zip' (default) or 'marshal'; 'marshal' writes the
+                     compiled modules into a bundle of marshalled code
+                     objects, which the executables import from faster
+                     than zipimport (needs bundle_files=3 and a zipfile,
+                     not compressed); see py2exe.marshalbundle
+    analysis_cache - if true, reuse the module analysis results of
+                     previous builds for unchanged files
+    stdlib_index - if true, keep the module analysis results of the
+                   standard library in the user cache directory, and
+                   share them between all projects built with the same
+                   Python installation
+    bytecode_cache - if true, keep the compiled modules in the user cache
+                     directory, keyed by the contents of the source, and
+                     reuse them in all builds and projects
+    jobs - number of worker processes to use for the module analysis
+           and the byte compilation
+    analysis - 'bytecode' (default) or 'ast'; 'ast' classifies the
+               imports of source files as unconditional, optional,
+               platform or deferred
+    drop_imports - list of kinds of imports to ignore with analysis='ast'
+    pipeline - if true, put the code objects of the module analysis
+               into the archive instead of compiling the modules again
+               (only with optimize=0)
+    stream - if true, write the modules into the archive while the
+             analysis is still searching (only with optimize=0)
+    watch - if true, keep running after the build, and update the
+            archive and executables when their source files change
+    transform - list of transforms to make the compiled modules smaller:
+                'docstrings' (strip them, like -OO), 'lnotab' (drop the
+                line number tables), 'filenames' and 'constants' (store
+                the filenames and repeated strings once per module);
+                'name=pattern' applies one only to the modules matching
+                the glob pattern, e.g. 'docstrings=mylib' for the mylib
+                package; see py2exe.codetransform
+    trace - if true, run the console and windows scripts with an import
+            tracer, and include the modules they import instead of all
+            the modules they might import (the modules the service, com
+            server and isapi targets, includes and packages need are
+            still included)
+    trace_command - command to run with the import tracer instead of the
+                    scripts, a test suite for example; implies trace
+    target_archives - if true, put the modules only one console or
+                      windows target needs into an archive of its own
+                      next to the shared zipfile, so that small tools
+                      do not have to open a big archive
+    size_report - if true, report the size each module adds to the
+                  build, and save the module graph for later queries
+                  with 'python -m py2exe.depgraph'
+    graph - filename to export the module graph to, with module types,
+            sizes and import edges; DOT if it ends in .dot, else JSON
+    graph_store - filename of an sqlite database to keep the module
+                  graph in during the analysis instead of in memory,
+                  for very large applications; it can be queried with
+                  'python -m py2exe.depgraph' afterwards
+    hook_dirs - list of directories with hook files (hook-<module>.py),
+                which declare hidden imports, modules to exclude, builtin
+                aliases and data files of modules; see py2exe.hooks
     typelibs - list of gen_py generated typelibs to include (XXX more text needed)
 
 Items in the console, windows, service or com_server list can also be
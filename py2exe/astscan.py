@@ -0,0 +1,322 @@
+"""Find the imports of a module by analyzing its syntax tree.
+
+The bytecode scanner in py2exe.mf sees every import in the same way.
+This module produces the same 'events' from the syntax tree of the
+source, but additionally classifies each import:
+
+    unconditional - executed when the module is imported
+    optional      - guarded by a 'try: ... except ImportError:' block,
+                    the module works without it
+    platform      - in a branch of an 'if sys.platform ...' or
+                    'if os.name ...' test that is not taken on the
+                    target platform
+    deferred      - inside a function, only executed when it is called
+
+Import events are (what, args, kind) tuples, all other events are the
+usual (what, args) tuples.  The ast module requires Python 2.6.
+"""
+
+import ast
+import os
+import sys
+
+from py2exe.mf import DYNAMIC_IMPORTERS, dynamic_import_event
+
+UNCONDITIONAL = "unconditional"
+OPTIONAL = "optional"
+PLATFORM = "platform"
+DEFERRED = "deferred"
+
+KINDS = (UNCONDITIONAL, OPTIONAL, PLATFORM, DEFERRED)
+
+# Exceptions which, when caught, make the imports in the try block optional
+_IMPORT_ERRORS = ("ImportError", "Exception", "StandardError", "BaseException")
+
+def _name_of(node):
+    # Return 'a.b.c' for an expression 'a.b.c', or None.
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        value = _name_of(node.value)
+        if value is not None:
+            return value + "." + node.attr
+    return None
+
+def _strings(node):
+    # Return the tuple of strings a Str or a tuple/list of Str nodes
+    # contain, or None.
+    if isinstance(node, ast.Str):
+        return (node.s,)
+    if isinstance(node, (ast.Tuple, ast.List)):
+        result = []
+        for elt in node.elts:
+            if not isinstance(elt, ast.Str):
+                return None
+            result.append(elt.s)
+        return tuple(result)
+    return None
+
+class PlatformTest:
+    """Evaluate 'if' tests on sys.platform and os.name for the target
+    platform.  Tests are evaluated to True, False, or None if the
+    outcome cannot be determined.
+    """
+    def __init__(self, platform=sys.platform, os_name=os.name):
+        self.values = {"sys.platform": platform,
+                       "os.name": os_name}
+
+    def evaluate(self, node):
+        if isinstance(node, ast.BoolOp):
+            values = [self.evaluate(v) for v in node.values]
+            if isinstance(node.op, ast.And):
+                if False in values:
+                    return False
+                if None in values:
+                    return None
+                return True
+            if True in values:
+                return True
+            if None in values:
+                return None
+            return False
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            value = self.evaluate(node.operand)
+            if value is None:
+                return None
+            return not value
+        if isinstance(node, ast.Compare) and len(node.ops) == 1:
+            left, op, right = node.left, node.ops[0], node.comparators[0]
+            if _name_of(right) in self.values:
+                left, right = right, left
+            value = self.values.get(_name_of(left))
+            strings = _strings(right)
+            if value is None or strings is None:
+                return None
+            if isinstance(op, (ast.Eq, ast.In)):
+                return value in strings
+            if isinstance(op, (ast.NotEq, ast.NotIn)):
+                return value not in strings
+            return None
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+               and node.func.attr == "startswith" and len(node.args) == 1:
+            value = self.values.get(_name_of(node.func.value))
+            strings = _strings(node.args[0])
+            if value is None or strings is None:
+                return None
+            for s in strings:
+                if value.startswith(s):
+                    return True
+            return False
+        return None
+
+def _is_dynamic_import(call):
+    # The calls the bytecode scanner recognizes as well: the name as
+    # the only argument, or for import_module() the name and a package.
+    function = _name_of(call.func)
+    if function not in DYNAMIC_IMPORTERS or call.keywords \
+           or getattr(call, "starargs", None) or getattr(call, "kwargs", None):
+        return 0
+    args = call.args
+    if not args or not isinstance(args[0], ast.Str):
+        return 0
+    if len(args) == 1:
+        return 1
+    return len(args) == 2 and function != "__import__" \
+           and isinstance(args[1], (ast.Name, ast.Str))
+
+def _catches_import_error(handler):
+    if handler.type is None:
+        return True
+    if isinstance(handler.type, ast.Tuple):
+        types = handler.type.elts
+    else:
+        types = [handler.type]
+    for t in types:
+        name = _name_of(t)
+        if name is not None and name.split(".")[-1] in _IMPORT_ERRORS:
+            return True
+    return False
+
+def _declared_globals(body):
+    # The names declared global in a function body; the declarations
+    # in the functions and classes nested in it apply to their own
+    # scopes only.
+    result = set()
+    stack = list(body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Global):
+            result.update(node.names)
+        elif not isinstance(node, (ast.FunctionDef, ast.ClassDef, ast.Lambda)):
+            stack.extend(ast.iter_child_nodes(node))
+    return result
+
+class _Context:
+    # The circumstances under which a statement is executed
+    def __init__(self, deferred=0, optional=0, foreign=0):
+        self.deferred = deferred
+        self.optional = optional
+        self.foreign = foreign
+
+    def copy(self, **kw):
+        c = _Context(self.deferred, self.optional, self.foreign)
+        c.__dict__.update(kw)
+        return c
+
+    def kind(self):
+        if self.foreign:
+            return PLATFORM
+        if self.optional:
+            return OPTIONAL
+        if self.deferred:
+            return DEFERRED
+        return UNCONDITIONAL
+
+class _ScopeScanner:
+    # Collects the events of one scope (module, class or function
+    # body); nested scopes are collected to be scanned afterwards,
+    # in the same order the bytecode scanner processes them.
+
+    def __init__(self, scanner, context, is_function, classname=None):
+        self.scanner = scanner
+        self.context = context
+        self.is_function = is_function
+        # The name of the enclosing class, for name mangling
+        self.classname = classname
+        # Names declared global in a function scope
+        self.globals = set()
+        self.nested = []
+
+    def scan(self, body):
+        if not self.is_function:
+            if self.classname is not None:
+                self.store("__module__")
+            if body and isinstance(body[0], ast.Expr) \
+                   and isinstance(body[0].value, ast.Str):
+                self.store("__doc__")
+        else:
+            self.globals = _declared_globals(body)
+        for node in body:
+            self.visit(node, self.context)
+        return self.nested
+
+    def store(self, name):
+        if self.is_function and name not in self.globals:
+            return
+        if self.classname is not None and name.startswith("__") \
+               and not name.endswith("__") and "." not in name:
+            name = "_%s%s" % (self.classname.lstrip("_"), name)
+        self.scanner.events.append(("store", (name,)))
+
+    def visit_list(self, nodes, context):
+        for node in nodes:
+            self.visit(node, context)
+
+    def visit(self, node, context):
+        if isinstance(node, (ast.FunctionDef, ast.Lambda)):
+            if isinstance(node, ast.FunctionDef):
+                self.visit_list(node.decorator_list, context)
+                self.store(node.name)
+            self.visit_list(node.args.defaults, context)
+            # The body runs when the function is called, outside of
+            # any try block around the definition.
+            body = node.body
+            if isinstance(body, ast.AST):
+                body = [ast.Expr(body)]
+            self.nested.append((body, context.copy(deferred=1, optional=0), 1,
+                                self.classname))
+            return
+        if isinstance(node, ast.ClassDef):
+            self.visit_list(node.decorator_list, context)
+            self.visit_list(node.bases, context)
+            self.store(node.name)
+            self.nested.append((node.body, context, 0, node.name))
+            return
+        if node.__class__.__name__ in ("GeneratorExp", "SetComp", "DictComp"):
+            # These have their own scope, which can neither import
+            # modules nor store global names.
+            return
+        if isinstance(node, ast.Call) and _is_dynamic_import(node):
+            # __import__("name") or importlib.import_module("name")
+            event = dynamic_import_event(_name_of(node.func), node.args[0].s)
+            if event is not None:
+                what, args = event
+                self.scanner.events.append((what, args, context.kind()))
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                self.scanner.add_import(None, alias.name, 0, context)
+                if alias.asname:
+                    self.store(alias.asname)
+                else:
+                    self.store(alias.name.split(".")[0])
+            return
+        if isinstance(node, ast.ImportFrom):
+            fromlist = tuple([alias.name for alias in node.names])
+            self.scanner.add_import(fromlist, node.module or "", node.level, context)
+            for alias in node.names:
+                if alias.name != "*":
+                    self.store(alias.asname or alias.name)
+            return
+        if isinstance(node, ast.If):
+            self.visit(node.test, context)
+            value = self.scanner.platform.evaluate(node.test)
+            if value is False:
+                self.visit_list(node.body, context.copy(foreign=1))
+            else:
+                self.visit_list(node.body, context)
+            if value is True:
+                self.visit_list(node.orelse, context.copy(foreign=1))
+            else:
+                self.visit_list(node.orelse, context)
+            return
+        if node.__class__.__name__ in ("TryExcept", "Try"):
+            handlers = node.handlers
+            for handler in handlers:
+                if _catches_import_error(handler):
+                    self.visit_list(node.body, context.copy(optional=1))
+                    break
+            else:
+                self.visit_list(node.body, context)
+            for handler in handlers:
+                self.visit(handler, context)
+            self.visit_list(node.orelse, context)
+            self.visit_list(getattr(node, "finalbody", []), context)
+            return
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            self.store(node.id)
+            return
+        for child in ast.iter_child_nodes(node):
+            self.visit(child, context)
+
+class ImportScanner:
+    def __init__(self, platform=None):
+        self.platform = platform or PlatformTest()
+        self.events = []
+        self.absolute_import = 0
+
+    def add_import(self, fromlist, name, level, context):
+        kind = context.kind()
+        if level > 0:
+            self.events.append(("relative_import", (level, fromlist, name), kind))
+        elif self.absolute_import:
+            self.events.append(("absolute_import", (fromlist, name), kind))
+        else:
+            self.events.append(("import", (fromlist, name), kind))
+
+    def scan(self, tree):
+        for node in tree.body:
+            if isinstance(node, ast.ImportFrom) and node.module == "__future__" \
+                   and "absolute_import" in [alias.name for alias in node.names]:
+                self.absolute_import = 1
+        stack = [(tree.body, _Context(), 0, None)]
+        while stack:
+            body, context, is_function, classname = stack.pop()
+            nested = _ScopeScanner(self, context, is_function, classname).scan(body)
+            nested.reverse()
+            stack.extend(nested)
+        return self.events
+
+def scan_source(source, filename, platform=None):
+    """Return the events for the Python source code."""
+    tree = compile(source, filename, "exec", ast.PyCF_ONLY_AST)
+    return ImportScanner(platform).scan(tree)
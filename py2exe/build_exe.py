@@ -8,7 +8,6 @@
 # Make 'unbuffered' a per-target option
 
 from distutils.core import Command
-from distutils.spawn import spawn
 from distutils.errors import *
 import sys, os, imp, types, stat
 import marshal
@@ -18,9 +17,11 @@ try:
 except NameError:
     from sets import Set as set
 import tempfile
+import time
 import struct
 import re
 import fnmatch
+import glob
 
 is_win64 = struct.calcsize("P") == 8
 
@@ -60,6 +61,61 @@ def imp_find_module(name):
         path = [result[1]]
     return result
 
+def match_any(name, patterns):
+    # true if the dotted name matches one of the glob patterns
+    for pattern in patterns:
+        if fnmatch.fnmatchcase(name, pattern):
+            return True
+    return False
+
+def find_subpackages(package, paths, excludes=()):
+    # Return the names of the package and its subpackages in the
+    # directories, sorted.  Directories without __init__.py and the
+    # subpackages matching one of the exclude patterns are not
+    # walked into.
+    result = []
+    for path in paths:
+        for dirname, dirnames, filenames in os.walk(path):
+            if dirname == path:
+                name = package
+            else:
+                name = package + "." + dirname[len(path)+1:].replace(os.sep, ".")
+            if "__init__.py" not in filenames \
+                   or (name != package and match_any(name, excludes)):
+                del dirnames[:]
+                continue
+            dirnames.sort()
+            result.append(name)
+    result.sort()
+    return result
+
+def walk_packages(roots, excludes=(), threads=4):
+    # Call find_subpackages() for each (package, paths) tuple of
+    # roots, in a few threads since this mostly waits for the file
+    # system, and return the results in the same order.
+    import threading
+    results = [None] * len(roots)
+    todo = range(len(roots))
+    lock = threading.Lock()
+    def worker():
+        while 1:
+            lock.acquire()
+            try:
+                if not todo:
+                    return
+                index = todo.pop(0)
+            finally:
+                lock.release()
+            package, paths = roots[index]
+            results[index] = find_subpackages(package, paths, excludes)
+    workers = [threading.Thread(target=worker)
+               for i in range(min(threads, len(roots)))]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return results
+
 def fancy_split(str, sep=","):
     # a split which also strips whitespace from the items
     # passing a list or tuple will return it unchanged
@@ -167,7 +223,8 @@ class py2exe(Command):
         ("includes=", 'i',
          "comma-separated list of modules to include"),
         ("packages=", 'p',
-         "comma-separated list of packages to include"),
+         "comma-separated list of packages to include; "
+         "'!pattern' leaves out the matching subpackages and modules"),
 
         ("compressed", 'c',
          "create a compressed zipfile"),
@@ -181,14 +238,80 @@ class py2exe(Command):
         ("skip-archive", None,
          "do not place Python bytecode files in an archive, put them directly in the file system"),
 
+        ("archive-format=", None,
+         "format of the shared archive: 'zip' (default) or 'marshal', "
+         "a bundle of marshalled code objects which imports faster"),
+
         ("ascii", 'a',
          "do not automatically include encodings and codecs"),
 
         ('custom-boot-script=', None,
          "Python file that will be run when setting up the runtime environment"),
+
+        ("analysis-cache", None,
+         "reuse the module analysis results of previous builds"),
+
+        ("stdlib-index", None,
+         "share the scan results of the standard library between projects"),
+
+        ("jobs=", 'j',
+         "number of worker processes to use for the module analysis "
+         "and the byte compilation [default: 1]"),
+
+        ("analysis=", None,
+         "how to find the imports of source files: 'bytecode' (default) or 'ast'"),
+        ("drop-imports=", None,
+         "comma-separated kinds of imports to ignore with --analysis=ast: "
+         "optional, platform, deferred"),
+
+        ("pipeline", None,
+         "put the code objects of the module analysis into the archive "
+         "instead of compiling the modules again"),
+
+        ("size-report", None,
+         "report the size each module adds to the build, including the "
+         "modules only it pulls in"),
+
+        ("graph=", None,
+         "export the module graph to this file, as DOT if the name ends "
+         "in .dot, as JSON otherwise"),
+
+        ("graph-store=", None,
+         "keep the module graph in this sqlite database instead of in memory"),
+
+        ("stream", None,
+         "write the archive while the modules are searched"),
+
+        ("watch", None,
+         "keep running after the build, and update it when source files change"),
+
+        ("target-archives", None,
+         "put the modules only one console or windows target needs into "
+         "an archive of its own"),
+
+        ("bytecode-cache", None,
+         "keep the compiled modules in a cache shared by all builds"),
+
+        ("transform=", None,
+         "comma-separated transforms for the compiled modules: docstrings, "
+         "lnotab, filenames, constants; 'name=pattern' limits one to "
+         "the matching modules"),
+
+        ("trace", None,
+         "run the console and windows scripts, and include the modules "
+         "they import instead of all the modules they might import"),
+
+        ("trace-command=", None,
+         "command to run with the import tracer instead of the scripts; "
+         "implies --trace"),
+
+        ("hook-dirs=", None,
+         "comma-separated list of directories with additional hook files"),
         ]
 
-    boolean_options = ["compressed", "xref", "ascii", "skip-archive"]
+    boolean_options = ["compressed", "xref", "ascii", "skip-archive",
+                       "analysis-cache", "stdlib-index", "pipeline", "size-report", "stream",
+                       "target-archives", "watch", "trace", "bytecode-cache"]
 
     def initialize_options (self):
         self.xref =0
@@ -204,11 +327,53 @@ class py2exe(Command):
         self.typelibs = None
         self.bundle_files = 3
         self.skip_archive = 0
+        self.archive_format = "zip"
         self.ascii = 0
         self.custom_boot_script = None
+        self.analysis_cache = 0
+        self.stdlib_index = 0
+        self.jobs = 1
+        self.analysis = "bytecode"
+        self.drop_imports = None
+        self.pipeline = 0
+        self.size_report = 0
+        self.graph = None
+        self.hook_dirs = None
+        self.stream = 0
+        self.stream_archive = None
+        self.graph_store = None
+        self.target_archives = 0
+        self.target_modules = {}
+        self.watch = 0
+        self.trace = 0
+        self.trace_command = None
+        self.bytecode_cache = 0
+        self.transform = None
 
     def finalize_options (self):
         self.optimize = int(self.optimize)
+        self.jobs = int(self.jobs)
+        if self.jobs < 1:
+            raise DistutilsOptionError("jobs must be at least 1, not %s" % self.jobs)
+        if self.analysis not in ("bytecode", "ast"):
+            raise DistutilsOptionError("analysis must be 'bytecode' or 'ast', not %r"
+                                       % self.analysis)
+        self.drop_imports = fancy_split(self.drop_imports)
+        for kind in self.drop_imports:
+            if kind not in ("optional", "platform", "deferred"):
+                raise DistutilsOptionError("invalid kind of import to drop: %r" % kind)
+        if self.drop_imports and self.analysis != "ast":
+            raise DistutilsOptionError("drop-imports requires analysis=ast")
+        if self.analysis == "ast":
+            try:
+                import ast
+            except ImportError:
+                raise DistutilsOptionError("analysis=ast requires Python 2.6 or later")
+        if self.graph_store:
+            try:
+                import sqlite3
+            except ImportError:
+                raise DistutilsOptionError("graph-store requires the sqlite3 module")
         self.excludes = fancy_split(self.excludes)
         self.includes = fancy_split(self.includes)
         self.ignores = fancy_split(self.ignores)
@@ -220,14 +385,56 @@ class py2exe(Command):
                 raise DistutilsOptionError("can't compress when skipping archive")
             if self.distribution.zipfile is None:
                 raise DistutilsOptionError("zipfile cannot be None when skipping archive")
+        if self.archive_format not in ("zip", "marshal"):
+            raise DistutilsOptionError("archive-format must be 'zip' or 'marshal', not %r"
+                                       % self.archive_format)
+        if self.archive_format == "marshal":
+            if self.skip_archive or self.distribution.zipfile is None:
+                raise DistutilsOptionError("archive-format=marshal needs a shared zipfile")
+            if self.bundle_files < 3:
+                raise DistutilsOptionError("archive-format=marshal cannot bundle dlls, "
+                                           "use bundle-files=3")
+            if self.compressed:
+                raise DistutilsOptionError("a marshal bundle cannot be compressed")
+            if self.stream or self.watch or self.target_archives:
+                raise DistutilsOptionError("archive-format=marshal cannot be used with "
+                                           "stream, watch or target-archives")
+        if self.target_archives:
+            if self.skip_archive or self.distribution.zipfile is None:
+                raise DistutilsOptionError("target-archives needs a shared zipfile")
+            if self.stream:
+                raise DistutilsOptionError("target-archives cannot be used with stream")
+        if self.watch:
+            if self.skip_archive or self.distribution.zipfile is None:
+                raise DistutilsOptionError("watch needs a shared zipfile")
+            if self.target_archives:
+                raise DistutilsOptionError("watch cannot be used with target-archives")
+        self.transform = fancy_split(self.transform)
+        from py2exe import codetransform
+        try:
+            self.transform_rules = codetransform.parse_rules(self.transform)
+        except ValueError, details:
+            raise DistutilsOptionError(str(details))
+        if self.transform and self.stream:
+            raise DistutilsOptionError("transform cannot be used with stream")
+        if self.trace_command:
+            self.trace = 1
+        if self.trace and (self.watch or self.target_archives or self.stream):
+            raise DistutilsOptionError("trace cannot be used with watch, target-archives "
+                                       "or stream")
         # includes is stronger than excludes
         for m in self.includes:
             if m in self.excludes:
                 self.excludes.remove(m)
         self.packages = fancy_split(self.packages)
+        # '!mylib.*.tests' leaves out parts of the packages
+        self.package_excludes = [p[1:] for p in self.packages if p.startswith("!")]
+        self.packages = [p for p in self.packages if not p.startswith("!")]
         self.set_undefined_options('bdist',
                                    ('dist_dir', 'dist_dir'))
         self.dll_excludes = [x.lower() for x in fancy_split(self.dll_excludes)]
+        from py2exe.hooks import HookRegistry
+        self.hooks = HookRegistry(fancy_split(self.hook_dirs))
 
     def run(self):
         build = self.reinitialize_command('build')
@@ -258,6 +465,8 @@ class py2exe(Command):
                           for target in dist.windows + dist.console]
 
         mf = self.create_modulefinder()
+        if self.stream:
+            self.start_stream(mf)
 
         # These are the name of a script, but used as a module!
         for f in dist.isapi:
@@ -292,13 +501,45 @@ class py2exe(Command):
 
         print "*** searching for required modules ***"
         self.find_needed_modules(mf, required_files, required_modules)
+        self.apply_hook_excludes(mf)
+
+        if self.trace:
+            print "*** tracing the imports ***"
+            self.apply_import_trace(mf, required_files, required_modules)
 
         print "*** parsing results ***"
         py_files, extensions, builtins = self.parse_mf_results(mf)
+        mf.close()
+
+        if mf._dropped_imports:
+            counts = {}
+            for caller, what, args, kind in mf._dropped_imports:
+                counts[kind] = counts.get(kind, 0) + 1
+                if self.verbose > 1:
+                    print "  ignoring %s import in %s: %s" % (kind, caller, args)
+            print "ignored %s" % ", ".join(["%d %s" % (n, kind)
+                                            for kind, n in sorted(counts.items())]),
+            print "imports"
+
+        if mf.use_compiled:
+            print "compiled files reused: %d, source files compiled: %d" % \
+                  (mf.compiled_hits, mf.compiled_misses)
+        if self.analysis_cache:
+            mf.cache.save()
+            print "analysis cache: %d files reused, %d files scanned" % \
+                  (mf.cache.hits, mf.cache.misses)
+        if self.stdlib_index:
+            mf.stdlib_index.save()
+            print "standard library index: %d files reused, %d files scanned" % \
+                  (mf.stdlib_index.hits, mf.stdlib_index.misses)
 
         if self.xref:
             mf.create_xref()
 
+        if self.target_archives:
+            print "*** searching for the modules of each target ***"
+            self.target_modules = self.find_target_modules(mf, required_modules)
+
         print "*** finding dlls needed ***"
         alldlls = self.find_dlls(extensions)
         dlls = set()
@@ -311,7 +552,22 @@ class py2exe(Command):
         # should we filter self.other_depends in the same way?
         self.plat_finalize(mf.modules, py_files, extensions, dlls)
         print "*** create binaries ***"
-        self.create_binaries(py_files, extensions, dlls)
+        self.create_binaries(py_files, extensions, dlls, mf)
+        self.copy_hook_data_files(mf)
+
+        if self.size_report or self.graph:
+            graph = self.create_depgraph(mf, py_files, extensions)
+            if self.size_report:
+                filename = os.path.join(self.bdist_dir, "depgraph.dat")
+                graph.save(filename)
+                print "*** module sizes ***"
+                graph.report(top=25)
+                print "module graph saved, query it with"
+                print "  python -m py2exe.depgraph %s -x <module>" % filename
+            if self.graph:
+                print "writing module graph to %s" % self.graph
+                if not self.dry_run:
+                    graph.write(self.graph)
 
         self.fix_badmodules(mf)
 
@@ -319,6 +575,15 @@ class py2exe(Command):
             print "The following modules appear to be missing"
             print mf.any_missing()
 
+        if self.watch:
+            from py2exe.watch import Watcher
+            Watcher(self, mf).run()
+
+        if mf.store is not None:
+            mf.store.close()
+            print "module graph stored in %s, query it with" % mf.store.filename
+            print "  python -m py2exe.depgraph %s" % mf.store.filename
+
         if self.other_depends:
             print
             print "*** binary dependencies ***"
@@ -335,52 +600,221 @@ class py2exe(Command):
         from modulefinder import ReplacePackage
         from py2exe.mf import ModuleFinder
         ReplacePackage("_xmlplus", "xml")
-        return ModuleFinder(excludes=self.excludes)
+        cache = None
+        if self.analysis_cache:
+            from py2exe.mfcache import ScanCache
+            cache = ScanCache(os.path.join(self.bdist_dir,
+                                           "mf-cache-%d.%d" % sys.version_info[:2]),
+                              variant=self.analysis)
+        elif self.target_archives or self.trace:
+            # The analyses of the targets replay the scan results of
+            # the main analysis.
+            from py2exe.mfcache import ScanCache
+            cache = ScanCache(variant=self.analysis)
+        stdlib_index = None
+        if self.stdlib_index:
+            from py2exe.mfcache import StdlibIndex
+            stdlib_index = StdlibIndex(variant=self.analysis)
+        store = None
+        if self.graph_store:
+            from py2exe.graphstore import GraphStore
+            store = GraphStore(self.graph_store, clear=not self.dry_run)
+        # The code objects are only needed after the analysis when they
+        # go into the archive.
+        return ModuleFinder(excludes=self.excludes, cache=cache,
+                            stdlib_index=stdlib_index, jobs=self.jobs,
+                            analysis=self.analysis, drop_imports=self.drop_imports,
+                            keep_code=self.pipeline, hooks=self.hooks, store=store)
+
+    def analyse_again(self, mf):
+        # Return a new ModuleFinder for another analysis, which uses
+        # the scan results and path index of the main analysis.
+        from py2exe.mf import ModuleFinder
+        return ModuleFinder(excludes=self.excludes, cache=mf.cache,
+                            stdlib_index=mf.stdlib_index,
+                            path_index=mf.path_index, analysis=self.analysis,
+                            drop_imports=self.drop_imports, keep_code=0,
+                            hooks=self.hooks)
+
+    def find_common_modules(self, mf, required_modules):
+        # Analyse what everything except the console and windows
+        # targets needs, and return the ModuleFinder.
+        common = self.analyse_again(mf)
+        for f in self.distribution.isapi:
+            common.load_file(f.script)
+        self.find_needed_modules(common, [], required_modules)
+        common.apply_hook_excludes()
+        return common
+
+    def apply_import_trace(self, mf, required_files, required_modules):
+        # Run the scripts (or the trace command) with the import
+        # tracer, and remove the modules they did not import from the
+        # graph, except for what the other targets, the boot scripts,
+        # the includes and packages need.  Modules only the trace found
+        # are added.
+        from py2exe import importtrace
+        if self.trace_command:
+            import shlex
+            commands = [shlex.split(self.trace_command, posix=(os.name != "nt"))]
+        else:
+            commands = [[sys.executable, script] for script in required_files]
+        startup, traced = importtrace.run_traced(commands,
+                                                 os.path.join(self.temp_dir, "importtrace"),
+                                                 path=mf.path, verbose=self.verbose)
+        # Modules which were imported at startup, by the site module
+        # for example, are only included if the scripts need them.
+        added = []
+        for name in sorted(traced - startup):
+            if name in mf.modules or name in self.excludes:
+                continue
+            try:
+                mf.import_hook(name)
+            except ImportError:
+                self.warn("traced module %s not found" % name)
+                continue
+            added.append(name)
+        common = self.find_common_modules(mf, required_modules)
+        keep = set([name for name in traced if name in mf.modules])
+        keep.update(common.modules.keys())
+        keep.add("__main__")
+        for hook in mf.hooks.loaded():
+            if hook.name in keep:
+                keep.update(mf.reachable(hook.hiddenimports))
+        # the modules the trace found add what they import
+        keep.update(mf.reachable(added))
+        removed = mf.retain(keep)
+        removed.sort()
+        print "import trace: %d modules imported, %d added, %d left out" % \
+              (len(traced), len(added), len(removed))
+        if self.verbose:
+            for name in added:
+                print "  + %s" % name
+            for name in removed:
+                print "  - %s" % name
+
+    def find_target_modules(self, mf, required_modules):
+        # Analyse what everything except the console and windows
+        # targets needs, and each of these targets on its own.
+        # Returns a dictionary mapping the targets to the names of the
+        # modules only they need.
+        dist = self.distribution
+        common = self.find_common_modules(mf, required_modules)
+        needed_by = {}
+        targets = dist.console + dist.windows
+        for target in targets:
+            target_mf = self.analyse_again(mf)
+            target_mf.run_script(target.script)
+            target_mf.apply_hook_excludes()
+            for name in target_mf.modules.keys():
+                needed_by.setdefault(name, []).append(target)
+
+        python_types = (imp.PY_SOURCE, imp.PY_COMPILED, imp.PKG_DIRECTORY)
+        private = {}
+        # Sorted, so that packages come before their submodules; a
+        # module can only go into the target archive if its package
+        # does, zipimport does not look for the submodules of a
+        # package in other archives.
+        names = needed_by.keys()
+        names.sort()
+        for name in names:
+            if name == "__main__" or name in common.modules \
+                   or len(needed_by[name]) > 1 \
+                   or mf._types.get(name) not in python_types:
+                continue
+            target = needed_by[name][0]
+            parent = name[:name.rfind(".")]
+            if "." in name and private.get(parent) is not target:
+                continue
+            private[name] = target
+        result = {}
+        for target in targets:
+            result[target] = []
+        for name, target in private.items():
+            result[target].append(name)
+        for target in targets:
+            result[target].sort()
+            print "%s: %d modules of its own" % (target.get_dest_base(),
+                                                  len(result[target]))
+        return result
+
+    def start_stream(self, mf):
+        # Write the modules into the archive as soon as the analysis
+        # has found them, see py2exe.streamzip.
+        if not (__debug__ and self.optimize == 0):
+            print "optimize=%d needs another compile, stream is disabled" % \
+                  self.optimize
+            return
+        if self.skip_archive or self.dry_run:
+            return
+        from py2exe.streamzip import StreamingArchive
+        if self.compressed:
+            compression = zipfile.ZIP_DEFLATED
+        else:
+            compression = zipfile.ZIP_STORED
+        self.stream_archive = StreamingArchive(self.get_archive_name(),
+                                               compression=compression,
+                                               get_code=mf.get_code,
+                                               verbose=self.verbose)
+        mf.listener = self.stream_archive.add_module
+
+    def apply_hook_excludes(self, mf):
+        # The hooks exclude modules only from the point on where they
+        # are loaded; remove what was found before.
+        removed = mf.apply_hook_excludes()
+        if not removed:
+            return
+        removed.sort()
+        print "hooks: %d modules excluded after they were found" % len(removed)
+        if self.verbose:
+            for name in removed:
+                print "  - %s" % name
+        if self.stream_archive is not None:
+            # dropped from the archive when it is closed
+            self.stream_archive.remove_modules(removed)
 
     def fix_badmodules(self, mf):
-        # This dictionary maps additional builtin module names to the
-        # module that creates them.
+        # The hooks of the modules found map additional builtin module
+        # names to the module that creates them.
         # For example, 'wxPython.misc' creates a builtin module named
         # 'miscc'.
-        builtins = {"clip_dndc": "wxPython.clip_dnd",
-                    "cmndlgsc": "wxPython.cmndlgs",
-                    "controls2c": "wxPython.controls2",
-                    "controlsc": "wxPython.controls",
-                    "eventsc": "wxPython.events",
-                    "filesysc": "wxPython.filesys",
-                    "fontsc": "wxPython.fonts",
-                    "framesc": "wxPython.frames",
-                    "gdic": "wxPython.gdi",
-                    "imagec": "wxPython.image",
-                    "mdic": "wxPython.mdi",
-                    "misc2c": "wxPython.misc2",
-                    "miscc": "wxPython.misc",
-                    "printfwc": "wxPython.printfw",
-                    "sizersc": "wxPython.sizers",
-                    "stattoolc": "wxPython.stattool",
-                    "streamsc": "wxPython.streams",
-                    "utilsc": "wxPython.utils",
-                    "windows2c": "wxPython.windows2",
-                    "windows3c": "wxPython.windows3",
-                    "windowsc": "wxPython.windows",
-                    }
+        builtins = mf.hooks.aliases()
+        ignores = self.ignores + mf.hooks.ignores()
 
         # Somewhat hackish: change modulefinder's badmodules dictionary in place.
         bad = mf.badmodules
         # mf.badmodules is a dictionary mapping unfound module names
-        # to another dictionary, the keys of this are the module names
-        # importing the unknown module.  For the 'miscc' module
-        # mentioned above, it looks like this:
-        # mf.badmodules["miscc"] = { "wxPython.miscc": 1 }
+        # to the set of the module names importing the unknown module.
+        # For the 'miscc' module mentioned above, it looks like this:
+        # mf.badmodules["miscc"] = set(["wxPython.miscc"])
         for name in mf.any_missing():
-            if name in self.ignores:
+            if name in ignores:
                 del bad[name]
                 continue
             mod = builtins.get(name, None)
             if mod is not None:
-                if mod in bad[name] and bad[name] == {mod: 1}:
+                if bad[name] == set([mod]):
                     del bad[name]
 
+    def copy_hook_data_files(self, mf):
+        # Copy the data files the hooks of the modules found ask for.
+        for hook in mf.hooks.loaded():
+            m = mf.modules.get(hook.name)
+            if m is None or not m.__file__ or not hook.datafiles:
+                continue
+            if m.__path__:
+                src_dir = m.__path__[0]
+            else:
+                src_dir = os.path.dirname(m.__file__)
+            print "*** copy data files of %s ***" % hook.name
+            for target, patterns in hook.datafiles:
+                dst_dir = os.path.join(self.exe_dir, target)
+                self.mkpath(dst_dir)
+                for pattern in patterns:
+                    for src in glob.glob(os.path.join(src_dir, pattern)):
+                        dst = os.path.join(dst_dir, os.path.basename(src))
+                        self.copy_file(src, dst, preserve_mode=0)
+                        self.lib_files.append(dst)
+
     def find_dlls(self, extensions):
         dlls = [item.__file__ for item in extensions]
 ##        extra_path = ["."] # XXX
@@ -505,17 +939,52 @@ class py2exe(Command):
             # Make sure they will be included into the zipfile.
             self.compiled_files.append(os.path.basename(dst))
 
-    def create_binaries(self, py_files, extensions, dlls):
+    def create_binaries(self, py_files, extensions, dlls, mf=None):
         dist = self.distribution
 
+        code_files = {}
+        if self.stream_archive is not None:
+            # the modules already in the archive
+            streamed = self.stream_archive.modules
+            py_files = [item for item in py_files
+                        if streamed.get(item.__name__) is None]
+            print "%d modules streamed during the analysis, %d to compile" % \
+                  (len(streamed), len(py_files))
+        elif self.pipeline and mf is not None:
+            if __debug__ and self.optimize == 0:
+                py_files, code_files = self.pipe_code_objects(mf, py_files)
+            else:
+                print "optimize=%d needs another compile, pipeline is disabled" % \
+                      self.optimize
+        py_files, zipped = self.zipped_code_files(py_files)
+        code_files.update(zipped)
+
         # byte compile the python modules into the target directory
         print "*** byte compile python files ***"
+        cache = None
+        if self.bytecode_cache:
+            from py2exe.bytecache import BytecodeCache
+            cache = BytecodeCache()
         self.compiled_files = byte_compile(py_files,
                                            target_dir=self.collect_dir,
                                            optimize=self.optimize,
                                            force=0,
                                            verbose=self.verbose,
-                                           dry_run=self.dry_run)
+                                           dry_run=self.dry_run,
+                                           jobs=self.jobs,
+                                           cache=cache)
+        if cache is not None:
+            cache.trim()
+            total = cache.hits + cache.misses
+            print "bytecode cache: %d of %d files reused (%d%%)" % \
+                  (cache.hits, total, total and 100 * cache.hits // total)
+        compiled_files = code_files.keys()
+        compiled_files.sort()
+        self.compiled_files.extend(compiled_files)
+
+        if self.transform_rules:
+            print "*** transform compiled modules ***"
+            self.transform_compiled_files(self.compiled_files, code_files)
 
         self.lib_files = []
         self.console_exe_files = []
@@ -527,18 +996,19 @@ class py2exe(Command):
         self.copy_dlls(dlls)
 
         # create the shared zipfile containing all Python modules
-        if dist.zipfile is None:
-            fd, archive_name = tempfile.mkstemp()
-            os.close(fd)
+        if self.stream_archive is not None:
+            arcname = self.finish_stream(base_dir=self.collect_dir,
+                                         files=self.compiled_files,
+                                         data=code_files)
+        elif self.target_modules:
+            arcname = self.make_target_archives(mf, code_files)
         else:
-            archive_name = os.path.join(self.lib_dir,
-                                        os.path.basename(dist.zipfile))
-
-        arcname = self.make_lib_archive(archive_name,
-                                        base_dir=self.collect_dir,
-                                        files=self.compiled_files,
-                                        verbose=self.verbose,
-                                        dry_run=self.dry_run)
+            arcname = self.make_lib_archive(self.get_archive_name(),
+                                            base_dir=self.collect_dir,
+                                            files=self.compiled_files,
+                                            verbose=self.verbose,
+                                            dry_run=self.dry_run,
+                                            data=code_files)
         if dist.zipfile is not None:
             self.lib_files.append(arcname)
 
@@ -826,10 +1296,26 @@ class py2exe(Command):
         boot_code = compile(file(boot, "U").read(),
                             os.path.abspath(boot), "exec")
         code_objects = [boot_code]
+        if self.archive_format == "marshal":
+            # before anything else, the boot script imports from the
+            # archive too
+            from py2exe import marshalbundle
+            code_objects.insert(0, marshalbundle.boot_code(os.path.basename(arcname)))
         if self.bundle_files < 3:
             code_objects.append(
                 compile("import zipextimporter; zipextimporter.install()",
                         "<install zipextimporter>", "exec"))
+        target_archive = getattr(target, "target_archive", None)
+        if target_archive:
+            # Look into the archive of the target before the shared
+            # archive, which is the first entry of sys.path.
+            shared = os.path.basename(arcname)
+            code_objects.append(
+                compile("import sys\n"
+                        "if sys.path[0].endswith(%r):\n"
+                        "    sys.path.insert(0, sys.path[0][:-%d] + %r)\n"
+                        % (shared, len(shared), target_archive),
+                        "<target archive>", "exec"))
         for var_name, var_val in vars.iteritems():
             code_objects.append(
                     compile("%s=%r\n" % (var_name, var_val), var_name, "exec")
@@ -1072,24 +1558,7 @@ class py2exe(Command):
         return alldlls, warnings, other_depends
     # find_dependend_dlls()
 
-    def get_hidden_imports(self):
-        # imports done from builtin modules in C code (untrackable by py2exe)
-        return {"time": ["_strptime"],
-##                "datetime": ["time"],
-                "cPickle": ["copy_reg"],
-                "parser": ["copy_reg"],
-                "codecs": ["encodings"],
-
-                "cStringIO": ["copy_reg"],
-                "_sre": ["copy", "string", "sre"],
-                }
-
     def parse_mf_results(self, mf):
-        for name, imports in self.get_hidden_imports().iteritems():
-            if name in mf.modules:
-                for mod in imports:
-                    mf.import_hook(mod)
-
         tcl_src_dir = tcl_dst_dir = None
         if "Tkinter" in mf.modules.keys():
             import Tkinter
@@ -1216,51 +1685,7 @@ class py2exe(Command):
         # update the self.ignores list to ignore platform specific
         # modules.
         if sys.platform == "win32":
-            self.ignores += ['AL',
-                             'Audio_mac',
-                             'Carbon.File',
-                             'Carbon.Folder',
-                             'Carbon.Folders',
-                             'EasyDialogs',
-                             'MacOS',
-                             'Mailman',
-                             'SOCKS',
-                             'SUNAUDIODEV',
-                             '_dummy_threading',
-                             '_emx_link',
-                             '_xmlplus',
-                             '_xmlrpclib',
-                             'al',
-                             'bundlebuilder',
-                             'ce',
-                             'cl',
-                             'dbm',
-                             'dos',
-                             'fcntl',
-                             'gestalt',
-                             'grp',
-                             'ic',
-                             'java.lang',
-                             'mac',
-                             'macfs',
-                             'macostools',
-                             'mkcwproject',
-                             'org.python.core',
-                             'os.path',
-                             'os2',
-                             'poll',
-                             'posix',
-                             'pwd',
-                             'readline',
-                             'riscos',
-                             'riscosenviron',
-                             'riscospath',
-                             'rourl2path',
-                             'sgi',
-                             'sgmlop',
-                             'sunaudiodev',
-                             'termios',
-                             'vms_lib']
+            self.ignores += self.hooks.platform_ignores(sys.platform)
             # special dlls which must be copied to the exe_dir, not the lib_dir
             self.dlls_in_exedir = [python_dll,
                                    "w9xpopen%s.exe" % (is_debug_build and "_d" or ""),
@@ -1296,11 +1721,8 @@ class py2exe(Command):
             else:
                 mf.import_hook(mod)
 
+        roots = []
         for f in self.packages:
-            def visit(arg, dirname, names):
-                if '__init__.py' in names:
-                    arg.append(dirname)
-
             # Try to find the package using ModuleFinders's method to
             # allow for modulefinder.AddPackagePath interactions
             mf.import_hook(f)
@@ -1326,26 +1748,295 @@ class py2exe(Command):
                 except ImportError:
                     self.warn("No package named %s" % f)
                     continue
+            roots.append((f, paths))
+
+        # walk the paths to find the subdirs containing __init__.py
+        # files, and push the packages and their modules into
+        # modulefinder.
+        excludes = self.package_excludes
+        for packages in walk_packages(roots, excludes):
+            for package in packages:
+                mf.import_hook(package)
+                names = [name for name in mf.find_all_submodules(mf.modules[package])
+                         if not match_any(package + "." + name, excludes)]
+                names.sort()
+                mf.import_hook(package, None, names)
 
-            packages = []
-            for path in paths:
-                # walk the path to find subdirs containing __init__.py files
-                os.path.walk(path, visit, packages)
+        return mf
 
-                # scan the results (directory of __init__.py files)
-                # first trim the path (of the head package),
-                # then convert directory name in package name,
-                # finally push into modulefinder.
-                for p in packages:
-                    if p.startswith(path):
-                        package = f + '.' + p[len(path)+1:].replace('\\', '.')
-                        mf.import_hook(package, None, ["*"])
+    def pipe_code_objects(self, mf, py_files):
+        # Marshal the code objects ModuleFinder has for the source
+        # modules, named as byte_compile() would name them.  Returns the
+        # remaining modules that byte_compile() must handle, and a
+        # dictionary mapping the archive names to the .pyc contents.
+        from py2exe.mf import replace_filename
+        from py2exe.pathindex import getmtime
+        remaining = []
+        data = {}
+        magic = imp.get_magic()
+        for item in py_files:
+            if mf.modules.get(item.__name__) is not item \
+                   or os.path.splitext(item.__file__)[1] not in (".py", ".pyw"):
+                # Extension loaders and compiled-only modules
+                remaining.append(item)
+                continue
+            dfile = item.__name__.replace('.', '\\')
+            if item.__path__:
+                dfile = dfile + '\\__init__.pyc'
+            else:
+                dfile = dfile + '.pyc'
+            co = mf.get_code(item)
+            if co is None:
+                remaining.append(item)
+                continue
+            if self.verbose:
+                print "piping code of %s to %s" % (item.__file__, dfile)
+            mtime = long(getmtime(item.__file__)) & 0xFFFFFFFFL
+            data[dfile] = magic + struct.pack("<I", mtime) + \
+                          marshal.dumps(replace_filename(co, dfile))
+        print "%d modules piped from the analysis, %d to compile" % \
+              (len(data), len(remaining))
+        return remaining, data
+
+    def transform_compiled_files(self, files, data):
+        # Apply the transforms to the compiled files; the results go
+        # into the dictionary data, which maps archive names to the
+        # file contents.
+        from py2exe import codetransform
+        saved = {}
+        total = 0
+        for f in files:
+            transforms = codetransform.transforms_for(codetransform.module_name(f),
+                                                      self.transform_rules)
+            if not transforms:
+                continue
+            if f in data:
+                contents = data[f]
+            else:
+                pathname = os.path.join(self.collect_dir, f)
+                if self.dry_run and not os.path.exists(pathname):
+                    continue
+                contents = open(pathname, "rb").read()
+            if contents[:4] != imp.get_magic():
+                # copied from elsewhere, for another Python version
+                continue
+            total += len(contents)
+            data[f] = codetransform.transform_pyc(contents, transforms, saved)
+        if total:
+            all_saved = sum(saved.values())
+            print "transforms saved %d of %d bytes (%.1f%%): %s" % \
+                  (all_saved, total, 100.0 * all_saved / total,
+                   ", ".join(["%s %d" % (name, saved[name])
+                              for name in codetransform.TRANSFORMS if name in saved]))
+
+    def zipped_code_files(self, py_files):
+        # Read the modules found in zip archives (zipped eggs) from the
+        # archives, compiling the source files in memory.  Returns the
+        # remaining modules, and a dictionary mapping the archive names
+        # to the .pyc (or .pyo) contents.
+        from py2exe.mf import replace_filename
+        from py2exe.pathindex import split_archive, open_file, getmtime
+        remaining = []
+        data = {}
+        for item in py_files:
+            # a file which exists is not in an archive; this saves
+            # looking into every module file with is_zipfile()
+            if os.path.isfile(item.__file__) \
+                   or split_archive(item.__file__) is None:
+                remaining.append(item)
+                continue
+            dfile = item.__name__.replace('.', '\\')
+            if item.__path__:
+                dfile = dfile + '\\__init__.py' + (self.optimize and 'o' or 'c')
+            else:
+                dfile = dfile + '.py' + (self.optimize and 'o' or 'c')
+            suffix = os.path.splitext(item.__file__)[1]
+            if suffix in (".pyc", ".pyo"):
+                # copied like byte_compile() does
+                data[dfile] = open_file(item.__file__, "rb").read()
+            elif __debug__ and self.optimize == 0:
+                co = compile(open_file(item.__file__, "U").read() + '\n',
+                             item.__file__, 'exec')
+                mtime = long(getmtime(item.__file__)) & 0xFFFFFFFFL
+                data[dfile] = imp.get_magic() + struct.pack("<I", mtime) + \
+                              marshal.dumps(replace_filename(co, dfile))
+            else:
+                # Only another interpreter can compile with -O or -OO;
+                # it gets a copy of the source.
+                pathname = os.path.join(self.temp_dir, "zipped",
+                                        item.__name__ + suffix)
+                if not self.dry_run:
+                    self.mkpath(os.path.dirname(pathname))
+                    open(pathname, "w").write(open_file(item.__file__, "U").read())
+                from modulefinder import Module
+                remaining.append(Module(item.__name__, pathname, item.__path__))
+                continue
+            if self.verbose:
+                print "reading %s to %s" % (item.__file__, dfile)
+        if data:
+            print "%d modules read from zip archives" % len(data)
+        return remaining, data
+
+    def create_depgraph(self, mf, py_files, extensions):
+        from py2exe import depgraph
+        # The size of a module is what it adds to the archive, or the
+        # size of the extension.
+        sizes = {}
+        for item in py_files:
+            dfile = item.__name__.replace('.', '\\')
+            if item.__path__:
+                dfile = dfile + '\\__init__.py' + (self.optimize and 'o' or 'c')
+            else:
+                dfile = dfile + '.py' + (self.optimize and 'o' or 'c')
+            sizes[item.__name__] = sizes.get(item.__name__, 0) + \
+                                   self.archive_sizes.get(dfile, 0)
+        for item in extensions:
+            sizes[item.__name__] = sizes.get(item.__name__, 0) + \
+                                   os.path.getsize(item.__file__)
+        return depgraph.from_modulefinder(mf, sizes)
 
-        return mf
+    def get_archive_name(self):
+        if self.distribution.zipfile is None:
+            fd, archive_name = tempfile.mkstemp()
+            os.close(fd)
+            return archive_name
+        return os.path.join(self.lib_dir,
+                            os.path.basename(self.distribution.zipfile))
+
+    def update_archive(self, py_files):
+        # Compile the modules again and append them to the archive,
+        # for --watch.  zipimport uses the last entry of a name.
+        import warnings
+        py_files, code_files = self.zipped_code_files(py_files)
+        compiled_files = byte_compile(py_files,
+                                      target_dir=self.collect_dir,
+                                      optimize=self.optimize,
+                                      force=1,
+                                      verbose=self.verbose,
+                                      dry_run=self.dry_run)
+        if self.transform_rules:
+            self.transform_compiled_files(compiled_files, code_files)
+        if self.dry_run:
+            return
+        if self.compressed:
+            compression = zipfile.ZIP_DEFLATED
+        else:
+            compression = zipfile.ZIP_STORED
+        z = zipfile.ZipFile(self.get_archive_name(), "a", compression=compression)
+        try:
+            warnings.filterwarnings("ignore", "Duplicate name", UserWarning)
+            for f in compiled_files:
+                if f not in code_files:
+                    z.write(os.path.join(self.collect_dir, f), f)
+            for f, data in code_files.items():
+                info = zipfile.ZipInfo(f, time.localtime()[:6])
+                info.compress_type = compression
+                info.external_attr = 0644 << 16L
+                z.writestr(info, data)
+        finally:
+            z.close()
+
+    def compact_archive(self, removed):
+        # Rewrite the archive with only the last entry of each name,
+        # and without the modules named in removed, for --watch.
+        # Returns the number of bytes saved.
+        if self.dry_run:
+            return 0
+        ext = self.optimize and ".pyo" or ".pyc"
+        drop = set()
+        for name in removed:
+            base = name.replace(".", "/")
+            drop.add(base + ext)
+            drop.add(base + "/__init__" + ext)
+        from py2exe.streamzip import rewrite_archive
+        arcname = self.get_archive_name()
+        try:
+            return rewrite_archive(arcname, drop)
+        except OSError, details:
+            print "could not rewrite %s: %s" % (arcname, details)
+            return 0
+
+    def update_executables(self, scripts):
+        # Build the executables of the changed scripts again, for --watch.
+        arcname = self.get_archive_name()
+        dist = self.distribution
+        for targets, template in ((dist.console, self.get_console_template()),
+                                  (dist.windows, self.get_windows_template())):
+            for target in targets:
+                if target.script in scripts:
+                    try:
+                        self.build_executable(target, template, arcname, target.script)
+                    except (IOError, OSError, DistutilsError), details:
+                        print "could not update %s: %s" % (target.get_dest_base(),
+                                                           details)
+
+    def make_target_archives(self, mf, code_files):
+        # Write the modules of each target into an archive of its own,
+        # named after the shared archive and the target, and the other
+        # files into the shared archive.
+        from py2exe.streamzip import archive_name
+        ext = self.optimize and ".pyo" or ".pyc"
+        owner = {}
+        for target, names in self.target_modules.items():
+            for name in names:
+                # the trace or the hooks may have removed it since
+                m = mf.modules.get(name)
+                if m is not None:
+                    owner[archive_name(m, ext)] = target
+        shared_files = []
+        target_files = {}
+        for f in self.compiled_files:
+            target = owner.get(f)
+            if target is None:
+                shared_files.append(f)
+            else:
+                target_files.setdefault(target, []).append(f)
+        arcname = self.make_lib_archive(self.get_archive_name(),
+                                        base_dir=self.collect_dir,
+                                        files=shared_files,
+                                        verbose=self.verbose,
+                                        dry_run=self.dry_run,
+                                        data=code_files)
+        sizes = self.archive_sizes
+        root = os.path.splitext(os.path.basename(self.distribution.zipfile))[0]
+        for target, files in target_files.items():
+            target.target_archive = "%s-%s.zip" % \
+                                    (root, os.path.basename(target.get_dest_base()))
+            target_arcname = self.make_lib_archive(os.path.join(self.lib_dir,
+                                                                target.target_archive),
+                                                   base_dir=self.collect_dir,
+                                                   files=files,
+                                                   verbose=self.verbose,
+                                                   dry_run=self.dry_run,
+                                                   data=code_files)
+            self.lib_files.append(target_arcname)
+            sizes.update(self.archive_sizes)
+        self.archive_sizes = sizes
+        return arcname
+
+    def finish_stream(self, base_dir, files, data=None):
+        # Add the remaining files to the streamed archive and close it.
+        if data is None:
+            data = {}
+        archive = self.stream_archive
+        for f in files:
+            if f in data:
+                archive.add_data(f, data[f])
+            else:
+                archive.add_file(f, os.path.join(base_dir, f))
+        archive.close()
+        self.archive_sizes = archive.sizes
+        return archive.filename
 
     def make_lib_archive(self, zip_filename, base_dir, files,
-                         verbose=0, dry_run=0):
+                         verbose=0, dry_run=0, data=None):
+        # Files in 'data' are not read from base_dir, their contents is
+        # in the dictionary.
+        if data is None:
+            data = {}
         from distutils.dir_util import mkpath
+        # archive name -> size in the archive
+        self.archive_sizes = {}
         if not self.skip_archive:
             # Like distutils "make_archive", but we can specify the files
             # to include, and the compression to use - default is
@@ -1353,6 +2044,18 @@ class py2exe(Command):
             # don't append '.zip' to the filename.
             mkpath(os.path.dirname(zip_filename), dry_run=dry_run)
 
+            if self.archive_format == "marshal":
+                from py2exe.marshalbundle import write_bundle
+                if not dry_run:
+                    contents = []
+                    for f in files:
+                        if f in data:
+                            contents.append((f, data[f]))
+                        else:
+                            contents.append((f, open(os.path.join(base_dir, f), "rb").read()))
+                    self.archive_sizes = write_bundle(zip_filename, contents)
+                return zip_filename
+
             if self.compressed:
                 compression = zipfile.ZIP_DEFLATED
             else:
@@ -1362,7 +2065,14 @@ class py2exe(Command):
                 z = zipfile.ZipFile(zip_filename, "w",
                                     compression=compression)
                 for f in files:
-                    z.write(os.path.join(base_dir, f), f)
+                    if f in data:
+                        info = zipfile.ZipInfo(f, time.localtime()[:6])
+                        info.compress_type = compression
+                        info.external_attr = 0644 << 16L
+                        z.writestr(info, data[f])
+                    else:
+                        z.write(os.path.join(base_dir, f), f)
+                    self.archive_sizes[f] = z.infolist()[-1].compress_size
                 z.close()
 
             return zip_filename
@@ -1376,6 +2086,15 @@ class py2exe(Command):
                 d = os.path.dirname(f)
                 if d:
                     mkpath(os.path.join(destFolder, d), verbose=verbose, dry_run=dry_run)
+                if f in data:
+                    if verbose:
+                        print "writing %s" % os.path.join(destFolder, f)
+                    if not dry_run:
+                        open(os.path.join(destFolder, f), "wb").write(data[f])
+                    self.archive_sizes[f] = len(data[f])
+                    continue
+                if not dry_run:
+                    self.archive_sizes[f] = os.path.getsize(os.path.join(base_dir, f))
                 copy_file(
                           os.path.join(base_dir, f),
                           os.path.join(destFolder, f),
@@ -1505,91 +2224,198 @@ def isSystemDLL(pathname):
     imagebase = struct.unpack("I", file.read(4))[0]
     return not (imagebase < 0x70000000)
 
+def _compile_file((pathname, cfile, dfile)):
+    # Compile one source file, and return the message py_compile would
+    # print for an error, or None.
+    import py_compile
+    try:
+        py_compile.compile(pathname, cfile, dfile, doraise=True)
+    except py_compile.PyCompileError, details:
+        return details.msg
+    return None
+
+def _compile_server():
+    # The main loop of the compiler worker processes: read requests
+    # for _compile_file() from stdin, and write the results to stdout.
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    while 1:
+        try:
+            request = marshal.load(sys.stdin)
+        except EOFError:
+            break
+        marshal.dump(_compile_file(request), out)
+        out.flush()
+
+class CompileWorker:
+    """A Python process started with the flags for an optimize level,
+    which compiles files on request."""
+    def __init__(self, optimize):
+        from py2exe.mf import start_worker
+        flags = []
+        if optimize == 1:
+            flags.append("-O")
+        elif optimize == 2:
+            flags.append("-OO")
+        self.process = start_worker("from py2exe.build_exe import _compile_server; "
+                                    "_compile_server()", flags)
+
+    def compile(self, request):
+        try:
+            marshal.dump(request, self.process.stdin)
+            self.process.stdin.flush()
+            return marshal.load(self.process.stdout)
+        except (EOFError, IOError, ValueError):
+            # get_compile_workers() replaces it
+            raise DistutilsError("compiling '%s' failed: the compiler process died"
+                                 % request[0])
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+# optimize level -> list of CompileWorkers, kept for the whole session
+_compile_workers = {}
+
+def get_compile_workers(optimize, count):
+    workers = _compile_workers.get(optimize)
+    if workers is None:
+        import atexit
+        if not _compile_workers:
+            atexit.register(close_compile_workers)
+        workers = _compile_workers[optimize] = []
+    for worker in workers[:]:
+        if not worker.is_alive():
+            workers.remove(worker)
+    while len(workers) < count:
+        workers.append(CompileWorker(optimize))
+    return workers[:count]
+
+def close_compile_workers():
+    for workers in _compile_workers.values():
+        for worker in workers:
+            try:
+                worker.close()
+            except IOError:
+                pass
+    _compile_workers.clear()
+
+def compile_in_workers(requests, optimize, jobs):
+    # Compile the files in worker processes started with the flags of
+    # the optimize level, and return the results of the requests in
+    # their order.
+    import threading
+    import Queue
+    queue = Queue.Queue()
+    for i in range(len(requests)):
+        queue.put(i)
+    results = [None] * len(requests)
+    errors = []
+    def run(worker):
+        try:
+            while 1:
+                try:
+                    i = queue.get_nowait()
+                except Queue.Empty:
+                    break
+                results[i] = worker.compile(requests[i])
+        except:
+            errors.append(sys.exc_info())
+    threads = [threading.Thread(target=run, args=(worker,))
+               for worker in get_compile_workers(optimize, min(jobs, len(requests)))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+    return results
+
 def byte_compile(py_files, optimize=0, force=0,
                  target_dir=None, verbose=1, dry_run=0,
-                 direct=None):
+                 direct=None, jobs=1, cache=None):
 
     if direct is None:
         direct = (__debug__ and optimize == 0)
 
-    # "Indirect" byte-compilation: write a temporary script and then
-    # run it with the appropriate flags.
-    if not direct:
-        from tempfile import mktemp
-        from distutils.util import execute
-        script_name = mktemp(".py")
-        if verbose:
-            print "writing byte-compilation script '%s'" % script_name
-        if not dry_run:
-            script = open(script_name, "w")
-            script.write("""\
-from py2exe.build_exe import byte_compile
-from modulefinder import Module
-files = [
-""")
-
-            for f in py_files:
-                script.write("Module(%s, %s, %s),\n" % \
-                (repr(f.__name__), repr(f.__file__), repr(f.__path__)))
-            script.write("]\n")
-            script.write("""
-byte_compile(files, optimize=%s, force=%s,
-             target_dir=%s,
-             verbose=%s, dry_run=0,
-             direct=1)
-""" % (repr(optimize), repr(force), repr(target_dir), repr(verbose)))
-
-            script.close()
-
-        cmd = [sys.executable, script_name]
-        if optimize == 1:
-            cmd.insert(1, "-O")
-        elif optimize == 2:
-            cmd.insert(1, "-OO")
-        spawn(cmd, verbose=verbose, dry_run=dry_run)
-        execute(os.remove, (script_name,), "removing %s" % script_name,
-                verbose=verbose, dry_run=dry_run)
-
-
-    else:
-        from py_compile import compile
-        from distutils.dir_util import mkpath
-        from distutils.dep_util import newer
-        from distutils.file_util import copy_file
+    # Source files are compiled in this process when it has the right
+    # optimize level, else (or with more than one job) by worker
+    # processes started with the appropriate flags.  A
+    # py2exe.bytecache.BytecodeCache provides the files compiled before,
+    # and keeps the new ones.
+    from distutils.dir_util import mkpath
+    from distutils.dep_util import newer
+    from distutils.file_util import copy_file
 
-        for file in py_files:
-            # Terminology from the py_compile module:
-            #   cfile - byte-compiled file
-            #   dfile - purported source filename (same as 'file' by default)
-            cfile = file.__name__.replace('.', '\\')
+    ext = optimize and 'o' or 'c'
+    # the source files for the workers
+    todo = []
+    # cfile -> cache key, for the files to store in the cache
+    keys = {}
+    for file in py_files:
+        # Terminology from the py_compile module:
+        #   cfile - byte-compiled file
+        #   dfile - purported source filename (same as 'file' by default)
+        cfile = file.__name__.replace('.', '\\')
 
-            if file.__path__:
-                dfile = cfile + '\\__init__.py' + (__debug__ and 'c' or 'o')
-            else:
-                dfile = cfile + '.py' + (__debug__ and 'c' or 'o')
-            if target_dir:
-                cfile = os.path.join(target_dir, dfile)
+        if file.__path__:
+            dfile = cfile + '\\__init__.py' + ext
+        else:
+            dfile = cfile + '.py' + ext
+        if target_dir:
+            cfile = os.path.join(target_dir, dfile)
 
-            if force or newer(file.__file__, cfile):
-                if verbose:
-                    print "byte-compiling %s to %s" % (file.__file__, dfile)
-                if not dry_run:
-                    mkpath(os.path.dirname(cfile))
-                    suffix = os.path.splitext(file.__file__)[1]
-                    if suffix in (".py", ".pyw"):
-                        compile(file.__file__, cfile, dfile)
-                    elif suffix in _py_suffixes:
-                        # Minor problem: This will happily copy a file
-                        # <mod>.pyo to <mod>.pyc or <mod>.pyc to
-                        # <mod>.pyo, but it does seem to work.
-                        copy_file(file.__file__, cfile, preserve_mode=0)
+        if force or newer(file.__file__, cfile):
+            if verbose:
+                print "byte-compiling %s to %s" % (file.__file__, dfile)
+            if not dry_run:
+                mkpath(os.path.dirname(cfile))
+                suffix = os.path.splitext(file.__file__)[1]
+                if suffix in (".py", ".pyw"):
+                    if cache is not None:
+                        key = cache.key(file.__file__, dfile, optimize)
+                        data = cache.get(key, os.stat(file.__file__).st_mtime)
+                        if data is not None:
+                            f = open(cfile, "wb")
+                            try:
+                                f.write(data)
+                            finally:
+                                f.close()
+                            continue
+                        keys[cfile] = key
+                    if direct and jobs == 1:
+                        error = _compile_file((file.__file__, cfile, dfile))
+                        if error is not None:
+                            sys.stderr.write(error + '\n')
+                        elif cfile in keys:
+                            cache.put(keys[cfile], open(cfile, "rb").read())
                     else:
-                        raise RuntimeError \
-                              ("Don't know how to handle %r" % file.__file__)
-            else:
-                if verbose:
-                    print "skipping byte-compilation of %s to %s" % \
-                          (file.__file__, dfile)
+                        todo.append((file.__file__, cfile, dfile))
+                elif suffix in _py_suffixes:
+                    # Minor problem: This will happily copy a file
+                    # <mod>.pyo to <mod>.pyc or <mod>.pyc to
+                    # <mod>.pyo, but it does seem to work.
+                    copy_file(file.__file__, cfile, preserve_mode=0)
+                else:
+                    raise RuntimeError \
+                          ("Don't know how to handle %r" % file.__file__)
+        else:
+            if verbose:
+                print "skipping byte-compilation of %s to %s" % \
+                      (file.__file__, dfile)
+    if todo:
+        # Errors are reported in the order of the files, like
+        # py_compile.compile() reports them.
+        results = compile_in_workers(todo, optimize, jobs)
+        for i in range(len(todo)):
+            cfile = todo[i][1]
+            if results[i] is not None:
+                sys.stderr.write(results[i] + '\n')
+            elif cfile in keys:
+                cache.put(keys[cfile], open(cfile, "rb").read())
     compiled_files = []
     for file in py_files:
         cfile = file.__name__.replace('.', '\\')
@@ -0,0 +1,122 @@
+"""A bytecode cache shared by all builds and projects.
+
+byte_compile() decides whether to compile a module by comparing the
+modification times of the source and of the compiled file in the
+collect directory of the build, so a fresh checkout or another project
+using the same libraries compiles everything again.  The BytecodeCache
+keeps the compiled files in the user cache directory instead, keyed by
+what the result depends on: the contents of the source file, the
+filename stored in the code (byte_compile() names it after the module),
+the optimize level and the magic number of the interpreter.
+
+Files are written to a temporary name and renamed, so concurrent builds
+never see partial entries; an entry that disappears while it is read
+is a miss.  A hit touches the entry, and trim() removes the least
+recently used entries when the cache is larger than max_size.
+"""
+
+import imp
+import os
+import struct
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+from py2exe.mfcache import user_cache_dir
+
+class BytecodeCache:
+    def __init__(self, dirname=None, max_size=256*1024*1024):
+        if dirname is None:
+            dirname = os.path.join(user_cache_dir(), "bytecode")
+        self.dirname = dirname
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._dirty = 0
+
+    def key(self, pathname, dfile, optimize):
+        f = open(pathname, "rb")
+        try:
+            digest = md5(f.read())
+        finally:
+            f.close()
+        digest.update("\0%s\0%d\0%s" % (dfile, optimize, imp.get_magic()))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.dirname, key[:2], key)
+
+    def get(self, key, mtime):
+        """Return the contents of the compiled file, with the source
+        modification time mtime in its header, or None."""
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+            try:
+                data = f.read()
+            finally:
+                f.close()
+            os.utime(path, None)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data[:4] + struct.pack("<I", long(mtime) & 0xFFFFFFFFL) + data[8:]
+
+    def put(self, key, data):
+        path = self._path(key)
+        tmpname = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            f = open(tmpname, "wb")
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            if os.path.exists(path):
+                # os.rename() does not replace files on Windows; the
+                # other build has stored the same data.
+                os.remove(tmpname)
+            else:
+                os.rename(tmpname, path)
+        except (IOError, OSError):
+            # the cache only saves time
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            return
+        self._dirty = 1
+
+    def trim(self):
+        """Remove the least recently used entries while the cache is
+        larger than max_size."""
+        if not self._dirty:
+            return
+        self._dirty = 0
+        entries = []
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(self.dirname):
+            for fname in filenames:
+                if fname.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, fname)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= self.max_size:
+            return
+        entries.sort()
+        # remove a bit more, so that the next builds do not have to
+        for mtime, size, path in entries:
+            if total <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,167 @@
+"""Make the compiled modules smaller before they go into the archive.
+
+Each transform rewrites the code objects of a compiled module:
+
+    docstrings - replace the docstrings of the module, its classes and
+                 functions with None, like python -OO does
+    lnotab     - drop the line number tables; tracebacks then show the
+                 first line of each function
+    filenames  - intern co_filename, so that marshal writes it once per
+                 module instead of once per code object
+    constants  - intern the string constants, so that marshal writes
+                 repeated ones once per module
+
+A transform may be restricted to some modules with 'name=pattern'; the
+pattern is a glob pattern matched against the module names, and a
+package name also matches its submodules.  The docstrings transform
+changes what __doc__ is, so it is best limited to packages which do
+not use it.
+"""
+
+import dis
+import fnmatch
+import marshal
+import types
+
+TRANSFORMS = ["docstrings", "lnotab", "filenames", "constants"]
+
+_LOAD_CONST = dis.opname.index('LOAD_CONST')
+_STORE_NAME = dis.opname.index('STORE_NAME')
+_EXTENDED_ARG = dis.EXTENDED_ARG
+_HAVE_ARGUMENT = dis.HAVE_ARGUMENT
+_CO_OPTIMIZED = 0x0001
+# code objects which are optimized, but have no docstring slot
+_COMPREHENSIONS = ("<genexpr>", "<setcomp>", "<dictcomp>", "<lambda>")
+
+def parse_rules(entries):
+    """Return a list of (transform, pattern or None) pairs for the
+    entries of the transform option."""
+    rules = []
+    for entry in entries:
+        name, pattern = entry, None
+        if "=" in entry:
+            name, pattern = entry.split("=", 1)
+        if name not in TRANSFORMS:
+            raise ValueError("unknown transform %r" % name)
+        rules.append((name, pattern))
+    return rules
+
+def transforms_for(modname, rules):
+    """Return the transforms to apply to the module."""
+    result = []
+    for name in TRANSFORMS:
+        for transform, pattern in rules:
+            if transform != name:
+                continue
+            if pattern is None or fnmatch.fnmatchcase(modname, pattern) \
+                   or fnmatch.fnmatchcase(modname, pattern + ".*"):
+                result.append(name)
+                break
+    return result
+
+def module_name(arcname):
+    """Return the module name for a name in the archive."""
+    name = arcname.replace("\\", "/")
+    name = name[:name.rfind(".")]
+    if name.endswith("/__init__"):
+        name = name[:-len("/__init__")]
+    return name.replace("/", ".")
+
+def _instructions(code):
+    # yield (opcode, oparg) of the bytecode string
+    i = 0
+    extended = 0
+    n = len(code)
+    while i < n:
+        op = ord(code[i])
+        if op >= _HAVE_ARGUMENT:
+            oparg = ord(code[i+1]) + ord(code[i+2]) * 256 + extended
+            i += 3
+            if op == _EXTENDED_ARG:
+                extended = oparg * 65536
+                continue
+            extended = 0
+            yield op, oparg
+        else:
+            i += 1
+            yield op, None
+
+def _docstring_index(co):
+    # Return the index of the docstring in co_consts, or None.
+    consts = co.co_consts
+    if co.co_flags & _CO_OPTIMIZED:
+        # functions keep the docstring (or None) in co_consts[0]
+        if co.co_name in _COMPREHENSIONS or not consts \
+               or not isinstance(consts[0], basestring):
+            return None
+        index = 0
+    else:
+        # modules and classes store it in __doc__ at the start
+        index = None
+        last = None
+        count = 0
+        for op, oparg in _instructions(co.co_code):
+            if op == _STORE_NAME and co.co_names[oparg] == "__doc__" \
+                   and last is not None and last[0] == _LOAD_CONST:
+                index = last[1]
+                break
+            last = op, oparg
+            count += 1
+            if count > 6:
+                break
+        if index is None or not isinstance(consts[index], basestring):
+            return None
+    # The compiler shares equal constants; keep it if the code uses
+    # it anywhere else.  Functions do not load their docstring, modules
+    # and classes load it once to store it.
+    uses = 0
+    for op, oparg in _instructions(co.co_code):
+        if op == _LOAD_CONST and oparg == index:
+            uses += 1
+    if co.co_flags & _CO_OPTIMIZED:
+        uses += 1
+    if uses > 1:
+        return None
+    return index
+
+def transform_code(co, transforms):
+    """Return a copy of the code object co, and of the code objects
+    nested in it, with the transforms applied."""
+    consts = list(co.co_consts)
+    for i in range(len(consts)):
+        if isinstance(consts[i], types.CodeType):
+            consts[i] = transform_code(consts[i], transforms)
+    filename = co.co_filename
+    lnotab = co.co_lnotab
+    if "docstrings" in transforms:
+        index = _docstring_index(co)
+        if index is not None:
+            consts[index] = None
+    if "lnotab" in transforms:
+        lnotab = ""
+    if "filenames" in transforms:
+        filename = intern(filename)
+    if "constants" in transforms:
+        for i in range(len(consts)):
+            if type(consts[i]) is str:
+                consts[i] = intern(consts[i])
+    return types.CodeType(co.co_argcount, co.co_nlocals, co.co_stacksize,
+                          co.co_flags, co.co_code, tuple(consts), co.co_names,
+                          co.co_varnames, filename, co.co_name,
+                          co.co_firstlineno, lnotab,
+                          co.co_freevars, co.co_cellvars)
+
+def transform_pyc(data, transforms, saved=None):
+    """Return the contents of a .pyc (or .pyo) file with the transforms
+    applied.  The bytes each transform saves are added to the
+    dictionary saved."""
+    co = marshal.loads(data[8:])
+    size = len(data) - 8
+    # one at a time, to measure what each one saves
+    for name in transforms:
+        co = transform_code(co, [name])
+        new_size = len(marshal.dumps(co))
+        if saved is not None:
+            saved[name] = saved.get(name, 0) + size - new_size
+        size = new_size
+    return data[:8] + marshal.dumps(co)
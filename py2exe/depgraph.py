@@ -0,0 +1,544 @@
+"""Size attribution for the module graph found by py2exe.mf.
+
+The graph has an edge from each module to every module it imports, and
+starts at the entry points (the scripts, and the modules included
+explicitly).  For every module the report shows its own size, and its
+retained size: the size of everything that would disappear from the
+build if the module were excluded.  Excluding a package also excludes
+its submodules.  For plain modules the retained size comes from the
+dominator tree of the graph; module X dominates module Y if every
+import chain from an entry point to Y runs through X.
+
+The graph can be saved after a build, and queried later:
+
+    python -m py2exe.depgraph depgraph.dat
+    python -m py2exe.depgraph depgraph.dat -x email -x xml.dom
+    python -m py2exe.depgraph depgraph.dat --why xml.dom.minidom
+    python -m py2exe.depgraph depgraph.dat --json graph.json --dot graph.dot
+
+The JSON export looks like this; 'kind' is only known with the 'ast'
+analysis (see py2exe.astscan), and 'dominator' is null for modules only
+dominated by the entry points as a whole:
+
+    {"roots": ["__main__", ...],
+     "modules": {"os": {"type": "source", "file": "C:\\Python26\\lib\\os.py",
+                        "file_size": 26300, "size": 25604,
+                        "retained_size": 25604, "dominator": null},
+                 ...},
+     "edges": [{"from": "__main__", "to": "os", "kind": null}, ...]}
+"""
+
+import imp
+import marshal
+import os
+import sys
+
+try:
+    set
+except NameError:
+    from sets import Set as set
+
+# Increment when the layout of saved graphs changes.
+GRAPH_VERSION = 2
+
+TYPE_NAMES = {imp.C_BUILTIN: "builtin",
+              imp.C_EXTENSION: "extension",
+              imp.PKG_DIRECTORY: "package",
+              imp.PY_COMPILED: "compiled",
+              imp.PY_FROZEN: "frozen",
+              imp.PY_SOURCE: "source"}
+
+# The virtual node that imports the entry points.
+_ROOT = "<entry points>"
+
+class DepGraph:
+    def __init__(self, edges, roots, sizes=None, types=None, files=None,
+                 file_sizes=None, kinds=None):
+        # module name -> sorted list of the modules it imports
+        self.edges = {}
+        for name, imports in edges.items():
+            imports = list(imports)
+            imports.sort()
+            self.edges[name] = imports
+        self.roots = list(roots)
+        self.roots.sort()
+        # module name -> size in bytes
+        self.sizes = sizes or {}
+        # module name -> imp module type
+        self.types = types or {}
+        # module name -> pathname
+        self.files = files or {}
+        # module name -> size of the module file
+        self.file_sizes = file_sizes or {}
+        # (caller, module) -> kind of the import, if known
+        self.kinds = kinds or {}
+        self._idom = None
+        self._order = None
+
+    def nodes(self):
+        names = set(self.roots)
+        names.update(self.sizes)
+        names.update(self.types)
+        for name, imports in self.edges.items():
+            names.add(name)
+            names.update(imports)
+        names = list(names)
+        names.sort()
+        return names
+
+    def size(self, name):
+        return self.sizes.get(name, 0)
+
+    def _successors(self, name):
+        if name == _ROOT:
+            return self.roots
+        return self.edges.get(name, ())
+
+    # exclusion queries
+
+    def reachable(self, excluded=()):
+        """Return the set of modules reachable from the entry points
+        when the modules in 'excluded' (and their submodules) are
+        excluded.
+        """
+        excluded = set(excluded)
+        def is_excluded(name):
+            if name in excluded:
+                return 1
+            while "." in name:
+                name = name[:name.rfind(".")]
+                if name in excluded:
+                    return 1
+            return 0
+        seen = set()
+        stack = [_ROOT]
+        while stack:
+            name = stack.pop()
+            for imported in self._successors(name):
+                if imported not in seen and not is_excluded(imported):
+                    seen.add(imported)
+                    stack.append(imported)
+        return seen
+
+    def removed_by(self, excluded):
+        """Return the set of modules that disappear when the modules in
+        'excluded' are excluded.
+        """
+        return self.reachable() - self.reachable(excluded)
+
+    def why(self, name):
+        """Return the shortest import chain from an entry point to the
+        module, as a list of module names starting with the entry point,
+        or None if the module is not reachable.
+        """
+        parents = {_ROOT: None}
+        queue = [_ROOT]
+        while queue and name not in parents:
+            next = []
+            for caller in queue:
+                for imported in self._successors(caller):
+                    if imported not in parents:
+                        parents[imported] = caller
+                        next.append(imported)
+            queue = next
+        if name not in parents:
+            return None
+        chain = []
+        while name != _ROOT:
+            chain.append(name)
+            name = parents[name]
+        chain.reverse()
+        return chain
+
+    # dominator tree
+
+    def _postorder(self):
+        # Depth first postorder of the nodes reachable from _ROOT.
+        order = []
+        visited = set([_ROOT])
+        stack = [(_ROOT, iter(self._successors(_ROOT)))]
+        while stack:
+            name, successors = stack[-1]
+            for imported in successors:
+                if imported not in visited:
+                    visited.add(imported)
+                    stack.append((imported, iter(self._successors(imported))))
+                    break
+            else:
+                stack.pop()
+                order.append(name)
+        return order
+
+    def dominators(self):
+        """Return a dictionary mapping every reachable module to its
+        immediate dominator, which is None for modules that are only
+        dominated by the entry points as a whole.
+        """
+        if self._idom is not None:
+            return self._idom
+        # Cooper, Harvey and Kennedy: "A Simple, Fast Dominance Algorithm"
+        order = self._postorder()
+        index = {}
+        for i in range(len(order)):
+            index[order[i]] = i
+        preds = {}
+        for name in order:
+            for imported in self._successors(name):
+                preds.setdefault(imported, []).append(name)
+        rpo = order[:]
+        rpo.reverse()
+        idom = {_ROOT: _ROOT}
+        def intersect(a, b):
+            while a != b:
+                while index[a] < index[b]:
+                    a = idom[a]
+                while index[b] < index[a]:
+                    b = idom[b]
+            return a
+        changed = 1
+        while changed:
+            changed = 0
+            for name in rpo[1:]:
+                new_idom = None
+                for p in preds[name]:
+                    if p in idom:
+                        if new_idom is None:
+                            new_idom = p
+                        else:
+                            new_idom = intersect(p, new_idom)
+                if idom.get(name) != new_idom:
+                    idom[name] = new_idom
+                    changed = 1
+        del idom[_ROOT]
+        for name, dominator in idom.items():
+            if dominator == _ROOT:
+                idom[name] = None
+        self._idom = idom
+        self._order = order
+        return idom
+
+    def retained_sizes(self):
+        """Return a dictionary mapping every reachable module to its
+        retained size.
+        """
+        idom = self.dominators()
+        retained = {}
+        # Dominators come after the modules they dominate
+        for name in self._order[:-1]:
+            retained[name] = retained.get(name, 0) + self.size(name)
+            if idom[name] is not None:
+                retained[idom[name]] = retained.get(idom[name], 0) + retained[name]
+        # Excluding a package also removes its submodules, which the
+        # dominator tree does not know about.
+        packages = set()
+        for name in retained:
+            while "." in name:
+                name = name[:name.rfind(".")]
+                packages.add(name)
+        reachable = self.reachable()
+        for name in packages:
+            if name in retained:
+                removed = reachable - self.reachable([name])
+                total = 0
+                for n in removed:
+                    total = total + self.size(n)
+                retained[name] = total
+        return retained
+
+    # output
+
+    def report(self, fp=None, top=None):
+        """Print the modules ordered by retained size."""
+        if fp is None:
+            fp = sys.stdout
+        retained = self.retained_sizes()
+        idom = self.dominators()
+        items = [(-size, name) for name, size in retained.items()]
+        items.sort()
+        if top is not None:
+            items = items[:top]
+        total = 0
+        for name in retained:
+            total = total + self.size(name)
+        print >> fp, "  %-40s %10s %10s  %s" % ("Module", "Size", "Retained", "Dominator")
+        for size, name in items:
+            print >> fp, "  %-40s %10d %10d  %s" % (name, self.size(name), -size,
+                                                   idom[name] or "-")
+        print >> fp, "  %d modules, %d bytes" % (len(retained), total)
+
+    def report_removed(self, excluded, fp=None):
+        """Print what excluding the modules would remove."""
+        if fp is None:
+            fp = sys.stdout
+        removed = [(-self.size(name), name) for name in self.removed_by(excluded)]
+        removed.sort()
+        total = 0
+        for size, name in removed:
+            total = total - size
+        print >> fp, "excluding %s removes %d modules, %d bytes:" % \
+              (", ".join(excluded), len(removed), total)
+        for size, name in removed:
+            print >> fp, "  %-40s %10d" % (name, -size)
+
+    def report_why(self, name, fp=None):
+        """Print the shortest import chain to the module."""
+        if fp is None:
+            fp = sys.stdout
+        chain = self.why(name)
+        if chain is None:
+            print >> fp, "%s is not included" % name
+            return
+        print >> fp, "%s is included through:" % name
+        print >> fp, "  %s" % chain[0]
+        for i in range(1, len(chain)):
+            kind = self.kinds.get((chain[i-1], chain[i]))
+            if kind:
+                print >> fp, "  -> %s (%s)" % (chain[i], kind)
+            else:
+                print >> fp, "  -> %s" % chain[i]
+
+    # export
+
+    def as_dict(self):
+        """Return the graph as a dictionary of lists and dictionaries,
+        the structure of the JSON export.
+        """
+        retained = self.retained_sizes()
+        idom = self.dominators()
+        modules = {}
+        for name in self.nodes():
+            modules[name] = {"type": TYPE_NAMES.get(self.types.get(name)),
+                             "file": self.files.get(name),
+                             "file_size": self.file_sizes.get(name, 0),
+                             "size": self.size(name),
+                             "retained_size": retained.get(name, 0),
+                             "dominator": idom.get(name)}
+        edges = []
+        callers = self.edges.keys()
+        callers.sort()
+        for caller in callers:
+            for name in self.edges[caller]:
+                edges.append({"from": caller, "to": name,
+                              "kind": self.kinds.get((caller, name))})
+        return {"roots": self.roots, "modules": modules, "edges": edges}
+
+    def write_json(self, fp):
+        json = _import_json()
+        json.dump(self.as_dict(), fp, indent=1, sort_keys=True)
+
+    def write_dot(self, fp):
+        print >> fp, "digraph modules {"
+        print >> fp, '  node [shape=box, fontname="Helvetica"];'
+        roots = set(self.roots)
+        for name in self.nodes():
+            attrs = 'label="%s\\n%d"' % (name, self.size(name))
+            if name in roots:
+                attrs = attrs + ", style=bold"
+            print >> fp, '  "%s" [%s];' % (name, attrs)
+        callers = self.edges.keys()
+        callers.sort()
+        for caller in callers:
+            for name in self.edges[caller]:
+                kind = self.kinds.get((caller, name))
+                if kind and kind != "unconditional":
+                    print >> fp, '  "%s" -> "%s" [style=dashed, label="%s"];' % \
+                          (caller, name, kind)
+                else:
+                    print >> fp, '  "%s" -> "%s";' % (caller, name)
+        print >> fp, "}"
+
+    def write(self, filename, format=None):
+        """Export the graph as 'json' or 'dot'; by default DOT if the
+        filename ends in .dot, JSON otherwise.
+        """
+        if format is None:
+            if filename.lower().endswith(".dot"):
+                format = "dot"
+            else:
+                format = "json"
+        f = open(filename, "w")
+        try:
+            if format == "dot":
+                self.write_dot(f)
+            else:
+                self.write_json(f)
+        finally:
+            f.close()
+
+    def save(self, filename):
+        data = {"version": GRAPH_VERSION,
+                "edges": self.edges,
+                "roots": self.roots,
+                "sizes": self.sizes,
+                "types": self.types,
+                "files": self.files,
+                "file_sizes": self.file_sizes,
+                "kinds": self.kinds}
+        f = open(filename, "wb")
+        try:
+            marshal.dump(data, f)
+        finally:
+            f.close()
+
+def _import_json():
+    try:
+        import json
+    except ImportError:
+        # Python 2.5 and earlier
+        import simplejson as json
+    return json
+
+_TYPES = {}
+for _type, _name in TYPE_NAMES.items():
+    _TYPES[_name] = _type
+
+def load(filename):
+    """Load a graph saved with save(), exported with write_json(), or
+    stored in a py2exe.graphstore database.
+    """
+    f = open(filename, "rb")
+    try:
+        if f.read(16) == "SQLite format 3\0":
+            from py2exe.graphstore import GraphStore
+            store = GraphStore(filename)
+            try:
+                return from_store(store)
+            finally:
+                store.close()
+        f.seek(0)
+        try:
+            data = marshal.load(f)
+        except (EOFError, ValueError, TypeError):
+            # Not marshalled, maybe JSON.
+            f.seek(0)
+            try:
+                return _from_dict(_import_json().load(f))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                data = None
+    finally:
+        f.close()
+    if not isinstance(data, dict) or data.get("version") != GRAPH_VERSION:
+        raise ValueError("%s is not a module graph of this py2exe version" % filename)
+    return DepGraph(data["edges"], data["roots"], data["sizes"],
+                    data["types"], data["files"], data["file_sizes"],
+                    data["kinds"])
+
+def _from_dict(data):
+    edges = {}
+    kinds = {}
+    for edge in data["edges"]:
+        edges.setdefault(edge["from"], []).append(edge["to"])
+        if edge["kind"]:
+            kinds[(edge["from"], edge["to"])] = edge["kind"]
+    sizes = {}
+    types = {}
+    files = {}
+    file_sizes = {}
+    for name, info in data["modules"].items():
+        sizes[name] = info["size"]
+        file_sizes[name] = info["file_size"]
+        if info["type"] in _TYPES:
+            types[name] = _TYPES[info["type"]]
+        if info["file"]:
+            files[name] = info["file"]
+    return DepGraph(edges, data["roots"], sizes, types, files, file_sizes, kinds)
+
+def _file_size(m):
+    pathname = m.__file__
+    if not pathname:
+        return 0
+    if m.__path__:
+        for name in ("__init__.py", "__init__.pyc", "__init__.pyo"):
+            if os.path.isfile(os.path.join(pathname, name)):
+                pathname = os.path.join(pathname, name)
+                break
+    try:
+        return os.path.getsize(pathname)
+    except OSError:
+        return 0
+
+def _module_files(modules):
+    files = {}
+    file_sizes = {}
+    for name, m in modules.items():
+        if m.__file__:
+            files[name] = m.__file__
+        file_sizes[name] = _file_size(m)
+    return files, file_sizes
+
+def from_modulefinder(mf, sizes=None):
+    """Build the graph from a py2exe.mf.ModuleFinder.  'sizes' maps
+    module names to their size in the build; by default the sizes of
+    the module files are used.
+    """
+    files, file_sizes = _module_files(mf.modules)
+    if sizes is None:
+        sizes = file_sizes
+    return DepGraph(mf._depgraph, mf._roots, sizes, dict(mf._types), files,
+                    file_sizes, dict(mf._edge_kinds))
+
+def from_store(store):
+    """Build the graph from a py2exe.graphstore.GraphStore, with the
+    sizes of the module files.
+    """
+    files, file_sizes = _module_files(store.modules)
+    return DepGraph(store.edges, store.roots(), file_sizes, dict(store.types),
+                    files, file_sizes, dict(store.edge_kinds))
+
+USAGE = """\
+usage: python -m py2exe.depgraph GRAPHFILE [options]
+
+GRAPHFILE is a graph saved by the size_report option, a JSON export,
+or a database written with the graph_store option.
+Without options, print the modules with the largest retained size.
+
+  -n TOP               number of modules to print [default: 25]
+  -x, --exclude NAME   print what excluding the module would remove
+                       (can be repeated)
+  -w, --why NAME       print the shortest import chain to the module
+  --json FILE          export the graph as JSON
+  --dot FILE           export the graph for graphviz
+"""
+
+def main(args):
+    import getopt
+    try:
+        opts, args = getopt.gnu_getopt(args, "n:x:w:",
+                                       ["exclude=", "why=", "json=", "dot="])
+    except getopt.error, msg:
+        print msg
+        print USAGE
+        return 2
+    if len(args) != 1:
+        print USAGE
+        return 2
+    top = 25
+    excluded = []
+    why = []
+    exports = []
+    for o, a in opts:
+        if o == "-n":
+            top = int(a)
+        elif o in ("-x", "--exclude"):
+            excluded.append(a)
+        elif o in ("-w", "--why"):
+            why.append(a)
+        elif o in ("--json", "--dot"):
+            exports.append((a, o[2:]))
+    try:
+        graph = load(args[0])
+    except (IOError, ValueError), details:
+        print details
+        return 1
+    for filename, format in exports:
+        graph.write(filename, format)
+    for name in why:
+        graph.report_why(name)
+    if excluded:
+        graph.report_removed(excluded)
+    if not (why or excluded or exports):
+        graph.report(top=top)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,415 @@
+"""The module graph of ModuleFinder, stored in an sqlite database.
+
+For very large applications the dictionaries ModuleFinder keeps (the
+modules, badmodules, the import edges and the module types) take a lot
+of memory.  A GraphStore keeps them in an sqlite database instead,
+behind the same dictionary interface, indexed by module name, caller
+and module type.
+
+Only a limited number of Module objects is kept in memory.  The
+ModuleTable is an identity map: a module that is still referenced
+somewhere is always the same object, and modules that have been loaded
+completely (see ModuleTable.finish) are written to the database and
+dropped when more than 'size' modules are held.  The submodules of a
+package are looked up in the table by name, so packages do not keep
+their whole subtree alive.
+
+A GraphStore may only be used in the thread which created it; sqlite3
+refuses connections from other threads.  With the stream option the
+code of the modules is therefore loaded in the thread of the analysis
+(see py2exe.streamzip), and only the bytes go to the writer thread.
+
+After the build the database can be opened again for queries, and
+'python -m py2exe.depgraph' accepts it as graph file.
+"""
+
+import marshal
+import os
+import sqlite3
+import weakref
+from collections import deque
+from UserDict import DictMixin
+
+from py2exe.mf import Module
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS modules (
+    name TEXT PRIMARY KEY,
+    file TEXT,
+    path BLOB,
+    globalnames BLOB,
+    starimports BLOB,
+    pydfile TEXT);
+CREATE TABLE IF NOT EXISTS types (
+    name TEXT PRIMARY KEY,
+    type INTEGER);
+CREATE INDEX IF NOT EXISTS types_type ON types (type);
+CREATE TABLE IF NOT EXISTS edges (
+    caller TEXT,
+    name TEXT,
+    kind TEXT,
+    PRIMARY KEY (caller, name));
+CREATE INDEX IF NOT EXISTS edges_name ON edges (name);
+CREATE TABLE IF NOT EXISTS badmodules (
+    name TEXT,
+    caller TEXT,
+    PRIMARY KEY (name, caller));
+CREATE INDEX IF NOT EXISTS badmodules_caller ON badmodules (caller);
+CREATE TABLE IF NOT EXISTS roots (
+    name TEXT PRIMARY KEY);
+"""
+
+def _dumps(value):
+    return buffer(marshal.dumps(value))
+
+def _loads(blob):
+    return marshal.loads(str(blob))
+
+class SubmoduleMap:
+    """Module.submodules for the modules of a ModuleTable: the
+    submodules are looked up in the table by their full name.
+    """
+    def __init__(self, table, name):
+        self._table = table
+        self._prefix = name + "."
+
+    def get(self, sub, default=None):
+        return self._table.get(self._prefix + sub, default)
+
+    def __getitem__(self, sub):
+        return self._table[self._prefix + sub]
+
+    def __contains__(self, sub):
+        return self._table.has_key(self._prefix + sub)
+
+    def __setitem__(self, sub, m):
+        # The submodule is in the table already.
+        pass
+
+    def pop(self, sub, default=None):
+        # The submodule is removed from the table separately.
+        return self.get(sub, default)
+
+    def keys(self):
+        return [name[len(self._prefix):]
+                for name in self._table.names_with_prefix(self._prefix)
+                if "." not in name[len(self._prefix):]]
+
+class ModuleTable(DictMixin):
+    def __init__(self, db, size=1000):
+        self._db = db
+        self.size = size
+        # name -> Module, for all Module objects alive
+        self._live = weakref.WeakValueDictionary()
+        # name -> Module, for the modules held in memory
+        self._pinned = {}
+        self._queue = deque()
+        # names of the modules which have been loaded completely
+        self._finished = set()
+
+    def _pin(self, m):
+        name = m.__name__
+        if name in self._pinned:
+            return
+        self._pinned[name] = m
+        self._queue.append(name)
+        if len(self._pinned) > self.size:
+            self._evict()
+
+    def _evict(self):
+        # Write the oldest finished modules to the database, and drop
+        # them.  Unfinished modules are still being loaded, they go to
+        # the end of the queue.
+        for i in range(len(self._queue)):
+            if len(self._pinned) <= self.size:
+                break
+            name = self._queue.popleft()
+            m = self._pinned.get(name)
+            if m is None:
+                continue
+            if name in self._finished:
+                self._write(m)
+                del self._pinned[name]
+            else:
+                self._queue.append(name)
+
+    def _write(self, m):
+        path = m.__path__
+        if path is not None:
+            path = _dumps(list(path))
+        self._db.execute("INSERT OR REPLACE INTO modules VALUES (?, ?, ?, ?, ?, ?)",
+                         (m.__name__, m.__file__, path,
+                          _dumps(list(m.globalnames)), _dumps(list(m.starimports)),
+                          getattr(m, "__pydfile__", None)))
+
+    def _load(self, row):
+        name, file, path, globalnames, starimports, pydfile = row
+        if path is not None:
+            path = _loads(path)
+        m = Module(name, file, path)
+        m.globalnames = set(_loads(globalnames))
+        m.starimports = set(_loads(starimports))
+        if pydfile is not None:
+            m.__pydfile__ = pydfile
+        m.submodules = SubmoduleMap(self, name)
+        self._finished.add(m.__name__)
+        return m
+
+    def finish(self, m):
+        """Tell the table that the module has been loaded completely,
+        or has changed again.  It can be dropped from memory later.
+        """
+        self._finished.add(m.__name__)
+        self._pin(m)
+
+    def __getitem__(self, name):
+        m = self._pinned.get(name)
+        if m is not None:
+            return m
+        m = self._live.get(name)
+        if m is None:
+            row = self._db.execute("SELECT * FROM modules WHERE name = ?",
+                                   (name,)).fetchone()
+            if row is None:
+                raise KeyError(name)
+            m = self._load(row)
+            self._live[m.__name__] = m
+        self._pin(m)
+        return m
+
+    def __setitem__(self, name, m):
+        if not isinstance(m.submodules, SubmoduleMap):
+            m.submodules = SubmoduleMap(self, name)
+        self._live[name] = m
+        self._write(m)
+        self._pin(m)
+
+    def __delitem__(self, name):
+        cursor = self._db.execute("DELETE FROM modules WHERE name = ?", (name,))
+        if not cursor.rowcount:
+            raise KeyError(name)
+        self._pinned.pop(name, None)
+        self._live.pop(name, None)
+        self._finished.discard(name)
+
+    def has_key(self, name):
+        if name in self._pinned or name in self._live:
+            return True
+        return self._db.execute("SELECT 1 FROM modules WHERE name = ?",
+                                (name,)).fetchone() is not None
+
+    __contains__ = has_key
+
+    def keys(self):
+        return [row[0] for row in self._db.execute("SELECT name FROM modules")]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return self._db.execute("SELECT count(*) FROM modules").fetchone()[0]
+
+    def names_with_prefix(self, prefix):
+        # GLOB is case sensitive; module names contain no wildcards.
+        return [row[0] for row in
+                self._db.execute("SELECT name FROM modules WHERE name GLOB ?",
+                                 (prefix + "*",))]
+
+    def flush(self):
+        """Write all modules in memory to the database."""
+        for m in self._live.values():
+            self._write(m)
+
+class MultiTable(DictMixin):
+    """A dictionary mapping keys to sets of values, stored as (key,
+    value) rows.  The sets returned are views which write through.
+    """
+    # marks keys with an empty set of values
+    EMPTY = ""
+
+    def __init__(self, db, table, key, value):
+        self._db = db
+        self._select = "SELECT %s FROM %s WHERE %s = ? AND %s != ''" % (value, table, key, value)
+        self._exists = "SELECT 1 FROM %s WHERE %s = ? LIMIT 1" % (table, key)
+        self._insert = "INSERT OR IGNORE INTO %s (%s, %s) VALUES (?, ?)" % (table, key, value)
+        self._delete = "DELETE FROM %s WHERE %s = ?" % (table, key)
+        self._discard = "DELETE FROM %s WHERE %s = ? AND %s = ?" % (table, key, value)
+        self._keys = "SELECT DISTINCT %s FROM %s" % (key, table)
+
+    def __getitem__(self, key):
+        if not self.has_key(key):
+            raise KeyError(key)
+        return ValueSet(self, key)
+
+    def __setitem__(self, key, values):
+        self._db.execute(self._delete, (key,))
+        self._db.execute(self._insert, (key, self.EMPTY))
+        for value in values:
+            self.add(key, value)
+
+    def __delitem__(self, key):
+        if not self._db.execute(self._delete, (key,)).rowcount:
+            raise KeyError(key)
+
+    def has_key(self, key):
+        return self._db.execute(self._exists, (key,)).fetchone() is not None
+
+    __contains__ = has_key
+
+    def keys(self):
+        return [row[0] for row in self._db.execute(self._keys)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def setdefault(self, key, default=()):
+        if not self.has_key(key):
+            self[key] = default
+        return self[key]
+
+    def add(self, key, value):
+        self._db.execute(self._insert, (key, value))
+
+    def discard(self, key, value):
+        self._db.execute(self._discard, (key, value))
+
+    def values_of(self, key):
+        return [row[0] for row in self._db.execute(self._select, (key,))]
+
+class ValueSet:
+    """The set of values of a key in a MultiTable."""
+    def __init__(self, table, key):
+        self._table = table
+        self._key = key
+
+    def add(self, value):
+        self._table.add(self._key, value)
+
+    def discard(self, value):
+        self._table.discard(self._key, value)
+
+    def __iter__(self):
+        return iter(self._table.values_of(self._key))
+
+    def __len__(self):
+        return len(self._table.values_of(self._key))
+
+    def __contains__(self, value):
+        return value in self._table.values_of(self._key)
+
+    def __eq__(self, other):
+        try:
+            return set(self) == set(other)
+        except TypeError:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        values = self._table.values_of(self._key)
+        values.sort()
+        return "set(%r)" % values
+
+class EdgeKindTable(DictMixin):
+    """(caller, module) -> kind of the import, in the edges table."""
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, (caller, name)):
+        row = self._db.execute("SELECT kind FROM edges WHERE caller = ? AND name = ?"
+                               " AND kind IS NOT NULL", (caller, name)).fetchone()
+        if row is None:
+            raise KeyError((caller, name))
+        return row[0]
+
+    def __setitem__(self, (caller, name), kind):
+        self._db.execute("INSERT OR IGNORE INTO edges (caller, name) VALUES (?, ?)",
+                         (caller, name))
+        self._db.execute("UPDATE edges SET kind = ? WHERE caller = ? AND name = ?",
+                         (kind, caller, name))
+
+    def __delitem__(self, (caller, name)):
+        if not self._db.execute("UPDATE edges SET kind = NULL WHERE caller = ?"
+                                " AND name = ? AND kind IS NOT NULL",
+                                (caller, name)).rowcount:
+            raise KeyError((caller, name))
+
+    def keys(self):
+        return list(self._db.execute("SELECT caller, name FROM edges"
+                                     " WHERE kind IS NOT NULL"))
+
+class TypeTable(DictMixin):
+    """module name -> imp module type"""
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        row = self._db.execute("SELECT type FROM types WHERE name = ?",
+                               (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def __setitem__(self, name, typ):
+        self._db.execute("INSERT OR REPLACE INTO types VALUES (?, ?)", (name, typ))
+
+    def __delitem__(self, name):
+        if not self._db.execute("DELETE FROM types WHERE name = ?", (name,)).rowcount:
+            raise KeyError(name)
+
+    def has_key(self, name):
+        return self._db.execute("SELECT 1 FROM types WHERE name = ?",
+                                (name,)).fetchone() is not None
+
+    __contains__ = has_key
+
+    def keys(self):
+        return [row[0] for row in self._db.execute("SELECT name FROM types")]
+
+class GraphStore:
+    def __init__(self, filename, size=1000, clear=0):
+        self.filename = filename
+        if clear and os.path.exists(filename):
+            os.remove(filename)
+        self.db = sqlite3.connect(filename)
+        self.db.text_factory = str
+        # The database is a build product, it can be made again.
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute("PRAGMA journal_mode = MEMORY")
+        self.db.executescript(SCHEMA)
+        self.modules = ModuleTable(self.db, size)
+        self.badmodules = MultiTable(self.db, "badmodules", "name", "caller")
+        self.edges = MultiTable(self.db, "edges", "caller", "name")
+        self.edge_kinds = EdgeKindTable(self.db)
+        self.types = TypeTable(self.db)
+
+    # queries
+
+    def roots(self):
+        return [row[0] for row in self.db.execute("SELECT name FROM roots")]
+
+    def set_roots(self, roots):
+        self.db.execute("DELETE FROM roots")
+        self.db.executemany("INSERT INTO roots VALUES (?)", [(name,) for name in roots])
+
+    def importers(self, name):
+        """Return the names of the modules importing the module."""
+        return [row[0] for row in
+                self.db.execute("SELECT caller FROM edges WHERE name = ?", (name,))]
+
+    def imports(self, name):
+        """Return the names of the modules the module imports."""
+        return self.edges.values_of(name)
+
+    def modules_of_type(self, typ):
+        return [row[0] for row in
+                self.db.execute("SELECT name FROM types WHERE type = ?", (typ,))]
+
+    def flush(self):
+        self.modules.flush()
+        self.db.commit()
+
+    def close(self):
+        self.flush()
+        self.db.close()
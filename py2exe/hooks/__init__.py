@@ -0,0 +1,114 @@
+"""Hooks tell py2exe what it cannot find out about a module by itself.
+
+A hook is a Python file named hook-<module name>.py in one of the hook
+directories.  It is executed when the module is found, and may assign
+these names:
+
+    hiddenimports - list of modules the module imports in a way the
+                    analysis does not see, from C code for example
+    excludes      - list of modules which can be left out when the
+                    module is included, usually unused subpackages
+    aliases       - dictionary mapping the names of builtin modules the
+                    module (an extension) creates to the module itself,
+                    so that imports of them are not reported as missing
+    ignores       - list of modules the module tries to import, but
+                    does not need
+    datafiles     - list of (target directory, [file names]) tuples;
+                    the file names are relative to the directory of the
+                    module, and may contain wildcards
+
+The file platform-<sys.platform>.py in a hook directory lists the
+modules to ignore on that platform in 'ignores'.
+
+The hook directories are searched in order, and the first hook found
+for a module wins; the directory of this package is searched last.
+"""
+
+import os
+
+HOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Hook:
+    def __init__(self, name, pathname, namespace):
+        self.name = name
+        self.pathname = pathname
+        self.hiddenimports = list(namespace.get("hiddenimports", []))
+        self.excludes = list(namespace.get("excludes", []))
+        self.aliases = dict(namespace.get("aliases", {}))
+        self.ignores = list(namespace.get("ignores", []))
+        self.datafiles = list(namespace.get("datafiles", []))
+
+    def __repr__(self):
+        return "Hook(%r, %r)" % (self.name, self.pathname)
+
+def load_hook(name, pathname):
+    namespace = {"__name__": "__py2exe_hook__", "__file__": pathname}
+    execfile(pathname, namespace)
+    return Hook(name, pathname, namespace)
+
+class HookRegistry:
+    def __init__(self, dirs=()):
+        self.dirs = list(dirs) + [HOOKS_DIR]
+        # module name -> pathname of its hook, from the directory
+        # listings; read on first use.
+        self._available = None
+        # module name -> Hook, for the hooks loaded so far
+        self._hooks = {}
+
+    def _scan(self):
+        available = {}
+        # reversed, so that the earlier directories override
+        for dirname in reversed(self.dirs):
+            try:
+                names = os.listdir(dirname)
+            except OSError:
+                continue
+            for fname in names:
+                if fname.startswith("hook-") and fname.endswith(".py"):
+                    available[fname[5:-3]] = os.path.join(dirname, fname)
+        self._available = available
+
+    def has_hook(self, name):
+        if self._available is None:
+            self._scan()
+        return name in self._available
+
+    def get(self, name):
+        """Return the Hook for the module, loading it on first use, or
+        None if there is none.
+        """
+        try:
+            return self._hooks[name]
+        except KeyError:
+            pass
+        if not self.has_hook(name):
+            return None
+        hook = self._hooks[name] = load_hook(name, self._available[name])
+        return hook
+
+    def loaded(self):
+        """Return the hooks loaded so far, sorted by module name."""
+        names = self._hooks.keys()
+        names.sort()
+        return [self._hooks[name] for name in names]
+
+    def aliases(self):
+        result = {}
+        for hook in self.loaded():
+            result.update(hook.aliases)
+        return result
+
+    def ignores(self):
+        result = []
+        for hook in self.loaded():
+            result.extend(hook.ignores)
+        return result
+
+    def platform_ignores(self, platform):
+        """Return the modules to ignore on the platform."""
+        fname = "platform-%s.py" % platform
+        for dirname in self.dirs:
+            pathname = os.path.join(dirname, fname)
+            if os.path.isfile(pathname):
+                return load_hook(platform, pathname).ignores
+        return []
@@ -0,0 +1,2 @@
+# _sre imports these from C code
+hiddenimports = ["copy", "string", "sre"]
@@ -0,0 +1,2 @@
+# cStringIO imports copy_reg from C code
+hiddenimports = ["copy_reg"]
@@ -0,0 +1,2 @@
+# codecs imports the encodings package from C code
+hiddenimports = ["encodings"]
@@ -0,0 +1,2 @@
+# parser imports copy_reg from C code
+hiddenimports = ["copy_reg"]
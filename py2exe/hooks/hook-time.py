@@ -0,0 +1,2 @@
+# time imports _strptime from C code
+hiddenimports = ["_strptime"]
@@ -0,0 +1,24 @@
+# The wxPython extensions create builtin modules: 'wxPython.misc'
+# creates a builtin module named 'miscc', for example.
+aliases = {"clip_dndc": "wxPython.clip_dnd",
+           "cmndlgsc": "wxPython.cmndlgs",
+           "controls2c": "wxPython.controls2",
+           "controlsc": "wxPython.controls",
+           "eventsc": "wxPython.events",
+           "filesysc": "wxPython.filesys",
+           "fontsc": "wxPython.fonts",
+           "framesc": "wxPython.frames",
+           "gdic": "wxPython.gdi",
+           "imagec": "wxPython.image",
+           "mdic": "wxPython.mdi",
+           "misc2c": "wxPython.misc2",
+           "miscc": "wxPython.misc",
+           "printfwc": "wxPython.printfw",
+           "sizersc": "wxPython.sizers",
+           "stattoolc": "wxPython.stattool",
+           "streamsc": "wxPython.streams",
+           "utilsc": "wxPython.utils",
+           "windows2c": "wxPython.windows2",
+           "windows3c": "wxPython.windows3",
+           "windowsc": "wxPython.windows",
+           }
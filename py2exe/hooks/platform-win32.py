@@ -0,0 +1,46 @@
+# Modules the standard library imports on other platforms only.
+ignores = ['AL',
+           'Audio_mac',
+           'Carbon.File',
+           'Carbon.Folder',
+           'Carbon.Folders',
+           'EasyDialogs',
+           'MacOS',
+           'Mailman',
+           'SOCKS',
+           'SUNAUDIODEV',
+           '_dummy_threading',
+           '_emx_link',
+           '_xmlplus',
+           '_xmlrpclib',
+           'al',
+           'bundlebuilder',
+           'ce',
+           'cl',
+           'dbm',
+           'dos',
+           'fcntl',
+           'gestalt',
+           'grp',
+           'ic',
+           'java.lang',
+           'mac',
+           'macfs',
+           'macostools',
+           'mkcwproject',
+           'org.python.core',
+           'os.path',
+           'os2',
+           'poll',
+           'posix',
+           'pwd',
+           'readline',
+           'riscos',
+           'riscosenviron',
+           'riscospath',
+           'rourl2path',
+           'sgi',
+           'sgmlop',
+           'sunaudiodev',
+           'termios',
+           'vms_lib']
@@ -0,0 +1,139 @@
+"""Record the modules a program really imports.
+
+The static analysis includes every module a program might import: the
+imports in try/except blocks, in functions that are never called, and
+for other platforms.  It also misses the modules a program imports by
+computed names, like plugins.  'setup.py py2exe --trace' runs the
+scripts of the build (or the command given with --trace-command, a
+test suite for example) with a tracer, and builds with the modules
+they imported instead.
+
+The tracer is installed by a sitecustomize module in a temporary
+directory on PYTHONPATH, so it also traces the Python subprocesses of
+the command.  When a process exits, it writes the names of the modules
+in sys.modules to a file of its own in the trace directory, together
+with the modules which were already imported when it started, by the
+site module for example.  Modules removed from sys.modules before the
+exit are not seen.
+
+The sitecustomize module loads this file by itself, not through the
+py2exe package, whose __init__ imports distutils and much more, and
+this module only imports builtin modules and what the site module has
+imported before; the modules the tracer loads anyway are left out.
+"""
+
+import marshal
+import os
+import sys
+
+# the environment variable naming the trace directory
+TRACE_ENV = "PY2EXE_IMPORT_TRACE"
+
+# the name the tracer is loaded as in the traced processes
+TRACER_NAME = "_py2exe_importtrace"
+
+# modules of the tracer itself
+TRACER_MODULES = ["sitecustomize", TRACER_NAME]
+
+SITECUSTOMIZE = """\
+# Written by py2exe for --trace; installs the import tracer, and runs
+# the sitecustomize module this one hides, if there is one.
+import sys
+_startup = [name for name, m in sys.modules.items() if m is not None]
+import imp, os
+imp.load_source(%r, %r).install(os.environ[%r], _startup)
+del _startup
+def _chain():
+    here = os.path.dirname(os.path.abspath(__file__))
+    path = [p for p in sys.path if os.path.abspath(p or os.curdir) != here]
+    try:
+        fp, pathname, description = imp.find_module("sitecustomize", path)
+    except ImportError:
+        return
+    # executed in the namespace of this module
+    try:
+        imp.load_module("sitecustomize", fp, pathname, description)
+    finally:
+        if fp:
+            fp.close()
+_chain()
+"""
+
+def loaded_modules():
+    return [name for name, m in sys.modules.items() if m is not None]
+
+def install(dirname, startup=None):
+    """Record the modules imported by this process into a file in
+    dirname when the process exits.  startup lists the modules which
+    were imported before the tracer was loaded; the others imported
+    now are the tracer's."""
+    if startup is None:
+        startup = loaded_modules()
+    startup = set(startup)
+    tracer = [name for name in loaded_modules() if name not in startup]
+    # not the atexit module, the program may not need it; atexit
+    # calls this last if the program imports it.
+    exitfunc = getattr(sys, "exitfunc", None)
+    def write():
+        try:
+            write_trace(dirname, startup, tracer)
+        finally:
+            if exitfunc is not None:
+                exitfunc()
+    sys.exitfunc = write
+
+def write_trace(dirname, startup, tracer=()):
+    data = {"startup": list(startup), "modules": loaded_modules(),
+            "tracer": list(tracer)}
+    f = open(os.path.join(dirname, "trace-%d" % os.getpid()), "wb")
+    try:
+        marshal.dump(data, f)
+    finally:
+        f.close()
+
+def read_traces(dirname):
+    """Return the modules which were already imported at startup, and
+    the modules imported, by the traced processes."""
+    startup = set()
+    modules = set()
+    tracer = set(TRACER_MODULES)
+    for fname in os.listdir(dirname):
+        if not fname.startswith("trace-"):
+            continue
+        f = open(os.path.join(dirname, fname), "rb")
+        try:
+            data = marshal.load(f)
+        finally:
+            f.close()
+        startup.update(data["startup"])
+        modules.update(data["modules"])
+        tracer.update(data.get("tracer", ()))
+    return startup - tracer, modules - tracer
+
+def run_traced(commands, dirname, path=(), verbose=0):
+    """Run the commands (lists of arguments) with the import tracer,
+    and the directories in path on the module search path, and return
+    the result of read_traces()."""
+    import subprocess
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    for fname in os.listdir(dirname):
+        if fname.startswith("trace-"):
+            os.remove(os.path.join(dirname, fname))
+    source = os.path.splitext(os.path.abspath(__file__))[0] + ".py"
+    open(os.path.join(dirname, "sitecustomize.py"), "w").write(
+        SITECUSTOMIZE % (TRACER_NAME, source, TRACE_ENV))
+    env = dict(os.environ)
+    env[TRACE_ENV] = os.path.abspath(dirname)
+    pythonpath = [os.path.abspath(dirname)]
+    pythonpath.extend([os.path.abspath(p or os.curdir) for p in path])
+    if env.get("PYTHONPATH"):
+        pythonpath.append(env["PYTHONPATH"])
+    env["PYTHONPATH"] = os.pathsep.join(pythonpath)
+    for args in commands:
+        if verbose:
+            print "tracing", " ".join(args)
+        status = subprocess.call(args, env=env)
+        if status:
+            print "warning: %s exited with status %d" % (args[0], status)
+    return read_traces(dirname)
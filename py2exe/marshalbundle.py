@@ -0,0 +1,228 @@
+"""Archives of marshalled code objects, an alternative to the zipfile.
+
+With archive_format='marshal' the compiled modules are written into a
+single bundle instead of a zipfile:
+
+    header - 'PY2EXEMB', the magic number of the compiled modules, and
+             the offset of the index as a marshalled int
+    code   - the marshalled code objects of the modules, one after the
+             other
+    index  - a marshalled tuple of (name, offset, size, is_package)
+             entries, sorted by name
+
+The BundleImporter reads the index once, and then imports a module with
+a dictionary lookup and marshal.loads() on the bytes of its code, where
+zipimport has to parse the local header of the entry, check the pyc
+header, and look for source and compiled files under several names.
+It is installed on sys.meta_path, and as path hook for the archive and
+the __path__ of its packages; the path hook returns a PackageImporter,
+which lists the modules of a package for pkgutil.iter_modules() and
+walk_packages(), like zipimport does.
+
+The executables run this module before their boot scripts, so at the
+top it may only import builtin modules.
+"""
+
+import imp
+import marshal
+import sys
+
+MAGIC = "PY2EXEMB"
+# the magic, the magic number and a marshalled int
+HEADER_SIZE = len(MAGIC) + 4 + 5
+
+if sys.platform == "win32":
+    _SEP = "\\"
+else:
+    _SEP = "/"
+
+if getattr(sys, "flags", None) is not None and sys.flags.optimize:
+    _EXT = ".pyo"
+else:
+    _EXT = ".pyc"
+
+BOOT_SOURCE = """\
+def _install_bundle(code, name):
+    import marshal
+    # a dictionary, not a module object, which would clear its
+    # globals when it goes away
+    namespace = {"__name__": "marshalbundle"}
+    exec marshal.loads(code) in namespace
+    namespace["install"](name)
+_install_bundle(%r, %r)
+del _install_bundle
+"""
+
+class BundleImporter(object):
+    def __init__(self, archive):
+        f = open(archive, "rb")
+        header = f.read(HEADER_SIZE)
+        if header[:len(MAGIC)] != MAGIC:
+            f.close()
+            raise ImportError("not a marshal bundle: %r" % archive)
+        if header[len(MAGIC):len(MAGIC)+4] != imp.get_magic():
+            f.close()
+            raise ImportError("bad magic number in %r" % archive)
+        f.seek(marshal.loads(header[len(MAGIC)+4:]))
+        self.index = {}
+        # sorted, for iter_modules()
+        self.names = []
+        for name, offset, size, is_package in marshal.loads(f.read()):
+            self.index[name] = offset, size, is_package
+            self.names.append(name)
+        # 'archive' like zipimporter, the loaders of the extension
+        # modules look for them next to it
+        self.archive = archive
+        self._file = f
+
+    def __repr__(self):
+        return "<BundleImporter object %r>" % self.archive
+
+    def path_hook(self, path):
+        if path == self.archive:
+            return PackageImporter(self, "")
+        if path.startswith(self.archive + _SEP):
+            package = path[len(self.archive) + 1:].replace(_SEP, ".")
+            return PackageImporter(self, package)
+        raise ImportError("not in %r: %r" % (self.archive, path))
+
+    def find_module(self, fullname, path=None):
+        if fullname in self.index:
+            return self
+        return None
+
+    def load_module(self, fullname):
+        code = self.get_code(fullname)
+        mod = sys.modules.get(fullname)
+        new = mod is None
+        if new:
+            mod = sys.modules[fullname] = imp.new_module(fullname)
+        mod.__file__ = self.get_filename(fullname)
+        mod.__loader__ = self
+        if self.index[fullname][2]:
+            mod.__path__ = [self.archive + _SEP + fullname.replace(".", _SEP)]
+        try:
+            exec code in mod.__dict__
+        except:
+            if new and fullname in sys.modules:
+                del sys.modules[fullname]
+            raise
+        return sys.modules[fullname]
+
+    def _entry(self, fullname):
+        try:
+            return self.index[fullname]
+        except KeyError:
+            raise ImportError("can't find module %r in %r" % (fullname, self.archive))
+
+    def get_code(self, fullname):
+        offset, size, is_package = self._entry(fullname)
+        # imports hold the import lock, so nobody else moves the file
+        # position in between
+        self._file.seek(offset)
+        return marshal.loads(self._file.read(size))
+
+    def get_filename(self, fullname):
+        is_package = self._entry(fullname)[2]
+        filename = self.archive + _SEP + fullname.replace(".", _SEP)
+        if is_package:
+            filename += _SEP + "__init__"
+        return filename + _EXT
+
+    def is_package(self, fullname):
+        return bool(self._entry(fullname)[2])
+
+    def get_source(self, fullname):
+        self._entry(fullname)
+        return None
+
+    def get_data(self, pathname):
+        raise IOError("a marshal bundle contains no data files: %r" % pathname)
+
+    def iter_modules(self, prefix="", package=""):
+        """Yield (prefix + name, is_package) for the modules of the
+        package, or the top-level modules."""
+        if package:
+            start = package + "."
+        else:
+            start = ""
+        for name in self.names:
+            if name.startswith(start):
+                name = name[len(start):]
+                if "." not in name:
+                    yield prefix + name, self.index[start + name][2]
+
+class PackageImporter(object):
+    """The importer of a sys.path or __path__ entry of the bundle;
+    the modules are found through the BundleImporter."""
+    def __init__(self, bundle, package):
+        self.bundle = bundle
+        self.package = package
+
+    def __repr__(self):
+        return "<PackageImporter object %r of %r>" % (self.package,
+                                                      self.bundle.archive)
+
+    def find_module(self, fullname, path=None):
+        return self.bundle.find_module(fullname, path)
+
+    def iter_modules(self, prefix=""):
+        return self.bundle.iter_modules(prefix, self.package)
+
+def install(name):
+    """Install a BundleImporter for the entry of sys.path which is, or
+    ends with, the archive name, and return it.  Return None if there
+    is no such entry."""
+    for entry in sys.path:
+        if entry == name or entry.endswith(_SEP + name):
+            importer = BundleImporter(entry)
+            sys.meta_path.insert(0, importer)
+            sys.path_hooks.insert(0, importer.path_hook)
+            # replace what the other hooks said about the archive
+            sys.path_importer_cache[entry] = importer.path_hook(entry)
+            return importer
+    return None
+
+def boot_code(name):
+    """Return a code object which installs the importer for the archive
+    name, for the executables to run before their boot scripts.  It
+    does not leave names behind in the namespace of the scripts."""
+    import os
+    source = os.path.splitext(__file__)[0] + ".py"
+    code = compile(open(source, "U").read(), os.path.basename(source), "exec")
+    return compile(BOOT_SOURCE % (marshal.dumps(code), name),
+                   "<install marshal bundle>", "exec")
+
+def write_bundle(filename, files):
+    """Write the compiled modules into the bundle filename.  files is a
+    list of (archive name, contents of the .pyc or .pyo file) pairs.
+    Return a dictionary mapping the archive names to the sizes of
+    their code in the bundle."""
+    import os
+    from py2exe.codetransform import module_name
+    magic = imp.get_magic()
+    entries = []
+    sizes = {}
+    f = open(filename, "wb")
+    try:
+        f.write(MAGIC + magic + marshal.dumps(0))
+        offset = HEADER_SIZE
+        for arcname, data in files:
+            if data[:4] != magic:
+                raise ValueError("%s is not a module compiled by this Python" % arcname)
+            code = data[8:]
+            base = os.path.basename(arcname.replace("\\", "/"))
+            is_package = os.path.splitext(base)[0] == "__init__"
+            entries.append((module_name(arcname), offset, len(code), is_package))
+            f.write(code)
+            offset += len(code)
+            sizes[arcname] = len(code)
+        if offset > 0x7FFFFFFF:
+            raise ValueError("%s would be larger than 2 GB" % filename)
+        entries.sort()
+        f.write(marshal.dumps(tuple(entries)))
+        f.seek(len(MAGIC) + 4)
+        f.write(marshal.dumps(offset))
+    finally:
+        f.close()
+    return sizes
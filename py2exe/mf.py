@@ -9,6 +9,7 @@ import os
 import sys
 import types
 import struct
+import array
 
 if hasattr(sys.__stdout__, "newlines"):
     READ_MODE = "U"  # universal line endings
@@ -16,6 +17,11 @@ else:
     # remain compatible with Python  < 2.3
     READ_MODE = "r"
 
+try:
+    set
+except NameError:
+    from sets import Set as set
+
 LOAD_CONST = chr(dis.opname.index('LOAD_CONST'))
 IMPORT_NAME = chr(dis.opname.index('IMPORT_NAME'))
 STORE_NAME = chr(dis.opname.index('STORE_NAME'))
@@ -23,6 +29,44 @@ STORE_GLOBAL = chr(dis.opname.index('STORE_GLOBAL'))
 STORE_OPS = [STORE_NAME, STORE_GLOBAL]
 HAVE_ARGUMENT = chr(dis.HAVE_ARGUMENT)
 
+# The same opcodes as integers, for scan_code_objects()
+_LOAD_CONST = ord(LOAD_CONST)
+_IMPORT_NAME = ord(IMPORT_NAME)
+_STORE_NAME = ord(STORE_NAME)
+_STORE_GLOBAL = ord(STORE_GLOBAL)
+_EXTENDED_ARG = dis.EXTENDED_ARG
+_HAVE_ARGUMENT = dis.HAVE_ARGUMENT
+_LOAD_NAME = dis.opname.index('LOAD_NAME')
+_LOAD_GLOBAL = dis.opname.index('LOAD_GLOBAL')
+_LOAD_ATTR = dis.opname.index('LOAD_ATTR')
+_LOAD_FAST = dis.opname.index('LOAD_FAST')
+_CALL_FUNCTION = dis.opname.index('CALL_FUNCTION')
+
+# Functions which import the module named by their first argument
+DYNAMIC_IMPORTERS = ("__import__", "import_module", "importlib.import_module")
+
+def dynamic_import_event(function, name):
+    """Return the event for a call of one of the DYNAMIC_IMPORTERS
+    with the constant module name as first argument, or None if the
+    name is not a module name.  __import__() does what an import
+    statement does, import_module() does absolute or, with leading
+    dots, relative imports.
+    """
+    if type(name) is not str:
+        return None
+    level = len(name) - len(name.lstrip("."))
+    for part in name[level:].split("."):
+        if not part or not (part[0].isalpha() or part[0] == "_") \
+               or not part.replace("_", "a").isalnum():
+            return None
+    if function == "__import__":
+        if level:
+            return None
+        return ("import", (None, name))
+    if level:
+        return ("relative_import", (level, None, name[level:]))
+    return ("absolute_import", (None, name))
+
 # !!! NOTE BEFORE INCLUDING IN PYTHON DISTRIBUTION !!!
 # To clear up issues caused by the duplication of data structures between
 # the real Python modulefinder and this duplicate version, packagePathMap
@@ -58,20 +102,136 @@ def ReplacePackage(oldname, newname):
     replacePackageMap[oldname] = newname
 
 
-class Module:
+def scan_code_objects(co):
+    """Return the 'interesting' opcode combinations in the code object
+    and all code objects nested in it, as a list of (what, args) tuples.
+
+    This yields the same results as ModuleFinder.scan_opcodes_25() (or
+    scan_opcodes() for Python 2.4 and older) applied to the code object
+    and, recursively, to all nested code objects, plus the imports done
+    by calling one of the DYNAMIC_IMPORTERS with a constant string.  The
+    bytecode is walked by offset instead of slicing the remaining code
+    for each instruction, EXTENDED_ARG prefixes are honored, and the
+    nested code objects are processed from an explicit stack.
+    """
+    events = []
+    append = events.append
+    code_type = type(co)
+    have_levels = sys.version_info >= (2, 5)
+    stack = [co]
+    while stack:
+        co = stack.pop()
+        code = array.array('B', co.co_code)
+        names = co.co_names
+        consts = co.co_consts
+        end = len(code)
+        i = 0
+        extended_arg = 0
+        # The opargs of the two preceding instructions, if they were
+        # LOAD_CONST, else -1.
+        const_1 = const_2 = -1
+        # The name of the function (or module) loaded by the preceding
+        # instructions, if it can import modules.
+        callee = None
+        # (event, number of arguments) of a dynamic import, until the
+        # call with exactly these arguments is seen.
+        pending = None
+        while i < end:
+            op = code[i]
+            if op < _HAVE_ARGUMENT:
+                i = i + 1
+                const_1 = const_2 = -1
+                callee = pending = None
+                continue
+            oparg = code[i+1] + code[i+2] * 256 + extended_arg
+            i = i + 3
+            extended_arg = 0
+            if op == _EXTENDED_ARG:
+                extended_arg = oparg * 65536
+                continue
+            if pending is not None:
+                event, nargs = pending
+                pending = None
+                if op == _CALL_FUNCTION and oparg == nargs:
+                    append(event)
+                elif nargs == 1 and event[0] != "import" \
+                         and op in (_LOAD_NAME, _LOAD_GLOBAL, _LOAD_FAST, _LOAD_CONST):
+                    # import_module(name, package)
+                    pending = event, 2
+            if op == _LOAD_CONST:
+                if callee is not None and callee != "importlib":
+                    event = dynamic_import_event(callee, consts[oparg])
+                    if event is not None:
+                        pending = event, 1
+                callee = None
+                const_2 = const_1
+                const_1 = oparg
+                continue
+            if op == _LOAD_NAME or op == _LOAD_GLOBAL or op == _LOAD_FAST:
+                if op == _LOAD_FAST:
+                    callee = co.co_varnames[oparg]
+                else:
+                    callee = names[oparg]
+                if callee != "importlib" and callee not in DYNAMIC_IMPORTERS:
+                    callee = None
+                const_1 = const_2 = -1
+                continue
+            if op == _LOAD_ATTR and callee == "importlib" \
+                   and names[oparg] == "import_module":
+                callee = "importlib.import_module"
+                const_1 = const_2 = -1
+                continue
+            callee = None
+            if op == _IMPORT_NAME:
+                if have_levels:
+                    if const_2 >= 0:
+                        level = consts[const_2]
+                        fromlist = consts[const_1]
+                        if level == -1: # normal import
+                            append(("import", (fromlist, names[oparg])))
+                        elif level == 0: # absolute import
+                            append(("absolute_import", (fromlist, names[oparg])))
+                        else: # relative import
+                            append(("relative_import", (level, fromlist, names[oparg])))
+                elif const_1 >= 0:
+                    append(("import", (consts[const_1], names[oparg])))
+            elif op == _STORE_NAME or op == _STORE_GLOBAL:
+                append(("store", (names[oparg],)))
+            const_1 = const_2 = -1
+        nested = [c for c in consts if isinstance(c, code_type)]
+        nested.reverse()
+        stack.extend(nested)
+    return events
+
+
+def _intern(name):
+    # Module and global names are repeated all over the module graph.
+    if type(name) is str:
+        return intern(name)
+    return name
+
+class Module(object):
+    # There is one of these for every module found, and they are kept
+    # until the build is done, so they are slotted.
+    __slots__ = ("__name__", "__file__", "__path__", "__code__",
+                 "globalnames", "starimports", "submodules",
+                 "__pydfile__", "__weakref__")
 
     def __init__(self, name, file=None, path=None):
-        self.__name__ = name
+        self.__name__ = _intern(name)
         self.__file__ = file
         self.__path__ = path
         self.__code__ = None
         # The set of global names that are assigned to in the module.
         # This includes those names imported through starimports of
         # Python modules.
-        self.globalnames = {}
+        self.globalnames = set()
         # The set of starimports this module did that could not be
         # resolved, ie. a starimport from a non-Python module.
-        self.starimports = {}
+        self.starimports = set()
+        # The submodules of a package that have been imported, by
+        # their name in the package.
+        self.submodules = {}
 
     def __repr__(self):
         s = "Module(%r" % (self.__name__,)
@@ -226,7 +386,7 @@ class ModuleFinder:
                     all = self.find_all_submodules(m)
                     if all:
                         self.ensure_fromlist(m, all, 1)
-            elif not hasattr(m, sub):
+            elif sub not in m.submodules:
                 subname = "%s.%s" % (m.__name__, sub)
                 submod = self.import_module(sub, subname, m)
                 if not submod:
@@ -285,7 +445,7 @@ class ModuleFinder:
         finally:
             if fp: fp.close()
         if parent:
-            setattr(parent, partname, m)
+            parent.submodules[partname] = m
         self.msgout(3, "import_module ->", m)
         return m
 
@@ -295,16 +455,7 @@ class ModuleFinder:
             m = self.load_package(fqname, pathname)
             self.msgout(2, "load_module ->", m)
             return m
-        if type == imp.PY_SOURCE:
-            co = compile(fp.read()+'\n', pathname, 'exec')
-        elif type == imp.PY_COMPILED:
-            if fp.read(4) != imp.get_magic():
-                self.msgout(2, "raise ImportError: Bad magic number", pathname)
-                raise ImportError, "Bad magic number in %s" % pathname
-            fp.read(4)
-            co = marshal.load(fp)
-        else:
-            co = None
+        co = self.load_code(fp, pathname, type)
         m = self.add_module(fqname)
         m.__file__ = pathname
         if co:
@@ -315,13 +466,26 @@ class ModuleFinder:
         self.msgout(2, "load_module ->", m)
         return m
 
+    def load_code(self, fp, pathname, type):
+        # Return the code object for a source or compiled module, or
+        # None for all other module types.
+        if type == imp.PY_SOURCE:
+            return compile(fp.read()+'\n', pathname, 'exec')
+        elif type == imp.PY_COMPILED:
+            if fp.read(4) != imp.get_magic():
+                self.msgout(2, "raise ImportError: Bad magic number", pathname)
+                raise ImportError, "Bad magic number in %s" % pathname
+            fp.read(4)
+            return marshal.loads(fp.read())
+        return None
+
     def _add_badmodule(self, name, caller):
         if name not in self.badmodules:
-            self.badmodules[name] = {}
+            self.badmodules[_intern(name)] = set()
         if caller:
-            self.badmodules[name][caller.__name__] = 1
+            self.badmodules[name].add(caller.__name__)
         else:
-            self.badmodules[name]["-"] = 1
+            self.badmodules[name].add("-")
 
     def _safe_import_hook(self, name, caller, fromlist, level=-1):
         # wrapper for self.import_hook() that won't raise ImportError
@@ -401,16 +565,27 @@ class ModuleFinder:
             else:
                 code = code[1:]
 
+    def get_scan_events(self, co):
+        # Return the list of 'interesting' opcode combinations found in
+        # the code object and all code objects nested in it, in the
+        # order scan_code() has always processed them.  The result only
+        # depends on the code object, so it may be computed elsewhere
+        # (or earlier) and replayed with process_scan_events().
+        return scan_code_objects(co)
+
     def scan_code(self, co, m):
-        code = co.co_code
-        if sys.version_info >= (2, 5):
-            scanner = self.scan_opcodes_25
-        else:
-            scanner = self.scan_opcodes
-        for what, args in scanner(co):
+        self.process_scan_events(self.get_scan_events(co), m)
+
+    def has_code(self, m):
+        # Return true if the globalnames of module m are known, which
+        # is the case for modules loaded from source or bytecode.
+        return m.__code__ is not None
+
+    def process_scan_events(self, events, m):
+        for what, args in events:
             if what == "store":
                 name, = args
-                m.globalnames[name] = 1
+                m.globalnames.add(_intern(name))
             elif what in ("import", "absolute_import"):
                 fromlist, name = args
                 have_star = 0
@@ -422,38 +597,43 @@ class ModuleFinder:
                 else: level = -1
                 self._safe_import_hook(name, m, fromlist, level=level)
                 if have_star:
-                    # We've encountered an "import *". If it is a Python module,
-                    # the code has already been parsed and we can suck out the
-                    # global names.
-                    mm = None
-                    if m.__path__:
-                        # At this point we don't know whether 'name' is a
-                        # submodule of 'm' or a global module. Let's just try
-                        # the full name first.
-                        mm = self.modules.get(m.__name__ + "." + name)
-                    if mm is None:
-                        mm = self.modules.get(name)
-                    if mm is not None:
-                        m.globalnames.update(mm.globalnames)
-                        m.starimports.update(mm.starimports)
-                        if mm.__code__ is None:
-                            m.starimports[name] = 1
-                    else:
-                        m.starimports[name] = 1
+                    self.merge_starimport(m, name)
             elif what == "relative_import":
                 level, fromlist, name = args
                 if name:
                     self._safe_import_hook(name, m, fromlist, level=level)
                 else:
                     parent = self.determine_parent(m, level=level)
-                    self._safe_import_hook(parent.__name__, None, fromlist, level=0)
+                    self._safe_import_hook(parent.__name__, m, fromlist, level=0)
             else:
                 # We don't expect anything else from the generator.
                 raise RuntimeError(what)
 
-        for c in co.co_consts:
-            if isinstance(c, type(co)):
-                self.scan_code(c, m)
+    def find_starimport(self, m, name):
+        # Return the module 'from name import *' in module m refers to,
+        # or None.
+        mm = None
+        if m.__path__:
+            # At this point we don't know whether 'name' is a
+            # submodule of 'm' or a global module. Let's just try
+            # the full name first.
+            mm = self.modules.get(m.__name__ + "." + name)
+        if mm is None:
+            mm = self.modules.get(name)
+        return mm
+
+    def merge_starimport(self, m, name):
+        # We've encountered an "import *". If it is a Python module,
+        # the code has already been parsed and we can suck out the
+        # global names.
+        mm = self.find_starimport(m, name)
+        if mm is not None:
+            m.globalnames.update(mm.globalnames)
+            m.starimports.update(mm.starimports)
+            if not self.has_code(mm):
+                m.starimports.add(name)
+        else:
+            m.starimports.add(name)
 
     def load_package(self, fqname, pathname):
         self.msgin(2, "load_package", fqname, pathname)
@@ -493,6 +673,10 @@ class ModuleFinder:
                 return (None, None, ("", "", imp.C_BUILTIN))
 
             path = self.path
+        return self.find_module_in_path(name, path)
+
+    def find_module_in_path(self, name, path):
+        # Locate module 'name' in the list of directories 'path'.
         return imp.find_module(name, path)
 
     def report(self):
@@ -519,7 +703,7 @@ class ModuleFinder:
             print
             print "Missing modules:"
             for name in missing:
-                mods = self.badmodules[name].keys()
+                mods = list(self.badmodules[name])
                 mods.sort()
                 print "?", name, "imported from", ', '.join(mods)
         # Print modules that may be missing, but then again, maybe not...
@@ -528,7 +712,7 @@ class ModuleFinder:
             print "Submodules thay appear to be missing, but could also be",
             print "global names in the parent package:"
             for name in maybe:
-                mods = self.badmodules[name].keys()
+                mods = list(self.badmodules[name])
                 mods.sort()
                 print "?", name, "imported from", ', '.join(mods)
 
@@ -687,14 +871,14 @@ if __name__ == '__main__':
 import tempfile
 import urllib
 
-try:
-    set
-except NameError:
-    from sets import Set as set
+from py2exe.pathindex import PathIndex, open_file
 
 Base = ModuleFinder
 del ModuleFinder
 
+# the types of the modules ModuleFinder.rescan() scans again
+_SCANNED_TYPES = (imp.PY_SOURCE, imp.PY_COMPILED, imp.PKG_DIRECTORY)
+
 # Much inspired by Toby Dickenson's code:
 # http://www.tarind.com/depgraph.html
 class ModuleFinder(Base):
@@ -703,36 +887,587 @@ class ModuleFinder(Base):
         self._types = {}
         self._last_caller = None
         self._scripts = set()
+        # The modules that were not imported by other modules: the
+        # scripts, and what was imported or loaded explicitly.
+        self._roots = set()
+        # An optional py2exe.mfcache.ScanCache instance
+        self.cache = kw.pop("cache", None)
+        # An optional py2exe.mfcache.StdlibIndex, which replaces the
+        # cache for the files of the standard library.
+        self.stdlib_index = kw.pop("stdlib_index", None)
+        # A py2exe.pathindex.PathIndex which answers the module lookups
+        # from directory listings; with None, imp.find_module is used.
+        self.path_index = kw.pop("path_index", PathIndex())
+        # Without keep_code, the code objects are dropped as soon as the
+        # modules have been scanned; get_code() loads them again.
+        self.keep_code = kw.pop("keep_code", 1)
+        # With use_compiled, source files are not compiled when there is
+        # an up-to-date .pyc (or .pyo) file next to them.
+        self.use_compiled = kw.pop("use_compiled", 1)
+        self.compiled_hits = 0
+        self.compiled_misses = 0
+        # With more than one job, source files are compiled and
+        # scanned in worker processes (see ScanWorkers).  Modules are then
+        # registered when they are found, and their scan results are
+        # processed later from a work list.
+        self.jobs = kw.pop("jobs", 1)
+        self._workers = None
+        self._worklist = []
+        self._unscanned = set()
+        self._deferred_starimports = []
+        self._nesting = 0
+        # 'bytecode' scans the compiled code; 'ast' scans the syntax tree
+        # of source files, and classifies the imports (see
+        # py2exe.astscan).  Imports of the kinds listed in drop_imports
+        # are ignored.
+        self.analysis = kw.pop("analysis", "bytecode")
+        self.drop_imports = kw.pop("drop_imports", ())
+        self._import_kind = None
+        # (caller, module) -> kind of the most certain import seen
+        self._edge_kinds = {}
+        # (caller, what, args, kind) of the ignored imports
+        self._dropped_imports = []
+        # A py2exe.hooks.HookRegistry; the hook of a module is applied
+        # when the module is found.  The hidden imports are done later
+        # from the work list.
+        self.hooks = kw.pop("hooks", None)
+        self._hook_imports = []
+        # Called with each source module and its code object (or
+        # None) as soon as the module has been scanned, so that later
+        # stages can start before the analysis is finished.
+        self.listener = kw.pop("listener", None)
+        # An optional py2exe.graphstore.GraphStore which keeps the
+        # modules, the missing modules, the import edges and the module
+        # types in a database instead of in memory.
+        self.store = kw.pop("store", None)
         Base.__init__(self, *args, **kw)
+        # the hooks add to the excludes
+        self.excludes = list(self.excludes)
+        if self.store is not None:
+            self.modules = self.store.modules
+            self.badmodules = self.store.badmodules
+            self._depgraph = self.store.edges
+            self._edge_kinds = self.store.edge_kinds
+            self._types = self.store.types
+
+    def _discover(self, func, *args):
+        # Call one of the public entry points, and process the work
+        # list when the outermost call returns.
+        self._nesting += 1
+        try:
+            result = func(self, *args)
+        finally:
+            self._nesting -= 1
+        if self._nesting == 0 and (self._worklist or self._hook_imports):
+            self._nesting += 1
+            try:
+                self.process_worklist()
+            finally:
+                self._nesting -= 1
+        return result
 
     def run_script(self, pathname):
         # Scripts always end in the __main__ module, but we possibly
         # have more than one script in py2exe, so we want to keep
         # *all* the pathnames.
         self._scripts.add(pathname)
-        Base.run_script(self, pathname)
+        self._roots.add("__main__")
+        self._discover(Base.run_script, pathname)
+
+    def load_file(self, pathname):
+        self._roots.add(os.path.splitext(os.path.basename(pathname))[0])
+        self._discover(Base.load_file, pathname)
+
+    def load_package(self, fqname, pathname):
+        if self._nesting == 0:
+            self._roots.add(fqname)
+        return self._discover(Base.load_package, fqname, pathname)
 
     def import_hook(self, name, caller=None, fromlist=None, level=-1):
         old_last_caller = self._last_caller
         try:
             self._last_caller = caller
-            return Base.import_hook(self,name,caller,fromlist,level)
+            return self._discover(Base.import_hook, name, caller, fromlist, level)
         finally:
             self._last_caller = old_last_caller
 
+    def add_module(self, fqname):
+        if self.hooks is not None and fqname not in self.modules:
+            hook = self.hooks.get(fqname)
+            if hook is not None:
+                self.msg(2, "applying", hook)
+                for name in hook.excludes:
+                    if name not in self.excludes:
+                        self.excludes.append(name)
+                if hook.hiddenimports:
+                    self._hook_imports.append((fqname, hook.hiddenimports))
+        return Base.add_module(self, fqname)
+
+    def _add_edge(self, caller, name):
+        self._depgraph.setdefault(caller, set()).add(name)
+        kind = self._import_kind
+        if kind is not None:
+            old = self._edge_kinds.get((caller, name))
+            if old is None or _KIND_ORDER.index(kind) < _KIND_ORDER.index(old):
+                self._edge_kinds[(caller, name)] = kind
+
     def import_module(self,partnam,fqname,parent):
         r = Base.import_module(self,partnam,fqname,parent)
-        if r is not None and self._last_caller:
-            self._depgraph.setdefault(self._last_caller.__name__, set()).add(r.__name__)
+        if r is not None:
+            if self._last_caller:
+                self._add_edge(self._last_caller.__name__, r.__name__)
+            elif self._nesting == 1:
+                # import_hook() called from the outside
+                self._roots.add(r.__name__)
         return r
 
+    def ensure_fromlist(self, m, fromlist, recursive=0):
+        # The base class does not import submodules again that are
+        # already attributes of the package.  Record the edges to them
+        # anyway, otherwise the graph depends on the order in which the
+        # modules have been found.
+        if self._last_caller:
+            for sub in fromlist:
+                submod = m.submodules.get(sub)
+                if submod is not None:
+                    self._add_edge(self._last_caller.__name__, submod.__name__)
+        Base.ensure_fromlist(self, m, fromlist, recursive)
+
+    def _events_cache(self, pathname):
+        # Return the cache for the scan events of the file, or None.
+        if self.stdlib_index is not None and pathname \
+               and self.stdlib_index.covers(pathname):
+            return self.stdlib_index
+        return self.cache
+
     def load_module(self, fqname, fp, pathname, (suffix, mode, typ)):
-        r = Base.load_module(self, fqname, fp, pathname, (suffix, mode, typ))
+        events = None
+        cache = self._events_cache(pathname)
+        if cache is not None and typ in (imp.PY_SOURCE, imp.PY_COMPILED):
+            events = cache.get_events(pathname)
+        if events is None and typ == imp.PY_SOURCE:
+            if self.jobs > 1:
+                self.msgin(2, "load_module", fqname, "(deferred)", pathname)
+                m = self.add_module(fqname)
+                m.__file__ = pathname
+                self._types[fqname] = typ
+                self._unscanned.add(fqname)
+                result = self._get_workers().submit(pathname, self.analysis,
+                                                    self.use_compiled)
+                self._worklist.append((m, pathname, result))
+                self.msgout(2, "load_module ->", m)
+                return m
+            if self.analysis == "ast":
+                events = self.scan_source(fp.read(), pathname)
+                if cache is not None:
+                    cache.put_events(pathname, typ, events)
+        if events is not None:
+            self.msgin(2, "load_module", fqname, "(scanned)", pathname)
+            m = self.add_module(fqname)
+            m.__file__ = pathname
+            self._types[fqname] = typ
+            self.process_scan_events(events, m)
+            if typ == imp.PY_SOURCE:
+                self.module_done(m)
+            self.module_finished(m)
+            self.msgout(2, "load_module ->", m)
+            return m
+        if typ in (imp.PY_SOURCE, imp.PY_COMPILED):
+            # scan_code() and has_code() need the type
+            self._types[fqname] = typ
+            try:
+                r = Base.load_module(self, fqname, fp, pathname, (suffix, mode, typ))
+            except ImportError:
+                del self._types[fqname]
+                raise
+        else:
+            r = Base.load_module(self, fqname, fp, pathname, (suffix, mode, typ))
         if r is not None:
             self._types[r.__name__] = typ
+            if typ == imp.PY_SOURCE:
+                self.module_done(r)
+            if not self.keep_code:
+                r.__code__ = None
+            self.module_finished(r)
         return r
 
-    def create_xref(self):
+    def module_done(self, m):
+        if self.listener is not None:
+            self.listener(m, m.__code__)
+
+    def module_finished(self, m):
+        # The module is complete (or has changed again); the store may
+        # write it out and drop it from memory.
+        if self.store is not None:
+            self.store.modules.finish(m)
+
+    def load_code(self, fp, pathname, typ):
+        if typ == imp.PY_SOURCE and self.use_compiled:
+            co = load_compiled(pathname)
+            if co is not None:
+                self.compiled_hits += 1
+                return co
+            self.compiled_misses += 1
+        return Base.load_code(self, fp, pathname, typ)
+
+    def get_code(self, m):
+        """Return the code object of the module m, or None if it is not
+        a Python module.  The code is loaded again if it has been
+        dropped, or if the module has been replayed from the cache.
+        """
+        if m.__code__ is not None:
+            return m.__code__
+        typ = self._types.get(m.__name__)
+        if typ == imp.PKG_DIRECTORY:
+            fp, pathname, (suffix, mode, typ) = self.find_module("__init__", m.__path__)
+        elif typ in (imp.PY_SOURCE, imp.PY_COMPILED):
+            pathname = m.__file__
+            if typ == imp.PY_SOURCE:
+                fp = open_file(pathname, READ_MODE)
+            else:
+                fp = open_file(pathname, "rb")
+        else:
+            return None
+        try:
+            co = self.load_code(fp, pathname, typ)
+        finally:
+            if fp:
+                fp.close()
+        if co is not None and self.replace_paths:
+            co = self.replace_paths_in_code(co)
+        return co
+
+    def _get_workers(self):
+        if self._workers is None:
+            self._workers = ScanWorkers(self.jobs)
+        return self._workers
+
+    def process_worklist(self):
+        # Process the scan results of the deferred modules, which
+        # usually finds and submits more of them.
+        while self._worklist or self._hook_imports:
+            if self._hook_imports:
+                self.process_hook_imports()
+                continue
+            m, pathname, result = self._worklist.pop(0)
+            events, compiled = result.get()
+            if compiled:
+                self.compiled_hits += 1
+            elif events is not None and self.use_compiled and self.analysis != "ast":
+                self.compiled_misses += 1
+            if events is None:
+                # Compiling failed in the worker; do it here again
+                # to get the proper error.
+                fp = open_file(pathname, READ_MODE)
+                try:
+                    if self.analysis == "ast":
+                        events = self.scan_source(fp.read(), pathname)
+                    else:
+                        co = self.load_code(fp, pathname, imp.PY_SOURCE)
+                        events = self.get_scan_events(co)
+                finally:
+                    fp.close()
+            self._unscanned.discard(m.__name__)
+            cache = self._events_cache(pathname)
+            if cache is not None:
+                cache.put_events(pathname, imp.PY_SOURCE, events)
+            self.process_scan_events(events, m)
+            self.module_done(m)
+            self.module_finished(m)
+        # Star imports from modules that were not yet scanned must be
+        # merged now; repeat until chains of them are resolved.
+        changed = 1
+        while changed:
+            changed = 0
+            for m, name in self._deferred_starimports:
+                size = len(m.globalnames), len(m.starimports)
+                Base.merge_starimport(self, m, name)
+                if size != (len(m.globalnames), len(m.starimports)):
+                    changed = 1
+                    self.module_finished(m)
+        self._deferred_starimports = []
+
+    def process_hook_imports(self):
+        # Import the hidden imports of the modules with hooks, on
+        # behalf of these modules, unless they have been removed
+        # from the graph meanwhile.
+        while self._hook_imports:
+            fqname, imports = self._hook_imports.pop(0)
+            caller = self.modules.get(fqname)
+            if caller is None:
+                continue
+            for name in imports:
+                self._safe_import_hook(name, caller, None, level=0)
+
+    def merge_starimport(self, m, name):
+        mm = self.find_starimport(m, name)
+        if mm is not None and mm.__name__ in self._unscanned:
+            self._deferred_starimports.append((m, name))
+        Base.merge_starimport(self, m, name)
+
+    def rescan(self, pathnames):
+        """Scan the modules of the changed (or deleted) files again, and
+        update the graph.  Returns the names of the modules scanned
+        again, and of the modules added to and removed from the graph.
+        """
+        if self.path_index is not None:
+            self.path_index.refresh()
+        if self.cache is not None:
+            self.cache.refresh()
+        before = set(self.modules.keys())
+        changed = set()
+        for pathname in pathnames:
+            if pathname in self._scripts:
+                changed.add("__main__")
+        for name in before:
+            m = self.modules[name]
+            if m.__file__ in pathnames and self._types.get(name) in _SCANNED_TYPES:
+                changed.add(name)
+        # Modules whose file is gone are removed, and their importers
+        # scanned again instead.
+        importers = {}
+        for caller, names in self._depgraph.items():
+            for name in names:
+                importers.setdefault(name, set()).add(caller)
+        todo = list(changed)
+        rescanned = set()
+        while todo:
+            name = todo.pop()
+            if name in rescanned or name not in self.modules:
+                continue
+            m = self.modules[name]
+            if name != "__main__" and not os.path.exists(m.__file__):
+                self._forget_module(name)
+                todo.extend(importers.get(name, ()))
+                continue
+            rescanned.add(name)
+        for name in rescanned:
+            self._forget_imports(name)
+            # the hidden imports are done again
+            if self.hooks is not None:
+                hook = self.hooks.get(name)
+                if hook is not None and hook.hiddenimports:
+                    self._hook_imports.append((name, hook.hiddenimports))
+        for name in rescanned:
+            self._discover(ModuleFinder._scan_again, self.modules[name])
+        self._remove_unreachable()
+        self.apply_hook_excludes()
+        after = set(self.modules.keys())
+        return rescanned, after - before, before - after
+
+    def _scan_again(self, m):
+        name = m.__name__
+        m.globalnames = set()
+        m.starimports = set()
+        m.__code__ = None
+        if name == "__main__":
+            for pathname in self._scripts:
+                Base.run_script(self, pathname)
+        elif self._types[name] == imp.PKG_DIRECTORY:
+            Base.load_package(self, name, m.__path__[0])
+        else:
+            ext = os.path.splitext(m.__file__)[1]
+            for suffix, mode, typ in imp.get_suffixes():
+                if suffix == ext:
+                    break
+            else:
+                mode, typ = READ_MODE, imp.PY_SOURCE
+            fp = open_file(m.__file__, mode)
+            try:
+                self.load_module(name, fp, m.__file__, (ext, mode, typ))
+            finally:
+                fp.close()
+
+    def _forget_imports(self, name):
+        # Remove what the module imported from the graph.
+        if name in self._depgraph:
+            del self._depgraph[name]
+        for caller, imported in self._edge_kinds.keys():
+            if caller == name:
+                del self._edge_kinds[(caller, imported)]
+        for bad in self.badmodules.keys():
+            callers = self.badmodules[bad]
+            callers.discard(name)
+            if not len(callers):
+                del self.badmodules[bad]
+
+    def _forget_module(self, name):
+        self._forget_imports(name)
+        del self.modules[name]
+        self._types.pop(name, None)
+        i = name.rfind(".")
+        if i >= 0 and name[:i] in self.modules:
+            self.modules[name[:i]].submodules.pop(name[i+1:], None)
+
+    def _remove_unreachable(self):
+        # Remove the modules no longer reachable from the roots.
+        self.retain(self.reachable(self._roots))
+
+    def reachable(self, names):
+        """Return the names of the modules the named modules import,
+        directly or indirectly, including themselves and their packages.
+        """
+        reachable = set()
+        todo = [name for name in names if name in self.modules]
+        while todo:
+            name = todo.pop()
+            if name in reachable:
+                continue
+            reachable.add(name)
+            # Some modules import __main__, that does not make them
+            # need the scripts.
+            todo.extend([n for n in self._depgraph.get(name, ()) if n != "__main__"])
+            # a module needs its packages
+            while "." in name:
+                name = name[:name.rfind(".")]
+                todo.append(name)
+        return reachable
+
+    def retain(self, names):
+        """Remove all modules except the named ones and their packages
+        from the graph.  Returns the names of the removed modules.
+        """
+        keep = set()
+        for name in names:
+            keep.add(name)
+            while "." in name:
+                name = name[:name.rfind(".")]
+                keep.add(name)
+        removed = [name for name in self.modules.keys() if name not in keep]
+        for name in removed:
+            self._forget_module(name)
+        if removed:
+            # and the imports of the removed modules by the others
+            gone = set(removed)
+            for caller in self._depgraph.keys():
+                imports = self._depgraph[caller]
+                for name in [n for n in imports if n in gone]:
+                    imports.discard(name)
+            for caller, imported in self._edge_kinds.keys():
+                if imported in gone:
+                    del self._edge_kinds[(caller, imported)]
+        return removed
+
+    def apply_hook_excludes(self):
+        """Remove the modules which the hooks of the modules found
+        exclude, and the modules only they import.  A hook is loaded
+        when its module is found, so the modules found before that
+        are not excluded by the scan itself.  The roots are kept.
+        Returns the names of the removed modules.
+        """
+        if self.hooks is None:
+            return []
+        excludes = set()
+        for hook in self.hooks.loaded():
+            if hook.name in self.modules:
+                excludes.update(hook.excludes)
+        excluded = []
+        for name in self.modules.keys():
+            if name in self._roots:
+                continue
+            # the submodules of excluded packages too
+            parts = name.split(".")
+            for i in range(1, len(parts) + 1):
+                if ".".join(parts[:i]) in excludes:
+                    excluded.append(name)
+                    break
+        if not excluded:
+            return []
+        for name in excludes:
+            if name not in self.excludes:
+                self.excludes.append(name)
+        before = self.reachable(self._roots)
+        for name in excluded:
+            self._forget_module(name)
+        after = self.reachable(self._roots)
+        removed = self.retain([name for name in self.modules.keys()
+                               if name not in before or name in after])
+        return excluded + removed
+
+    def close(self):
+        # Shut down the worker processes, if any.
+        if self._workers is not None:
+            self._workers.close()
+            self._workers = None
+        if self.store is not None:
+            self.store.set_roots(self._roots)
+            self.store.flush()
+
+    def scan_source(self, source, pathname):
+        # Return the events for a source file in 'ast' analysis mode.
+        from py2exe import astscan
+        return astscan.scan_source(source+'\n', pathname)
+
+    def process_scan_events(self, events, m):
+        if self.analysis != "ast":
+            Base.process_scan_events(self, events, m)
+            return
+        for event in events:
+            if len(event) == 2:
+                Base.process_scan_events(self, [event], m)
+                continue
+            what, args, kind = event
+            if kind in self.drop_imports:
+                self.msg(2, "ignoring %s import" % kind, args)
+                self._dropped_imports.append((m.__name__, what, args, kind))
+                continue
+            old_kind = self._import_kind
+            self._import_kind = kind
+            try:
+                Base.process_scan_events(self, [(what, args)], m)
+            finally:
+                self._import_kind = old_kind
+
+    def scan_code(self, co, m):
+        events = self.get_scan_events(co)
+        if m.__file__:
+            cache = self._events_cache(m.__file__)
+            if cache is not None:
+                cache.put_events(m.__file__, self._types.get(m.__name__), events)
+        self.process_scan_events(events, m)
+
+    def has_code(self, m):
+        # Modules replayed from the cache have no code object.
+        return m.__code__ is not None \
+               or self._types.get(m.__name__) in (imp.PY_SOURCE, imp.PY_COMPILED,
+                                                  imp.PKG_DIRECTORY)
+
+    def find_all_submodules(self, m):
+        if self.path_index is None or not m.__path__:
+            return Base.find_all_submodules(self, m)
+        return self.path_index.find_all_submodules(m.__path__)
+
+    def _find_module_in_path(self, name, path):
+        if self.path_index is None:
+            return Base.find_module_in_path(self, name, path)
+        return self.path_index.find_module(name, path)
+
+    def find_module_in_path(self, name, path):
+        if self.cache is None:
+            return self._find_module_in_path(name, path)
+        try:
+            result = self.cache.get_location(name, path)
+        except KeyError:
+            try:
+                fp, pathname, stuff = self._find_module_in_path(name, path)
+            except ImportError:
+                self.cache.put_location(name, path, None)
+                raise
+            self.cache.put_location(name, path, (pathname, stuff))
+            return fp, pathname, stuff
+        if result is None:
+            raise ImportError, name
+        pathname, (suffix, mode, typ) = result
+        if typ in (imp.PY_SOURCE, imp.PY_COMPILED):
+            fp = open_file(pathname, mode)
+        else:
+            fp = None
+        return fp, pathname, (suffix, mode, typ)
+
+    def create_xref(self, htmlfile=None):
+        # Write the cross reference to htmlfile, or to a temporary file
+        # shown in the browser.  py2exe.depgraph exports the graph in
+        # machine-readable formats.
         # this code probably needs cleanup
         depgraph = {}
         importedby = {}
@@ -744,9 +1479,11 @@ class ModuleFinder(Base):
         names = self._types.keys()
         names.sort()
 
-        fd, htmlfile = tempfile.mkstemp(".html")
+        show = htmlfile is None
+        if show:
+            fd, htmlfile = tempfile.mkstemp(".html")
+            os.close(fd)
         ofi = open(htmlfile, "w")
-        os.close(fd)
         print >> ofi, "<html><title>py2exe cross reference for %s</title><body>" % sys.argv[0]
 
         print >> ofi, "<h1>py2exe cross reference for %s</h1>" % sys.argv[0]
@@ -790,12 +1527,187 @@ class ModuleFinder(Base):
 
         print >> ofi, "</body></html>"
         ofi.close()
+        if not show:
+            return
+        if not hasattr(os, "startfile"):
+            print "cross reference written to %s" % htmlfile
+            return
         os.startfile(htmlfile)
         # how long does it take to start the browser?
         import threading
         threading.Timer(5, os.remove, args=[htmlfile])
 
 
+# The kinds of imports classified by py2exe.astscan, most certain first
+_KIND_ORDER = ["unconditional", "deferred", "optional", "platform"]
+
+if __debug__:
+    _compiled_suffix = "c"
+else:
+    _compiled_suffix = "o"
+
+def load_compiled(pathname):
+    # Return the code object from the .pyc (or .pyo) file next to the
+    # source file pathname, or None if there is none that matches the
+    # source: the magic number, the source timestamp and the filename
+    # stored in the code must be the same as when compiling it now.
+    try:
+        fp = open(pathname + _compiled_suffix, "rb")
+    except IOError:
+        return None
+    try:
+        try:
+            if fp.read(4) != imp.get_magic():
+                return None
+            mtime = struct.unpack("<I", fp.read(4))[0]
+            if mtime != long(os.stat(pathname).st_mtime) & 0xFFFFFFFFL:
+                return None
+            co = marshal.load(fp)
+        except (IOError, OSError, EOFError, ValueError, TypeError, struct.error):
+            return None
+    finally:
+        fp.close()
+    if not isinstance(co, types.CodeType):
+        return None
+    if os.path.normcase(os.path.normpath(co.co_filename)) \
+           != os.path.normcase(os.path.normpath(pathname)):
+        # Compiled somewhere else (and copied), or found through
+        # another path entry.
+        return None
+    return co
+
+def replace_filename(co, filename):
+    # Return a copy of the code object co, and all code objects nested
+    # in it, with co_filename set to filename.
+    consts = list(co.co_consts)
+    for i in range(len(consts)):
+        if isinstance(consts[i], types.CodeType):
+            consts[i] = replace_filename(consts[i], filename)
+    return types.CodeType(co.co_argcount, co.co_nlocals, co.co_stacksize,
+                          co.co_flags, co.co_code, tuple(consts), co.co_names,
+                          co.co_varnames, filename, co.co_name,
+                          co.co_firstlineno, co.co_lnotab,
+                          co.co_freevars, co.co_cellvars)
+
+def _scan_source(pathname, analysis="bytecode", use_compiled=1):
+    # Executed in the worker processes: compile a source file and return
+    # its scan events, or None if it cannot be compiled, and whether an
+    # up-to-date compiled file has been used.
+    if analysis != "ast" and use_compiled:
+        co = load_compiled(pathname)
+        if co is not None:
+            return scan_code_objects(co), 1
+    try:
+        fp = open_file(pathname, READ_MODE)
+        try:
+            source = fp.read()+'\n'
+        finally:
+            fp.close()
+        if analysis == "ast":
+            from py2exe import astscan
+            return astscan.scan_source(source, pathname), 0
+        co = compile(source, pathname, 'exec')
+    except Exception:
+        return None, 0
+    return scan_code_objects(co), 0
+
+def start_worker(statement, flags=()):
+    # Start a Python process which runs statement, with pipes to its
+    # stdin and stdout, and py2exe on its path.  Unlike the processes
+    # of multiprocessing on Windows, it does not import the __main__
+    # module of the parent, which is the setup script and would start
+    # another build.
+    import subprocess
+    import py2exe
+    cmd = [sys.executable, "-u"] + list(flags) + ["-c", statement]
+    env = dict(os.environ)
+    path = [os.path.dirname(os.path.dirname(os.path.abspath(py2exe.__file__)))]
+    if env.get("PYTHONPATH"):
+        path.append(env["PYTHONPATH"])
+    env["PYTHONPATH"] = os.pathsep.join(path)
+    return subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, env=env)
+
+def _scan_server():
+    # The main loop of the scan worker processes: read the arguments
+    # for _scan_source() from stdin, and write the results to stdout.
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    while 1:
+        try:
+            args = marshal.load(sys.stdin)
+        except EOFError:
+            break
+        marshal.dump(_scan_source(*args), out)
+        out.flush()
+
+class _ScanResult:
+    def __init__(self):
+        import threading
+        self._done = threading.Event()
+        self._value = None
+
+    def set(self, value):
+        self._value = value
+        self._done.set()
+
+    def get(self):
+        self._done.wait()
+        return self._value
+
+class ScanWorkers:
+    """Worker processes which run _scan_source() for submit(); a thread
+    per process sends it the requests from a queue, and reads the
+    results."""
+    def __init__(self, processes):
+        import threading
+        import Queue
+        self._queue = Queue.Queue()
+        self._processes = []
+        self._threads = []
+        for i in range(processes):
+            process = start_worker("from py2exe.mf import _scan_server; "
+                                   "_scan_server()")
+            thread = threading.Thread(target=self._run, args=(process,))
+            thread.setDaemon(1)
+            thread.start()
+            self._processes.append(process)
+            self._threads.append(thread)
+
+    def submit(self, *args):
+        """Return an object whose get() method waits for, and returns,
+        the result of _scan_source(*args)."""
+        result = _ScanResult()
+        self._queue.put((args, result))
+        return result
+
+    def _run(self, process):
+        while 1:
+            item = self._queue.get()
+            if item is None:
+                break
+            args, result = item
+            try:
+                marshal.dump(args, process.stdin)
+                process.stdin.flush()
+                result.set(marshal.load(process.stdout))
+            except (EOFError, IOError, ValueError):
+                # The process died; the finder compiles the file itself
+                # then, like when the compile fails in the worker.
+                result.set((None, 0))
+
+    def close(self):
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        for process in self._processes:
+            try:
+                process.stdin.close()
+            except IOError:
+                pass
+            process.wait()
+
 TYPES = {imp.C_BUILTIN: "(builtin module)",
          imp.C_EXTENSION: "extension module",
          imp.IMP_HOOK: "IMP_HOOK",
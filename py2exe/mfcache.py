@@ -0,0 +1,263 @@
+"""Persistent cache for the module analysis done by py2exe.mf.
+
+Scanning a module means compiling it and walking its bytecode, which
+is by far the most expensive part of the dependency analysis.  The
+result of the scan is a list of 'events' (global names stored and
+imports done), and it only depends on the contents of the file.  The
+ScanCache stores these events for each file, keyed by the pathname, and
+validated by the size and an md5 digest of the file contents.  A
+rebuild replays the events of unchanged files instead of compiling and
+scanning them again; the globalnames, starimports and import edges of
+the module are derived from the replayed events.
+
+Additionally the cache remembers where imports were found, and which
+imports could not be found at all (the negative results that end up in
+ModuleFinder.badmodules).  These results depend on the contents of the
+directories that were searched, so they are only reused as long as the
+modification times of these directories have not changed.
+
+The StdlibIndex keeps the scan results of the standard library in the
+user cache directory instead, where all projects built with the same
+Python installation can replay them.
+"""
+
+import imp
+import marshal
+import os
+import sys
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+# Increment when the layout of the cached data changes.
+CACHE_VERSION = 3
+
+def file_digest(pathname):
+    f = open(pathname, "rb")
+    try:
+        return md5(f.read()).hexdigest()
+    finally:
+        f.close()
+
+class ScanCache:
+    def __init__(self, filename=None, variant="bytecode"):
+        self.filename = filename
+        # The events depend on the analysis method used
+        self.variant = variant
+        self.hits = 0
+        self.misses = 0
+        # pathname -> (size, digest, type, events)
+        self._files = {}
+        # (name, tuple(path)) -> (result, dirs); result is (pathname,
+        # description) for found modules and None for missing ones, dirs
+        # is a tuple of (directory, mtime) pairs the result depends on.
+        self._locations = {}
+        # directory -> mtime, stat'ed at most once per session
+        self._dir_mtimes = {}
+        self._dirty = 0
+        if filename is not None:
+            self.load()
+
+    def load(self):
+        try:
+            f = open(self.filename, "rb")
+        except IOError:
+            return
+        try:
+            try:
+                data = marshal.load(f)
+            except (EOFError, ValueError, TypeError):
+                return
+        finally:
+            f.close()
+        if not isinstance(data, dict) \
+               or data.get("version") != CACHE_VERSION \
+               or data.get("magic") != imp.get_magic() \
+               or data.get("sys.version") != sys.version \
+               or data.get("variant") != self.variant:
+            return
+        self._files = data["files"]
+        self._locations = data["locations"]
+
+    def save(self):
+        if not self._dirty or self.filename is None:
+            return
+        data = {"version": CACHE_VERSION,
+                "magic": imp.get_magic(),
+                "sys.version": sys.version,
+                "variant": self.variant,
+                "files": self._files,
+                "locations": self._locations}
+        # unique, the standard library index is written by concurrent builds
+        tmpname = "%s.%d.tmp" % (self.filename, os.getpid())
+        f = open(tmpname, "wb")
+        try:
+            marshal.dump(data, f)
+        finally:
+            f.close()
+        # os.rename() does not replace existing files on Windows.
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        os.rename(tmpname, self.filename)
+        self._dirty = 0
+
+    # scan results
+
+    def get_events(self, pathname):
+        """Return the cached scan events for the file, or None if the
+        file is unknown or has changed since it was scanned.
+        """
+        entry = self._files.get(pathname)
+        if entry is None:
+            self.misses += 1
+            return None
+        size, digest, typ, events = entry
+        # The modification time is not enough: a file can be changed
+        # within its timestamp resolution, or get its old time back
+        # from a checkout or an archive.  Reading and hashing the file
+        # is still much cheaper than compiling and scanning it.
+        try:
+            if os.stat(pathname).st_size != size \
+                   or file_digest(pathname) != digest:
+                self.misses += 1
+                return None
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return events
+
+    def put_events(self, pathname, typ, events):
+        try:
+            size = os.stat(pathname).st_size
+            digest = file_digest(pathname)
+        except (IOError, OSError):
+            return
+        self._files[pathname] = size, digest, typ, events
+        self._dirty = 1
+
+    def refresh(self):
+        """Stat the directories again, for a new analysis in the same
+        session."""
+        self._dir_mtimes.clear()
+
+    # find_module results
+
+    def _dir_mtime(self, dirname):
+        try:
+            return self._dir_mtimes[dirname]
+        except KeyError:
+            try:
+                mtime = os.stat(dirname or os.curdir).st_mtime
+            except OSError:
+                mtime = None
+            self._dir_mtimes[dirname] = mtime
+            return mtime
+
+    def get_location(self, name, path):
+        """Return the cached result of looking up 'name' in the list of
+        directories 'path'.  This is a (pathname, description) tuple, or
+        None if the module could not be found.  Raises KeyError if
+        there is no valid cached result.
+        """
+        result, dirs = self._locations[(name, tuple(path))]
+        for dirname, mtime in dirs:
+            if self._dir_mtime(dirname) != mtime:
+                raise KeyError(name)
+        return result
+
+    def put_location(self, name, path, result):
+        # A module found in a directory depends on the contents of
+        # that directory and of all directories searched before it, a
+        # missing module on all directories in the path.
+        path = tuple(path)
+        searched = path
+        if result is not None:
+            pathname = result[0]
+            found_in = os.path.normcase(os.path.dirname(os.path.abspath(pathname)))
+            for i in range(len(path)):
+                if os.path.normcase(os.path.abspath(path[i])) == found_in:
+                    searched = path[:i+1]
+                    break
+        dirs = tuple([(d, self._dir_mtime(d)) for d in searched])
+        self._locations[(name, path)] = result, dirs
+        self._dirty = 1
+
+def user_cache_dir():
+    """Return the directory for the caches py2exe shares between
+    projects."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.environ.get("APPDATA")
+        if base:
+            return os.path.join(base, "py2exe", "Cache")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "py2exe")
+
+def _normdir(dirname):
+    return os.path.normcase(os.path.abspath(dirname)) + os.sep
+
+class StdlibIndex(ScanCache):
+    """The scan results of the standard library files, shared by all
+    projects built with the same interpreter.
+
+    The index lives in the user cache directory, in a file whose name is
+    derived from sys.version and sys.prefix.  Like the ScanCache, each
+    entry is validated against the file it was made from, so changed
+    library files are scanned again.  Only the scan events are kept:
+    where an import is found depends on the path of the project.
+    """
+    def __init__(self, variant="bytecode", dirname=None):
+        from distutils import sysconfig
+        self.stdlib_dir = _normdir(sysconfig.get_python_lib(standard_lib=1))
+        self.site_dirs = [_normdir(sysconfig.get_python_lib(plat_specific=0)),
+                          _normdir(sysconfig.get_python_lib(plat_specific=1))]
+        if dirname is None:
+            dirname = user_cache_dir()
+        key = md5("%s\0%s\0%s" % (sys.version, sys.prefix, variant)).hexdigest()
+        ScanCache.__init__(self, os.path.join(dirname, "stdlib-%s.idx" % key[:16]),
+                           variant)
+
+    def covers(self, pathname):
+        """Return true if the file is part of the standard library."""
+        pathname = os.path.normcase(os.path.abspath(pathname))
+        if not pathname.startswith(self.stdlib_dir):
+            return 0
+        for dirname in self.site_dirs:
+            if pathname.startswith(dirname):
+                return 0
+        return 1
+
+    def load(self):
+        ScanCache.load(self)
+        self._locations = {}
+
+    def save(self):
+        if not self._dirty:
+            return
+        # Other builds may have added files since we loaded the index;
+        # keep them.
+        files = self._files
+        ScanCache.load(self)
+        self._files.update(files)
+        self._locations = {}
+        dirname = os.path.dirname(self.filename)
+        # The index is shared, a failure to write it only costs time.
+        try:
+            if not os.path.isdir(dirname):
+                try:
+                    os.makedirs(dirname)
+                except OSError:
+                    # another build may have created it meanwhile
+                    if not os.path.isdir(dirname):
+                        raise
+            ScanCache.save(self)
+        except (IOError, OSError), details:
+            print "warning: could not save the standard library index:", details
+            tmpname = "%s.%d.tmp" % (self.filename, os.getpid())
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+
+    def put_location(self, name, path, result):
+        pass
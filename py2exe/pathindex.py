@@ -0,0 +1,238 @@
+"""An index of the module files in the directories on the path.
+
+imp.find_module() tries each suffix in each directory of the path,
+which costs a stat() or open() call per suffix and directory for every
+lookup, and ModuleFinder does many thousand lookups, most of them for
+modules that do not exist.  The PathIndex lists each directory once,
+and answers the lookups from the listing.  It follows the rules
+imp.find_module() uses: in each directory a package (a subdirectory
+containing an __init__ module) comes first, then the suffixes in the
+order imp.get_suffixes() returns them.  Names are compared with exact
+case, like imp does on case-insensitive file systems.
+
+The listings are kept until refresh() is called, which rereads the
+directories whose modification time has changed.
+
+Zip archives on the path, like zipped eggs, are listed from their
+central directory.  Only Python modules are found in them, as with
+zipimport; their pathnames are the name of the archive joined with the
+name in the archive, and open_file() reads them.
+"""
+
+import imp
+import os
+import zipfile
+from cStringIO import StringIO
+
+if __debug__:
+    _init_names = ("__init__.py", "__init__.pyc")
+else:
+    _init_names = ("__init__.py", "__init__.pyo")
+
+def split_archive(pathname):
+    """Return (archive, name in the archive) if pathname is in a zip
+    archive, else None."""
+    path = pathname
+    parts = []
+    while not os.path.exists(path):
+        head, tail = os.path.split(path)
+        if not tail or head == path:
+            return None
+        parts.append(tail)
+        path = head
+    if os.path.isfile(path) and zipfile.is_zipfile(path):
+        parts.reverse()
+        return path, "/".join(parts)
+    return None
+
+def open_file(pathname, mode="r"):
+    """Open a file for reading, which may be in a zip archive."""
+    try:
+        return open(pathname, mode)
+    except IOError:
+        result = split_archive(pathname)
+        if result is None or not result[1]:
+            raise
+    archive, name = result
+    z = zipfile.ZipFile(archive)
+    try:
+        try:
+            data = z.read(name)
+        except KeyError:
+            raise IOError(2, "No such file in archive", pathname)
+    finally:
+        z.close()
+    if "U" in mode:
+        data = data.replace("\r\n", "\n").replace("\r", "\n")
+    return StringIO(data)
+
+def getmtime(pathname):
+    """Return the modification time of a file, or of the zip archive
+    it is in."""
+    try:
+        return os.stat(pathname).st_mtime
+    except OSError:
+        result = split_archive(pathname)
+        if result is None:
+            raise
+        return os.stat(result[0]).st_mtime
+
+def archive_directories(archive, suffixes):
+    # Return a dictionary mapping the directories in the archive to the
+    # names in them.  Extension modules cannot be imported from an
+    # archive, so they are left out.
+    extensions = [suffix for suffix, mode, typ in suffixes
+                  if typ == imp.C_EXTENSION]
+    z = zipfile.ZipFile(archive)
+    try:
+        names = z.namelist()
+    finally:
+        z.close()
+    dirs = {"": set()}
+    for name in names:
+        parts = name.split("/")
+        for i in range(len(parts) - 1):
+            dirs.setdefault("/".join(parts[:i]), set()).add(parts[i])
+        base = parts[-1]
+        if not base:
+            continue
+        for suffix in extensions:
+            if base.endswith(suffix):
+                break
+        else:
+            dirs.setdefault("/".join(parts[:-1]), set()).add(base)
+    return dirs
+
+class PathIndex:
+    def __init__(self, suffixes=None):
+        if suffixes is None:
+            suffixes = imp.get_suffixes()
+        self.suffixes = suffixes
+        # directory -> (mtime, set of names), or None if the directory
+        # cannot be listed.
+        self._listings = {}
+        # pathname -> true if it is a package directory
+        self._packages = {}
+        # archive -> (mtime, directories in the archive)
+        self._archives = {}
+
+    def listing(self, dirname):
+        """Return the set of names in the directory, or None if it is
+        not a directory.
+        """
+        try:
+            return self._listings[dirname][1]
+        except KeyError:
+            pass
+        try:
+            mtime = os.stat(dirname or os.curdir).st_mtime
+            names = set(os.listdir(dirname or os.curdir))
+        except (OSError, TypeError):
+            names = self.archive_listing(dirname)
+            self._listings[dirname] = None, names
+            return names
+        self._listings[dirname] = mtime, names
+        return names
+
+    def archive_listing(self, dirname):
+        """Return the set of names in a directory of a zip archive, or
+        None if it is not one.
+        """
+        if not isinstance(dirname, basestring):
+            return None
+        result = split_archive(dirname)
+        if result is None:
+            return None
+        archive, name = result
+        try:
+            dirs = self._archives[archive][1]
+        except KeyError:
+            try:
+                mtime = os.stat(archive).st_mtime
+                dirs = archive_directories(archive, self.suffixes)
+            except (IOError, OSError, zipfile.BadZipfile):
+                return None
+            self._archives[archive] = mtime, dirs
+        return dirs.get(name)
+
+    def is_package(self, pathname):
+        try:
+            return self._packages[pathname]
+        except KeyError:
+            pass
+        names = self.listing(pathname)
+        result = False
+        if names is not None:
+            for init in _init_names:
+                if init in names:
+                    result = True
+                    break
+        self._packages[pathname] = result
+        return result
+
+    def lookup(self, name, dirname):
+        """Return (pathname, (suffix, mode, type)) for the module in
+        the directory, or None.
+        """
+        names = self.listing(dirname)
+        if not names:
+            return None
+        if name in names:
+            pathname = os.path.join(dirname, name)
+            if self.is_package(pathname):
+                return pathname, ("", "", imp.PKG_DIRECTORY)
+        for suffix, mode, typ in self.suffixes:
+            if name + suffix in names:
+                return os.path.join(dirname, name + suffix), (suffix, mode, typ)
+        return None
+
+    def find_module(self, name, path):
+        """A replacement for imp.find_module(name, path)."""
+        for dirname in path:
+            if not isinstance(dirname, basestring):
+                continue
+            result = self.lookup(name, dirname)
+            if result is not None:
+                pathname, (suffix, mode, typ) = result
+                if typ in (imp.PY_SOURCE, imp.PY_COMPILED):
+                    fp = open_file(pathname, mode)
+                else:
+                    fp = None
+                return fp, pathname, (suffix, mode, typ)
+        raise ImportError, "No module named " + name
+
+    def find_all_submodules(self, path):
+        """Return the names of all modules in the package directories."""
+        modules = {}
+        for dirname in path:
+            names = self.listing(dirname)
+            if names is None:
+                continue
+            for name in names:
+                for suffix, mode, typ in self.suffixes:
+                    if name.endswith(suffix):
+                        mod = name[:-len(suffix)]
+                        if mod and mod != "__init__":
+                            modules[mod] = mod
+                        break
+        return modules.keys()
+
+    def refresh(self):
+        """Forget the listings of directories that have changed."""
+        for archive, (mtime, dirs) in self._archives.items():
+            try:
+                current = os.stat(archive).st_mtime
+            except OSError:
+                current = None
+            if current != mtime:
+                del self._archives[archive]
+        for dirname, (mtime, names) in self._listings.items():
+            try:
+                current = os.stat(dirname or os.curdir).st_mtime
+            except OSError:
+                current = None
+            # missing directories and directories in archives are
+            # looked up again
+            if current is None or current != mtime:
+                del self._listings[dirname]
+        self._packages.clear()
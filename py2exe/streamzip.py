@@ -0,0 +1,173 @@
+"""Write the library archive while the module analysis is running.
+
+ModuleFinder calls StreamingArchive.add_module (as its listener) for
+each source module it has scanned.  The code objects are loaded and
+marshalled right there, in the thread of the analysis, because the
+ModuleFinder is not thread-safe; a background thread compresses and
+writes the data into the archive, so this overlaps with the analysis,
+which mostly waits for the file system.  Files which are only known at
+the end are added with add_file(), and close() writes the central
+directory.
+
+Modules which turn out not to belong into the build after they were
+streamed, because a hook excludes them, are passed to remove_modules();
+close() then rewrites the archive without them.
+"""
+
+import imp
+import marshal
+import os
+import struct
+import sys
+import threading
+import time
+import zipfile
+import Queue
+
+from py2exe.mf import replace_filename
+from py2exe.pathindex import getmtime
+
+def archive_name(m, ext=".pyc"):
+    """Return the name of the compiled module in the archive."""
+    dfile = m.__name__.replace('.', '\\')
+    if m.__path__:
+        return dfile + '\\__init__' + ext
+    return dfile + ext
+
+def pyc_data(co, pathname, dfile):
+    """Return the contents of the .pyc file for the code object."""
+    mtime = long(getmtime(pathname)) & 0xFFFFFFFFL
+    return imp.get_magic() + struct.pack("<I", mtime) + \
+           marshal.dumps(replace_filename(co, dfile))
+
+def rewrite_archive(filename, drop=()):
+    """Rewrite the zip archive with only the last entry of each name,
+    and without the entries whose names (with forward slashes) are in
+    drop.  Returns the number of bytes saved."""
+    tmpname = "%s.%d.tmp" % (filename, os.getpid())
+    old_size = os.path.getsize(filename)
+    src = zipfile.ZipFile(filename, "r")
+    try:
+        dst = zipfile.ZipFile(tmpname, "w")
+        try:
+            # ZipFile.getinfo() and read() use the last entry
+            written = set()
+            for info in src.infolist():
+                if info.filename in written \
+                       or info.filename.replace("\\", "/") in drop:
+                    continue
+                written.add(info.filename)
+                dst.writestr(src.getinfo(info.filename),
+                             src.read(info.filename))
+        finally:
+            dst.close()
+    finally:
+        src.close()
+    try:
+        # os.rename() does not replace existing files on Windows.
+        os.remove(filename)
+        os.rename(tmpname, filename)
+    except OSError:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+    return old_size - os.path.getsize(filename)
+
+class StreamingArchive:
+    def __init__(self, filename, compression=zipfile.ZIP_STORED,
+                 get_code=None, verbose=0):
+        self.filename = filename
+        self.compression = compression
+        # called by add_module() for modules without code
+        self.get_code = get_code
+        self.verbose = verbose
+        # module name -> archive name of the modules streamed
+        self.modules = {}
+        # archive name -> size in the archive
+        self.sizes = {}
+        # archive names (with forward slashes) of the modules removed
+        # after they were streamed
+        self._removed = set()
+        self._compact = 0
+        self._zip = zipfile.ZipFile(filename, "w", compression=compression)
+        self._queue = Queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def add_module(self, m, co=None):
+        # Only modules compiled from .py or .pyw files; the others
+        # are compiled by byte_compile() as before.
+        if m.__name__ == "__main__" or m.__name__ in self.modules \
+               or os.path.splitext(m.__file__)[1] not in (".py", ".pyw"):
+            return
+        dfile = archive_name(m)
+        self.modules[m.__name__] = dfile
+        # found again after it was removed; close() keeps the last entry
+        if dfile.replace("\\", "/") in self._removed:
+            self._removed.discard(dfile.replace("\\", "/"))
+            self._compact = 1
+        if co is None:
+            co = self.get_code(m)
+        if self.verbose:
+            print "streaming code of %s to %s" % (m.__file__, dfile)
+        self.add_data(dfile, pyc_data(co, m.__file__, dfile))
+
+    def remove_modules(self, names):
+        """Leave the streamed modules among names out of the archive.
+        Returns the names of the modules which had been streamed."""
+        streamed = []
+        for name in names:
+            dfile = self.modules.pop(name, None)
+            if dfile is not None:
+                self._removed.add(dfile.replace("\\", "/"))
+                streamed.append(name)
+        if streamed:
+            self._compact = 1
+        return streamed
+
+    def add_file(self, arcname, pathname):
+        self._queue.put((arcname, pathname, None))
+
+    def add_data(self, arcname, data):
+        self._queue.put((arcname, None, data))
+
+    def _run(self):
+        while 1:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                # keep draining the queue after an error
+                continue
+            try:
+                self._write(*item)
+            except:
+                self._error = sys.exc_info()
+
+    def _write(self, arcname, pathname, data):
+        if pathname is not None:
+            self._zip.write(pathname, arcname)
+        else:
+            self._writestr(arcname, data)
+        self.sizes[arcname] = self._zip.infolist()[-1].compress_size
+
+    def _writestr(self, arcname, data):
+        info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+        info.compress_type = self.compression
+        info.external_attr = 0644 << 16L
+        self._zip.writestr(info, data)
+
+    def close(self):
+        """Wait for the pending writes, and finish the archive."""
+        self._queue.put(None)
+        self._thread.join()
+        self._zip.close()
+        if self._error is not None:
+            raise self._error[0], self._error[1], self._error[2]
+        if self._compact:
+            rewrite_archive(self.filename, self._removed)
+            for arcname in self.sizes.keys():
+                if arcname.replace("\\", "/") in self._removed:
+                    del self.sizes[arcname]
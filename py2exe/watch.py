@@ -0,0 +1,117 @@
+"""Update a build when its source files change.
+
+'setup.py py2exe --watch' does a full build first, and then keeps the
+module graph in memory.  Whenever files of the build change, it scans
+the changed modules again (ModuleFinder.rescan), which also adds the
+modules they now import and removes the ones no longer needed.  The
+changed and added modules are compiled and appended to the archive,
+and the executables whose scripts have changed are built again.
+
+zipimport uses the last entry of a name in the archive, so appended
+modules replace the old ones.  The replaced entries, and those of the
+removed modules, stay in the archive until more has been appended than
+it had after the full build; then it is rewritten without them.
+"""
+
+import os
+import time
+
+from py2exe.mf import _SCANNED_TYPES
+from py2exe.pathindex import getmtime
+
+class Watcher:
+    def __init__(self, cmd, mf, interval=0.5):
+        # cmd is the py2exe command which did the build
+        self.cmd = cmd
+        self.mf = mf
+        self.interval = interval
+        self.mtimes = self.snapshot()
+        # the modules removed since the archive was written
+        self.removed = set()
+        self.archive_size = self.get_archive_size()
+
+    def get_archive_size(self):
+        try:
+            return os.path.getsize(self.cmd.get_archive_name())
+        except OSError:
+            return 0
+
+    def files(self):
+        files = list(self.mf._scripts)
+        for name, m in self.mf.modules.items():
+            if m.__file__ and self.mf._types.get(name) in _SCANNED_TYPES:
+                files.append(m.__file__)
+        return files
+
+    def snapshot(self):
+        mtimes = {}
+        for pathname in self.files():
+            try:
+                mtimes[pathname] = getmtime(pathname)
+            except OSError:
+                mtimes[pathname] = None
+        return mtimes
+
+    def changed_files(self):
+        changed = []
+        for pathname, mtime in self.mtimes.items():
+            try:
+                current = getmtime(pathname)
+            except OSError:
+                current = None
+            if current != mtime:
+                changed.append(pathname)
+        return changed
+
+    def run(self):
+        print "*** watching %d files for changes, press Ctrl-C to stop ***" % \
+              len(self.mtimes)
+        try:
+            try:
+                while 1:
+                    time.sleep(self.interval)
+                    changed = self.changed_files()
+                    if changed:
+                        self.update(changed)
+            except KeyboardInterrupt:
+                print "stopped watching"
+        finally:
+            self.mf.close()
+
+    def update(self, changed):
+        start = time.time()
+        mf = self.mf
+        rescanned, added, removed = mf.rescan(changed)
+        self.mtimes = self.snapshot()
+        self.removed = (self.removed | removed) - added
+        py_files = []
+        extensions = []
+        names = list(rescanned | added)
+        names.sort()
+        for name in names:
+            if name == "__main__":
+                continue
+            m = mf.modules[name]
+            if mf._types.get(name) in _SCANNED_TYPES:
+                py_files.append(m)
+            elif m.__file__:
+                extensions.append(name)
+        if py_files:
+            self.cmd.update_archive(py_files)
+        scripts = [pathname for pathname in changed if pathname in mf._scripts]
+        if scripts:
+            self.cmd.update_executables(scripts)
+        if extensions:
+            print "new extension modules need a full build:", ", ".join(extensions)
+        if mf.cache is not None and self.cmd.analysis_cache:
+            mf.cache.save()
+        appended = self.get_archive_size() - self.archive_size
+        if self.archive_size and appended > self.archive_size:
+            saved = self.cmd.compact_archive(self.removed)
+            if saved:
+                print "archive rewritten, %d kB of replaced entries dropped" % \
+                      (saved // 1024)
+                self.removed = set()
+            self.archive_size = self.get_archive_size()
+        print "updated %d modules (%d added, %d removed) in %.2f s" % \
+              (len(py_files), len(added), len(removed), time.time() - start)
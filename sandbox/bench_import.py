@@ -0,0 +1,119 @@
+"""Benchmark for the marshal bundle format of py2exe.marshalbundle.
+
+Compiles the standard library modules which a set of packages imports,
+writes them into a zipfile (stored, like py2exe does by default) and
+into a marshal bundle, and measures the time fresh interpreters take
+to import the packages from each, with the importer installed like the
+executables do.
+
+Usage: python bench_import.py [number-of-runs]
+"""
+import imp
+import marshal
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from py2exe import marshalbundle
+
+PACKAGES = ["json", "logging.handlers", "email.mime.multipart", "xml.dom.minidom",
+            "decimal", "unittest", "urllib2", "httplib", "csv", "tarfile",
+            "zipfile", "optparse", "difflib", "inspect", "pydoc", "cookielib",
+            "SimpleXMLRPCServer", "ConfigParser", "argparse", "distutils.core"]
+
+FIND = """\
+import sys
+for name in %r:
+    __import__(name)
+print repr(dict([(name, m.__file__) for name, m in sys.modules.items()
+                 if m is not None and hasattr(m, '__file__')]))
+"""
+
+RUN = """\
+import sys, time
+start = time.time()
+sys.path.insert(0, %(archive)r)
+%(install)s
+for name in %(packages)r:
+    __import__(name)
+elapsed = time.time() - start
+for name in %(packages)r:
+    assert sys.modules[name].__file__.startswith(%(archive)r), name
+print elapsed
+"""
+
+def find_modules():
+    # module name -> source file of the pure Python modules imported
+    out = subprocess.Popen([sys.executable, "-S", "-E", "-c", FIND % PACKAGES],
+                           stdout=subprocess.PIPE).communicate()[0]
+    stdlib = os.path.dirname(os.__file__)
+    result = {}
+    for name, path in eval(out).items():
+        path = os.path.splitext(path)[0] + ".py"
+        if path.startswith(stdlib) and "site-packages" not in path \
+               and os.path.exists(path):
+            result[name] = path
+    return result
+
+def compiled(path, name):
+    source = open(path, "U").read()
+    if not source.endswith("\n"):
+        source += "\n"
+    code = compile(source, name.replace(".", "/") + ".py", "exec")
+    return imp.get_magic() + "\0\0\0\0" + marshal.dumps(code)
+
+def make_archives(dirname):
+    files = []
+    for name, path in sorted(find_modules().items()):
+        arcname = name.replace(".", "/")
+        if os.path.basename(path) == "__init__.py":
+            arcname += "/__init__"
+        files.append((arcname + ".pyc", compiled(path, name)))
+    zip_name = os.path.join(dirname, "library.zip")
+    z = zipfile.ZipFile(zip_name, "w", zipfile.ZIP_STORED)
+    for arcname, data in files:
+        z.writestr(arcname, data)
+    z.close()
+    bundle_name = os.path.join(dirname, "library.bundle")
+    marshalbundle.write_bundle(bundle_name, files)
+    return len(files), zip_name, bundle_name
+
+def run(archive, install, runs):
+    script = RUN % {"archive": archive, "install": install, "packages": PACKAGES}
+    best = None
+    for i in range(runs):
+        out = subprocess.Popen([sys.executable, "-S", "-E", "-c", script],
+                               stdout=subprocess.PIPE).communicate()[0]
+        elapsed = float(out)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main(args):
+    runs = 20
+    if args:
+        runs = int(args[0])
+    dirname = tempfile.mkdtemp()
+    try:
+        count, zip_name, bundle_name = make_archives(dirname)
+        print "%d modules, zipfile %d bytes, bundle %d bytes" % \
+              (count, os.path.getsize(zip_name), os.path.getsize(bundle_name))
+        # what the executables run first
+        boot = marshalbundle.boot_code(os.path.basename(bundle_name))
+        t_zip = run(zip_name, "", runs)
+        t_bundle = run(bundle_name,
+                       "import marshal; exec marshal.loads(%r)" % marshal.dumps(boot),
+                       runs)
+        print "best of %d runs:" % runs
+        print "%-10s %8.2f ms" % ("zipimport", t_zip * 1000)
+        print "%-10s %8.2f ms  (%.2fx)" % ("bundle", t_bundle * 1000, t_zip / t_bundle)
+    finally:
+        shutil.rmtree(dirname)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
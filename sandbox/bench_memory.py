@@ -0,0 +1,124 @@
+"""Peak memory of the module analysis on a large synthetic tree.
+
+Generates a tree of packages with 5000 modules (each with a bunch of
+globals, functions, a class and a few imports, some of them missing),
+and runs py2exe.mf.ModuleFinder over it in a fresh process for each
+configuration (keeping the code objects, dropping them, and dropping
+them with the graph in a py2exe.graphstore database), reporting the elapsed time and the peak memory use of
+that process.
+
+Usage: python bench_memory.py [number-of-modules]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+MODULES_PER_PACKAGE = 100
+
+def make_tree(root, num_modules):
+    num_packages = (num_modules + MODULES_PER_PACKAGE - 1) // MODULES_PER_PACKAGE
+    main = []
+    for p in range(num_packages):
+        pkgdir = os.path.join(root, "pkg%d" % p)
+        os.mkdir(pkgdir)
+        open(os.path.join(pkgdir, "__init__.py"), "w").write(
+            '"""Package %d"""\nVERSION = %d\n' % (p, p))
+        count = min(MODULES_PER_PACKAGE, num_modules - p * MODULES_PER_PACKAGE)
+        for i in range(count):
+            lines = ['"""Module %d of package %d."""' % (i, p),
+                     "import pkg%d" % ((p + 1) % num_packages),
+                     # keep the import chains short, like real code
+                     "from pkg%d import mod%d" % (p, i // 2),
+                     "try:",
+                     "    import missing_%d" % (i % 50),
+                     "except ImportError:",
+                     "    missing_%d = None" % (i % 50)]
+            for j in range(40):
+                lines.append("CONSTANT_%d_%d = ('%d.%d', %d, %r)" % (i, j, p, i, j, "x" * 20))
+            for j in range(15):
+                lines.append("def function_%d(a, b=CONSTANT_%d_%d):" % (j, i, j))
+                lines.append("    '''Function %d.'''" % j)
+                lines.append("    result = [a * k + b[1] for k in range(%d)]" % j)
+                lines.append("    return sum(result) + len(b[0])")
+            lines.append("class Class%d(object):" % i)
+            for j in range(10):
+                lines.append("    def method_%d(self, value):" % j)
+                lines.append("        return value + %d" % j)
+            open(os.path.join(pkgdir, "mod%d.py" % i), "w").write("\n".join(lines) + "\n")
+            main.append("import pkg%d.mod%d" % (p, i))
+    script = os.path.join(root, "main.py")
+    open(script, "w").write("\n".join(main) + "\n")
+    return script
+
+def peak_memory():
+    # Return the peak memory use of this process in kB, or None.
+    try:
+        import resource
+    except ImportError:
+        pass
+    else:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            rss = rss // 1024
+        return rss
+    try:
+        import ctypes
+        from ctypes import wintypes
+    except ImportError:
+        return None
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t)]
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                             ctypes.byref(counters),
+                                             counters.cb)
+    return counters.PeakWorkingSetSize // 1024
+
+def child(mode, root):
+    sys.path.insert(0, os.path.join(HERE, ".."))
+    from py2exe import mf
+    kw = {}
+    if mode in ("drop-code", "store"):
+        kw["keep_code"] = 0
+    if mode == "store":
+        from py2exe.graphstore import GraphStore
+        kw["store"] = GraphStore(os.path.join(root, "graph.db"), clear=1)
+    start = time.time()
+    finder = mf.ModuleFinder(path=[root], **kw)
+    finder.run_script(os.path.join(root, "main.py"))
+    elapsed = time.time() - start
+    print "%-12s %6d modules %5d missing  %6.2f s  peak %8s kB" % \
+          (mode, len(finder.modules), len(finder.badmodules), elapsed, peak_memory())
+
+def main(args):
+    if args[:1] == ["--child"]:
+        child(args[1], args[2])
+        return
+    num_modules = 5000
+    if args:
+        num_modules = int(args[0])
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root, num_modules)
+        for mode in ("keep-code", "drop-code", "store"):
+            os.spawnv(os.P_WAIT, sys.executable,
+                      [sys.executable, os.path.abspath(__file__), "--child", mode, root])
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
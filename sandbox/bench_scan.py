@@ -0,0 +1,98 @@
+"""Micro-benchmark for the bytecode import scanners in py2exe.mf.
+
+Compares the slicing scanners ModuleFinder.scan_opcodes_25 (or
+scan_opcodes on Python 2.4), applied recursively like the old
+scan_code() did, with py2exe.mf.scan_code_objects() on large
+generated modules, and checks that both find the same things.
+
+Usage: python bench_scan.py [number-of-classes ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from py2exe import mf
+
+STUBS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "py2exe",
+                     "samples", "pywin32", "com_typelib", "pre_gen", "wscript",
+                     "wsh-typelib-stubs.py")
+
+def makepy_like(num_classes):
+    # Something that looks like makepy output: lots of classes with
+    # many small methods, and some imports sprinkled in.
+    lines = ["import pythoncom",
+             "from pywintypes import IID",
+             "from win32com.client import Dispatch, DispatchBaseClass",
+             "defaultNamedOptArg = pythoncom.Empty",
+             ""]
+    for i in range(num_classes):
+        lines.append("class IFoo%d(DispatchBaseClass):" % i)
+        lines.append("    CLSID = IID('{%08X-0000-0000-0000-000000000000}')" % i)
+        for j in range(10):
+            lines.append("    def Method%d(self, arg=defaultNamedOptArg):" % j)
+            lines.append("        'Method %d of interface %d'" % (j, i))
+            lines.append("        from win32com.client import constants")
+            lines.append("        return self._oleobj_.InvokeTypes(%d, 1, 1, (24, 0), ((12, 1),), arg)" % j)
+        lines.append("")
+        lines.append("IFoo%d_vtables_ = [(('Method0',), %d, (%d, (), [], 1, 1, 4, 0, 56, (3, 0, None, None), 0))]" % (i, i, i))
+    return "\n".join(lines) + "\n"
+
+def flat_module(num_statements):
+    # A single huge code object, like generated constant tables.
+    lines = ["import os"]
+    for i in range(num_statements):
+        lines.append("NAME_%d = ('value', %d, os.sep)" % (i, i))
+    return "\n".join(lines) + "\n"
+
+def old_scan(finder, co, result):
+    if sys.version_info >= (2, 5):
+        scanner = finder.scan_opcodes_25
+    else:
+        scanner = finder.scan_opcodes
+    result.extend(scanner(co))
+    for c in co.co_consts:
+        if isinstance(c, type(co)):
+            old_scan(finder, c, result)
+    return result
+
+def timeit(func, *args):
+    best = None
+    for i in range(3):
+        start = time.clock()
+        func(*args)
+        elapsed = time.clock() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def bench(title, source):
+    try:
+        co = compile(source, title, "exec")
+    except SyntaxError, details:
+        print "%-28s skipped: %s" % (title, details)
+        return
+    finder = mf.Base(path=[])
+    old = old_scan(finder, co, [])
+    new = mf.scan_code_objects(co)
+    assert old == new, "scanners disagree on %s" % title
+    t_old = timeit(old_scan, finder, co, [])
+    t_new = timeit(mf.scan_code_objects, co)
+    print "%-28s %8d lines %7d events  old %8.3f s  new %8.3f s  %6.1fx" % \
+          (title, source.count("\n"), len(new), t_old, t_new, t_old / t_new)
+
+def main(args):
+    if os.path.exists(STUBS):
+        source = open(STUBS, "U").read()
+        # The stubs are declared as mbcs, which only exists on Windows.
+        source = source.replace("coding: mbcs", "coding: latin-1")
+        bench("wsh-typelib-stubs.py", source)
+    sizes = [int(a) for a in args] or [100, 500, 2000]
+    for n in sizes:
+        bench("makepy-like, %d classes" % n, makepy_like(n))
+    for n in sizes:
+        bench("flat, %d statements" % (n * 10), flat_module(n * 10))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
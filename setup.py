@@ -518,6 +518,7 @@ setup(name="py2exe",
       interpreters = interpreters,
       packages=['py2exe',
                 'py2exe.resources',
+                'py2exe.hooks',
                ],
       )
 
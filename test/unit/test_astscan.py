@@ -0,0 +1,236 @@
+"""Tests for py2exe.astscan."""
+import ast
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from py2exe import astscan, mf
+from py2exe.astscan import UNCONDITIONAL, OPTIONAL, PLATFORM, DEFERRED
+
+LINUX = astscan.PlatformTest("linux2", "posix")
+WINDOWS = astscan.PlatformTest("win32", "nt")
+
+def scan(source, platform=LINUX):
+    return astscan.scan_source(source, "m.py", platform)
+
+def kinds(source, platform=LINUX):
+    # imported module name -> kind
+    result = {}
+    for event in scan(source, platform):
+        if len(event) == 3:
+            what, args, kind = event
+            result[args[-1]] = kind
+    return result
+
+def stores(events):
+    return set([event[1][0] for event in events if event[0] == "store"])
+
+class KindTest(unittest.TestCase):
+    def test_unconditional(self):
+        self.assertEqual(scan("import a.b\nfrom c import d\n"),
+                         [("import", (None, "a.b"), UNCONDITIONAL), ("store", ("a",)),
+                          ("import", (("d",), "c"), UNCONDITIONAL), ("store", ("d",))])
+
+    def test_optional(self):
+        self.assertEqual(kinds("try:\n"
+                               "    import a\n"
+                               "except ImportError:\n"
+                               "    import b\n"),
+                         {"a": OPTIONAL, "b": UNCONDITIONAL})
+        self.assertEqual(kinds("try:\n"
+                               "    import a\n"
+                               "except (KeyError, ImportError):\n"
+                               "    pass\n"
+                               "else:\n"
+                               "    import b\n"),
+                         {"a": OPTIONAL, "b": UNCONDITIONAL})
+        self.assertEqual(kinds("try:\n    import a\nexcept:\n    pass\n"),
+                         {"a": OPTIONAL})
+        self.assertEqual(kinds("try:\n    import a\nexcept ValueError:\n    pass\n"),
+                         {"a": UNCONDITIONAL})
+        self.assertEqual(kinds("try:\n    import a\nfinally:\n    import b\n"),
+                         {"a": UNCONDITIONAL, "b": UNCONDITIONAL})
+
+    def test_deferred(self):
+        self.assertEqual(kinds("def f():\n    import a\n"
+                               "class C:\n    import b\n    g = lambda: __import__('c')\n"),
+                         {"a": DEFERRED, "b": UNCONDITIONAL, "c": DEFERRED})
+        # a function body runs outside of the try block around it
+        self.assertEqual(kinds("try:\n"
+                               "    def f():\n"
+                               "        import a\n"
+                               "    import b\n"
+                               "except ImportError:\n"
+                               "    pass\n"),
+                         {"a": DEFERRED, "b": OPTIONAL})
+
+    def test_platform(self):
+        source = ("import sys\n"
+                  "if sys.platform == 'win32':\n"
+                  "    import _winreg\n"
+                  "    def f():\n"
+                  "        import msvcrt\n"
+                  "else:\n"
+                  "    import termios\n")
+        self.assertEqual(kinds(source, LINUX),
+                         {"sys": UNCONDITIONAL, "_winreg": PLATFORM, "msvcrt": PLATFORM,
+                          "termios": UNCONDITIONAL})
+        self.assertEqual(kinds(source, WINDOWS),
+                         {"sys": UNCONDITIONAL, "_winreg": UNCONDITIONAL,
+                          "msvcrt": DEFERRED, "termios": PLATFORM})
+        # platform is stronger than optional
+        self.assertEqual(kinds("if os.name == 'nt':\n"
+                               "    try:\n        import a\n"
+                               "    except ImportError:\n        pass\n"),
+                         {"a": PLATFORM})
+        # unknown tests take both branches
+        self.assertEqual(kinds("if sys.version_info >= (2, 6):\n    import a\n"
+                               "else:\n    import b\n"),
+                         {"a": UNCONDITIONAL, "b": UNCONDITIONAL})
+
+    def test_dynamic_imports(self):
+        self.assertEqual(scan("def f():\n    __import__('a.b')\n"),
+                         [("store", ("f",)), ("import", (None, "a.b"), DEFERRED)])
+        self.assertEqual(scan("importlib.import_module('.c', __package__)\n"),
+                         [("relative_import", (1, None, "c"), UNCONDITIONAL)])
+        # not constant, or arguments the bytecode scanner does not handle
+        self.assertEqual(scan("__import__(name)\n__import__('a', fromlist=['b'])\n"), [])
+
+    def test_absolute_import(self):
+        self.assertEqual(scan("from __future__ import absolute_import\n"
+                              "import a\nfrom . import b\n"),
+                         [("absolute_import", (("absolute_import",), "__future__"),
+                           UNCONDITIONAL),
+                          ("store", ("absolute_import",)),
+                          ("absolute_import", (None, "a"), UNCONDITIONAL), ("store", ("a",)),
+                          ("relative_import", (1, ("b",), ""), UNCONDITIONAL),
+                          ("store", ("b",))])
+
+class PlatformTestTest(unittest.TestCase):
+    def evaluate(self, expression, platform=LINUX):
+        return platform.evaluate(ast.parse(expression, mode="eval").body)
+
+    def test_compare(self):
+        self.assertEqual(self.evaluate("sys.platform == 'win32'"), False)
+        self.assertEqual(self.evaluate("'win32' == sys.platform", WINDOWS), True)
+        self.assertEqual(self.evaluate("sys.platform != 'win32'"), True)
+        self.assertEqual(self.evaluate("os.name in ('nt', 'ce')"), False)
+        self.assertEqual(self.evaluate("os.name not in ['nt', 'ce']"), True)
+        self.assertEqual(self.evaluate("sys.platform.startswith('linux')"), True)
+        self.assertEqual(self.evaluate("sys.platform.startswith(('win', 'cygwin'))"),
+                         False)
+
+    def test_unknown(self):
+        self.assertEqual(self.evaluate("sys.platform == name"), None)
+        self.assertEqual(self.evaluate("sys.platform < 'win32'"), None)
+        self.assertEqual(self.evaluate("sys.maxint > 2**32"), None)
+        self.assertEqual(self.evaluate("os.name == 'nt' == other"), None)
+
+    def test_boolean(self):
+        self.assertEqual(self.evaluate("not sys.platform == 'win32'"), True)
+        self.assertEqual(self.evaluate("os.name == 'nt' and unknown"), False)
+        self.assertEqual(self.evaluate("os.name == 'posix' and unknown"), None)
+        self.assertEqual(self.evaluate("os.name == 'posix' or unknown"), True)
+        self.assertEqual(self.evaluate("os.name == 'nt' or unknown"), None)
+        self.assertEqual(self.evaluate("os.name == 'nt' or sys.platform == 'win32'"),
+                         False)
+        self.assertEqual(self.evaluate("not unknown"), None)
+
+class CatchesImportErrorTest(unittest.TestCase):
+    def catches(self, clause):
+        tree = ast.parse("try:\n    pass\n%s:\n    pass\n" % clause)
+        return astscan._catches_import_error(tree.body[0].handlers[0])
+
+    def test_catches(self):
+        self.assert_(self.catches("except"))
+        self.assert_(self.catches("except ImportError"))
+        self.assert_(self.catches("except ImportError, details"))
+        self.assert_(self.catches("except (OSError, ImportError)"))
+        self.assert_(self.catches("except exceptions.ImportError"))
+        self.assert_(self.catches("except Exception"))
+        self.failIf(self.catches("except ValueError"))
+        self.failIf(self.catches("except (KeyError, AttributeError)"))
+        self.failIf(self.catches("except errors[0]"))
+
+class StoreTest(unittest.TestCase):
+    def check(self, source):
+        # the same global names as the bytecode scanner
+        self.assertEqual(stores(scan(source)),
+                         stores(mf.scan_code_objects(compile(source, "m.py", "exec"))))
+
+    def test_module_and_class(self):
+        self.check('"""doc"""\nimport a.b as c\nx, (y, z) = 1, (2, 3)\n'
+                   'class C:\n    __private = 1\n    def m(self): pass\n')
+
+    def test_global_in_function(self):
+        self.check("def f():\n    global g\n    g = 1\n    local = 2\n")
+
+    def test_global_in_nested_function(self):
+        # the declaration in inner does not make counter global in outer
+        source = ("def outer():\n"
+                  "    def inner():\n"
+                  "        global counter\n"
+                  "        return counter\n"
+                  "    counter = 0\n"
+                  "    class C:\n"
+                  "        global flag\n"
+                  "        flag = 1\n"
+                  "    flag = 2\n")
+        self.check(source)
+        self.failIf("counter" in stores(scan(source)))
+        self.assert_("flag" in stores(scan(source)))
+
+    def test_global_in_outer_function(self):
+        self.check("def outer():\n"
+                   "    global counter\n"
+                   "    counter = 0\n"
+                   "    def inner():\n"
+                   "        counter = 1\n")
+
+class DropImportsTest(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        files = {"opt.py": "", "later.py": "", "winonly.py": ""}
+        for name, source in files.items():
+            open(os.path.join(self.dirname, name), "w").write(source)
+        self.script = os.path.join(self.dirname, "app.py")
+        open(self.script, "w").write("import sys\n"
+                                     "try:\n    import opt\n"
+                                     "except ImportError:\n    pass\n"
+                                     "if sys.platform == 'no-such-platform':\n"
+                                     "    import winonly\n"
+                                     "def f():\n    import later\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def run_finder(self, drop_imports):
+        finder = mf.ModuleFinder(path=[self.dirname] + sys.path, analysis="ast",
+                                 drop_imports=drop_imports)
+        finder.run_script(self.script)
+        return finder
+
+    def test_kinds_recorded(self):
+        finder = self.run_finder(())
+        for name in ["opt", "later", "winonly"]:
+            self.assert_(name in finder.modules)
+        self.assertEqual(finder._edge_kinds[("__main__", "opt")], OPTIONAL)
+        self.assertEqual(finder._edge_kinds[("__main__", "later")], DEFERRED)
+        self.assertEqual(finder._edge_kinds[("__main__", "winonly")], PLATFORM)
+
+    def test_dropped(self):
+        finder = self.run_finder((OPTIONAL, PLATFORM))
+        self.failIf("opt" in finder.modules)
+        self.failIf("winonly" in finder.modules)
+        self.failIf("winonly" in finder.badmodules)
+        self.assert_("later" in finder.modules)
+        self.assertEqual(sorted([(caller, args[-1], kind) for caller, what, args, kind
+                                 in finder._dropped_imports]),
+                         [("__main__", "opt", OPTIONAL), ("__main__", "winonly", PLATFORM)])
+
+if __name__ == "__main__":
+    unittest.main()
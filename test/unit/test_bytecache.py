@@ -0,0 +1,78 @@
+"""Tests for py2exe.bytecache."""
+import imp
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from py2exe.bytecache import BytecodeCache
+
+class BytecodeCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.cache = BytecodeCache(os.path.join(self.dirname, "cache"))
+        self.source = os.path.join(self.dirname, "mod.py")
+        self.write_source("x = 1\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write_source(self, text):
+        f = open(self.source, "w")
+        f.write(text)
+        f.close()
+
+    def pyc(self, mtime, code="code"):
+        return imp.get_magic() + struct.pack("<I", mtime) + code
+
+    def test_key(self):
+        key = self.cache.key(self.source, "mod.py", 0)
+        self.assertEqual(key, self.cache.key(self.source, "mod.py", 0))
+        self.assertNotEqual(key, self.cache.key(self.source, "pkg/mod.py", 0))
+        self.assertNotEqual(key, self.cache.key(self.source, "mod.py", 2))
+        # only the contents count, not the modification time
+        os.utime(self.source, (0, 0))
+        self.assertEqual(key, self.cache.key(self.source, "mod.py", 0))
+        self.write_source("x = 2\n")
+        self.assertNotEqual(key, self.cache.key(self.source, "mod.py", 0))
+
+    def test_get_put(self):
+        key = self.cache.key(self.source, "mod.py", 0)
+        self.assertEqual(self.cache.get(key, 1000), None)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+        self.cache.put(key, self.pyc(1000))
+        self.assertEqual(os.listdir(os.path.join(self.cache.dirname, key[:2])), [key])
+        # the header gets the modification time of the source asked for
+        self.assertEqual(self.cache.get(key, 2000), self.pyc(2000))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_put_existing(self):
+        key = self.cache.key(self.source, "mod.py", 0)
+        self.cache.put(key, self.pyc(1000))
+        self.cache.put(key, self.pyc(1000))
+        self.assertEqual(os.listdir(os.path.join(self.cache.dirname, key[:2])), [key])
+
+    def test_trim(self):
+        cache = BytecodeCache(self.cache.dirname, max_size=1000)
+        # nothing stored, nothing to do
+        cache.trim()
+        keys = ["%02x%s" % (i, "0" * 30) for i in range(5)]
+        for i, key in enumerate(keys):
+            cache.put(key, "x" * 300)
+            path = os.path.join(cache.dirname, key[:2], key)
+            os.utime(path, (1000000 + i, 1000000 + i))
+        # a hit makes the oldest entry the most recently used one
+        cache.get(keys[0], 0)
+        cache.trim()
+        left = [key for key in keys
+                if os.path.exists(os.path.join(cache.dirname, key[:2], key))]
+        # removed down to 90% of max_size
+        self.assertEqual(left, [keys[0], keys[3], keys[4]])
+        self.failIf(cache._dirty)
+
+if __name__ == "__main__":
+    unittest.main()
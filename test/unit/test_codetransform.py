@@ -0,0 +1,124 @@
+"""Tests for py2exe.codetransform.
+
+The tests in this directory need neither Windows nor a build; run them
+from the top directory with
+
+    python -m unittest discover -s test/unit
+"""
+import imp
+import marshal
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from py2exe import codetransform
+
+SOURCE = '''\
+"""module docstring"""
+def documented(a):
+    """function docstring"""
+    return a
+def plain():
+    return "not a docstring"
+class Documented:
+    """class docstring"""
+    def method(self):
+        "method docstring"
+        return 1
+class Plain:
+    x = "class constant"
+'''
+
+def run(co):
+    namespace = {"__name__": "transformed"}
+    exec co in namespace
+    return namespace
+
+def code_objects(co):
+    yield co
+    for const in co.co_consts:
+        if isinstance(const, types.CodeType):
+            for c in code_objects(const):
+                yield c
+
+class TransformCodeTest(unittest.TestCase):
+    def transformed(self, source, transforms):
+        return run(codetransform.transform_code(compile(source, "m.py", "exec"),
+                                                transforms))
+
+    def test_docstrings_removed(self):
+        ns = self.transformed(SOURCE, ["docstrings"])
+        self.assertEqual(ns["__doc__"], None)
+        self.assertEqual(ns["documented"].__doc__, None)
+        self.assertEqual(ns["Documented"].__doc__, None)
+        self.assertEqual(ns["Documented"].method.__doc__, None)
+
+    def test_code_without_docstrings_unchanged(self):
+        ns = self.transformed(SOURCE, ["docstrings"])
+        self.assertEqual(ns["documented"](5), 5)
+        self.assertEqual(ns["plain"](), "not a docstring")
+        self.assertEqual(ns["Plain"].x, "class constant")
+        self.assertEqual(ns["Documented"]().method(), 1)
+
+    def test_module_without_docstring(self):
+        ns = self.transformed('X = "first"\ndef f():\n    return X\n', ["docstrings"])
+        self.assertEqual(ns["X"], "first")
+        self.assertEqual(ns["f"](), "first")
+
+    def test_shared_constant_kept(self):
+        # the compiler shares equal constants with the docstring
+        ns = self.transformed('"same"\nX = "same"\n', ["docstrings"])
+        self.assertEqual(ns["X"], "same")
+
+    def test_lnotab(self):
+        co = codetransform.transform_code(compile(SOURCE, "m.py", "exec"), ["lnotab"])
+        for c in code_objects(co):
+            self.assertEqual(c.co_lnotab, "")
+        self.assertEqual(run(co)["documented"].__doc__, "function docstring")
+
+    def test_filenames_and_constants_keep_behaviour(self):
+        co = codetransform.transform_code(compile(SOURCE, "m.py", "exec"),
+                                          ["filenames", "constants"])
+        for c in code_objects(co):
+            self.assertEqual(c.co_filename, "m.py")
+        ns = run(co)
+        self.assertEqual(ns["__doc__"], "module docstring")
+        self.assertEqual(ns["plain"](), "not a docstring")
+
+class TransformPycTest(unittest.TestCase):
+    def test_saved(self):
+        co = compile(SOURCE, "m.py", "exec")
+        data = imp.get_magic() + "\0\0\0\0" + marshal.dumps(co)
+        saved = {}
+        result = codetransform.transform_pyc(data, ["docstrings", "lnotab"], saved)
+        self.assertEqual(result[:8], data[:8])
+        self.assert_(saved["docstrings"] > 0)
+        self.assert_(saved["lnotab"] > 0)
+        self.assertEqual(len(data) - len(result),
+                         saved["docstrings"] + saved["lnotab"])
+        self.assertEqual(run(marshal.loads(result[8:]))["__doc__"], None)
+
+class RulesTest(unittest.TestCase):
+    def test_parse_rules(self):
+        self.assertEqual(codetransform.parse_rules(["lnotab", "docstrings=mylib"]),
+                         [("lnotab", None), ("docstrings", "mylib")])
+        self.assertRaises(ValueError, codetransform.parse_rules, ["nothing"])
+
+    def test_transforms_for(self):
+        rules = codetransform.parse_rules(["lnotab", "docstrings=mylib"])
+        self.assertEqual(codetransform.transforms_for("mylib", rules),
+                         ["docstrings", "lnotab"])
+        self.assertEqual(codetransform.transforms_for("mylib.sub.mod", rules),
+                         ["docstrings", "lnotab"])
+        self.assertEqual(codetransform.transforms_for("mylibrary", rules),
+                         ["lnotab"])
+
+    def test_module_name(self):
+        self.assertEqual(codetransform.module_name("pkg\\sub\\__init__.pyc"), "pkg.sub")
+        self.assertEqual(codetransform.module_name("pkg/mod.pyo"), "pkg.mod")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Tests for py2exe.depgraph."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from py2exe import depgraph
+
+# main and tool are the entry points; d is reached from both, e and f
+# import each other
+EDGES = {"main": ["a", "b"],
+         "a": ["c", "e"],
+         "b": ["c"],
+         "c": ["d"],
+         "e": ["f"],
+         "f": ["e"],
+         "tool": ["d"]}
+SIZES = {"main": 1, "a": 2, "b": 4, "c": 8, "d": 16, "e": 32, "f": 64, "tool": 128}
+
+class DominatorTest(unittest.TestCase):
+    def setUp(self):
+        self.graph = depgraph.DepGraph(EDGES, ["main", "tool"], SIZES)
+
+    def test_dominators(self):
+        self.assertEqual(self.graph.dominators(),
+                         {"main": None, "tool": None, "d": None,
+                          "a": "main", "b": "main", "c": "main",
+                          "e": "a", "f": "e"})
+
+    def test_retained_sizes(self):
+        self.assertEqual(self.graph.retained_sizes(),
+                         {"main": 1 + 2 + 4 + 8 + 32 + 64, "a": 2 + 32 + 64,
+                          "b": 4, "c": 8, "d": 16, "e": 32 + 64, "f": 64,
+                          "tool": 128})
+
+    def test_unreachable(self):
+        graph = depgraph.DepGraph({"main": ["a"], "lost": ["a"]}, ["main"])
+        self.assertEqual(graph.dominators(), {"main": None, "a": "main"})
+        self.assertEqual(graph.why("lost"), None)
+
+    def test_packages(self):
+        # excluding a package also removes its submodules, which the
+        # dominator tree does not show
+        graph = depgraph.DepGraph({"main": ["pkg", "pkg.sub"], "pkg.sub": ["pkg"]},
+                                  ["main"], {"main": 1, "pkg": 2, "pkg.sub": 4})
+        self.assertEqual(graph.dominators()["pkg"], "main")
+        self.assertEqual(graph.retained_sizes()["pkg"], 2 + 4)
+
+    def test_exclusion(self):
+        self.assertEqual(self.graph.removed_by(["a"]), set(["a", "e", "f"]))
+        self.assertEqual(self.graph.removed_by(["c"]), set(["c"]))
+        self.assertEqual(self.graph.reachable(["main"]), set(["tool", "d"]))
+
+    def test_why(self):
+        self.assertEqual(self.graph.why("f"), ["main", "a", "e", "f"])
+        self.assertEqual(self.graph.why("d"), ["tool", "d"])
+
+    def test_save_load(self):
+        dirname = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(dirname, "depgraph.dat")
+            self.graph.save(filename)
+            graph = depgraph.load(filename)
+        finally:
+            shutil.rmtree(dirname)
+        self.assertEqual(graph.dominators(), self.graph.dominators())
+        self.assertEqual(graph.retained_sizes(), self.graph.retained_sizes())
+
+if __name__ == "__main__":
+    unittest.main()
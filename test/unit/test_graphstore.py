@@ -0,0 +1,220 @@
+"""Tests for py2exe.graphstore."""
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from py2exe import depgraph, mf, streamzip
+from py2exe.graphstore import GraphStore
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, "graph.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+class ModuleTableTest(StoreTestCase):
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.store = GraphStore(self.filename, size=2)
+        self.table = self.store.modules
+
+    def tearDown(self):
+        self.store.close()
+        StoreTestCase.tearDown(self)
+
+    def add(self, name, path=None, finish=1):
+        m = mf.Module(name, name + ".py", path)
+        m.globalnames = set([name + "_global"])
+        self.table[name] = m
+        if finish:
+            self.table.finish(m)
+        return m
+
+    def test_eviction(self):
+        for name in ["a", "b", "c", "d"]:
+            self.add(name)
+        # the oldest finished modules are written and dropped
+        self.assertEqual(sorted(self.table._pinned), ["c", "d"])
+        self.assertEqual(sorted(self.table.keys()), ["a", "b", "c", "d"])
+
+    def test_unfinished_kept(self):
+        modules = [self.add(name, finish=0) for name in ["a", "b", "c"]]
+        # still being loaded, none can go
+        self.assertEqual(sorted(self.table._pinned), ["a", "b", "c"])
+        self.table.finish(modules[1])
+        self.add("d", finish=0)
+        self.assertEqual(sorted(self.table._pinned), ["a", "c", "d"])
+
+    def test_identity(self):
+        a = self.add("a")
+        for name in ["b", "c", "d"]:
+            self.add(name)
+        self.failIf("a" in self.table._pinned)
+        # a module still referenced is always the same object
+        self.assert_(self.table["a"] is a)
+
+    def test_reload(self):
+        self.add("pkg", path=["pkg"]).starimports.add("other")
+        for name in ["b", "c", "d"]:
+            self.add(name)
+        gc.collect()
+        self.failIf("pkg" in self.table._live)
+        m = self.table["pkg"]
+        self.assertEqual(m.__file__, "pkg.py")
+        self.assertEqual(m.__path__, ["pkg"])
+        self.assertEqual(m.globalnames, set(["pkg_global"]))
+        self.assertEqual(m.starimports, set(["other"]))
+        self.assert_(self.table["pkg"] is m)
+
+    def test_changed_after_eviction(self):
+        a = self.add("a")
+        for name in ["b", "c", "d"]:
+            self.add(name)
+        a.globalnames.add("late")
+        self.store.flush()
+        del a
+        gc.collect()
+        self.assertEqual(self.table["a"].globalnames, set(["a_global", "late"]))
+
+    def test_delete(self):
+        self.add("a")
+        for name in ["b", "c", "d"]:
+            self.add(name)
+        del self.table["a"]
+        del self.table["d"]
+        self.assertRaises(KeyError, self.table.__getitem__, "a")
+        self.failIf(self.table.has_key("d"))
+        self.assertEqual(sorted(self.table.keys()), ["b", "c"])
+        self.assertRaises(KeyError, self.table.__delitem__, "a")
+
+    def test_submodules(self):
+        pkg = self.add("pkg", path=["pkg"])
+        for name in ["pkg.a", "pkg.sub", "pkg.sub.b", "pkgother"]:
+            self.add(name)
+        self.assertEqual(sorted(pkg.submodules.keys()), ["a", "sub"])
+        self.assert_("sub" in pkg.submodules)
+        self.assertEqual(pkg.submodules.get("b"), None)
+        del self.table["pkg.a"]
+        self.assertEqual(pkg.submodules.keys(), ["sub"])
+
+class TablesTest(StoreTestCase):
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.store = GraphStore(self.filename)
+
+    def tearDown(self):
+        self.store.close()
+        StoreTestCase.tearDown(self)
+
+    def test_multitable(self):
+        edges = self.store.edges
+        edges.setdefault("a", set()).add("b")
+        edges["a"].add("c")
+        edges.setdefault("a", set()).discard("b")
+        self.assertEqual(edges["a"], set(["c"]))
+        # a key with no values
+        edges["empty"] = []
+        self.assert_(edges.has_key("empty"))
+        self.assertEqual(list(edges["empty"]), [])
+        self.assertEqual(sorted(edges.keys()), ["a", "empty"])
+        del edges["a"]
+        self.assertRaises(KeyError, edges.__getitem__, "a")
+        self.assertEqual(self.store.importers("c"), [])
+
+    def test_edge_kinds(self):
+        kinds = self.store.edge_kinds
+        kinds[("a", "b")] = "optional"
+        # setting a kind adds the edge
+        self.assertEqual(list(self.store.edges["a"]), ["b"])
+        self.assertEqual(kinds[("a", "b")], "optional")
+        self.assertEqual(kinds.keys(), [("a", "b")])
+        del kinds[("a", "b")]
+        self.assertEqual(kinds.keys(), [])
+        # the edge stays
+        self.assertEqual(self.store.importers("b"), ["a"])
+        self.assertRaises(KeyError, kinds.__delitem__, ("a", "b"))
+
+class FinderStoreTest(StoreTestCase):
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.lib = os.path.join(self.dirname, "lib")
+        os.mkdir(self.lib)
+        # a chain of star imports, and more modules than the store holds
+        files = {"a.py": "from b import *\nimport pkg.one\n",
+                 "b.py": "from c import *\nx = 1\n",
+                 "c.py": "import pkg.two\ny = 2\ndef f(): pass\n",
+                 "pkg/__init__.py": "",
+                 "pkg/one.py": "import c\n",
+                 "pkg/two.py": "try:\n    import missing\nexcept ImportError:\n    pass\n"}
+        for name, source in files.items():
+            pathname = os.path.join(self.lib, *name.split("/"))
+            if not os.path.isdir(os.path.dirname(pathname)):
+                os.makedirs(os.path.dirname(pathname))
+            open(pathname, "w").write(source)
+        self.script = os.path.join(self.dirname, "app.py")
+        open(self.script, "w").write("from a import *\n")
+
+    def run_finder(self, **kw):
+        finder = mf.ModuleFinder(path=[self.lib], analysis="ast", **kw)
+        finder.run_script(self.script)
+        return finder
+
+    def summary(self, finder):
+        result = {}
+        for name in finder.modules.keys():
+            m = finder.modules[name]
+            result[name] = (m.__file__, sorted(m.globalnames), sorted(m.starimports))
+        return result
+
+    def test_same_as_memory(self):
+        memory = self.run_finder()
+        store = GraphStore(self.filename, size=3)
+        stored = self.run_finder(store=store)
+        self.assertEqual(self.summary(stored), self.summary(memory))
+        self.assertEqual(dict(store.badmodules.items()),
+                         dict([(k, set(v)) for k, v in memory.badmodules.items()]))
+        self.assertEqual(dict(store.types.items()), memory._types)
+        stored.close()
+        store.close()
+
+    def test_round_trip(self):
+        memory = depgraph.from_modulefinder(self.run_finder())
+        store = GraphStore(self.filename, size=3)
+        finder = self.run_finder(store=store)
+        finder.close()
+        store.close()
+        loaded = depgraph.load(self.filename)
+        self.assertEqual(loaded.roots, memory.roots)
+        self.assertEqual(loaded.edges, memory.edges)
+        self.assertEqual(loaded.types, memory.types)
+        self.assertEqual(loaded.kinds, memory.kinds)
+        self.assertEqual(loaded.dominators(), memory.dominators())
+
+    def test_stream(self):
+        # With analysis='ast' the modules have no code objects, the
+        # archive loads them through the store, which only works in the
+        # thread of the analysis.
+        store = GraphStore(self.filename, size=3)
+        finder = mf.ModuleFinder(path=[self.lib], analysis="ast", store=store)
+        archive = streamzip.StreamingArchive(os.path.join(self.dirname, "library.zip"),
+                                             get_code=finder.get_code)
+        finder.listener = archive.add_module
+        finder.run_script(self.script)
+        finder.close()
+        archive.close()
+        store.close()
+        names = zipfile.ZipFile(archive.filename).namelist()
+        names.sort()
+        self.assertEqual(names, ["a.pyc", "b.pyc", "c.pyc", "pkg\\__init__.pyc",
+                                 "pkg\\one.pyc", "pkg\\two.pyc"])
+
+if __name__ == "__main__":
+    unittest.main()
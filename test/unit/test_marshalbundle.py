@@ -0,0 +1,126 @@
+"""Tests for py2exe.marshalbundle."""
+import imp
+import marshal
+import os
+import pkgutil
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from py2exe import marshalbundle
+
+SEP = marshalbundle._SEP
+
+def compiled(source, filename):
+    return imp.get_magic() + "\0\0\0\0" + marshal.dumps(compile(source, filename, "exec"))
+
+FILES = [("bundletest/__init__.pyc", compiled("VALUE = 'package'\n", "bundletest/__init__.py")),
+         ("bundletest/a.pyc", compiled("from bundletest.sub import b\nVALUE = b.VALUE + 1\n",
+                                       "bundletest/a.py")),
+         ("bundletest/sub/__init__.pyc", compiled("", "bundletest/sub/__init__.py")),
+         ("bundletest/sub/b.pyc", compiled("VALUE = 41\n", "bundletest/sub/b.py")),
+         ("bundletest_top.pyc", compiled("def f():\n    return 'top'\n", "bundletest_top.py"))]
+
+class BundleTest(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, "library.bundle")
+        self.sizes = marshalbundle.write_bundle(self.filename, FILES)
+        self.saved = sys.path[:], sys.meta_path[:], sys.path_hooks[:]
+
+    def tearDown(self):
+        sys.path[:], sys.meta_path[:], sys.path_hooks[:] = self.saved
+        for entry in list(sys.path_importer_cache):
+            if entry.startswith(self.filename):
+                del sys.path_importer_cache[entry]
+        for name in list(sys.modules):
+            if name.startswith("bundletest"):
+                del sys.modules[name]
+        shutil.rmtree(self.dirname)
+
+    def test_write_bundle(self):
+        self.assertEqual(sorted(self.sizes), sorted([arcname for arcname, data in FILES]))
+        for arcname, data in FILES:
+            self.assertEqual(self.sizes[arcname], len(data) - 8)
+        self.assertEqual(os.path.getsize(self.filename) - marshalbundle.HEADER_SIZE
+                         - len(marshal.dumps(tuple(self.index_entries()))),
+                         sum(self.sizes.values()))
+
+    def index_entries(self):
+        importer = marshalbundle.BundleImporter(self.filename)
+        return [(name,) + importer.index[name] for name in importer.names]
+
+    def test_index(self):
+        importer = marshalbundle.BundleImporter(self.filename)
+        self.assertEqual(importer.names, ["bundletest", "bundletest.a", "bundletest.sub",
+                                          "bundletest.sub.b", "bundletest_top"])
+        self.assert_(importer.is_package("bundletest.sub"))
+        self.failIf(importer.is_package("bundletest.sub.b"))
+        self.assertEqual(importer.get_source("bundletest.a"), None)
+        self.assertRaises(ImportError, importer.get_code, "missing")
+        self.assertRaises(IOError, importer.get_data, self.filename + SEP + "data.txt")
+        self.assertEqual(importer.find_module("missing"), None)
+
+    def test_write_bundle_bad_magic(self):
+        self.assertRaises(ValueError, marshalbundle.write_bundle,
+                          os.path.join(self.dirname, "bad.bundle"),
+                          [("bad.pyc", "\0\0\0\0\0\0\0\0")])
+
+    def test_not_a_bundle(self):
+        other = os.path.join(self.dirname, "other")
+        open(other, "wb").write("PK\3\4" + "\0" * 40)
+        self.assertRaises(ImportError, marshalbundle.BundleImporter, other)
+
+    def test_import(self):
+        importer = marshalbundle.BundleImporter(self.filename)
+        sys.meta_path.insert(0, importer)
+        import bundletest.a
+        self.assertEqual(bundletest.a.VALUE, 42)
+        self.assertEqual(bundletest.VALUE, "package")
+        self.assert_(bundletest.a.__loader__ is importer)
+        self.assertEqual(bundletest.a.__file__,
+                         self.filename + SEP + "bundletest" + SEP + "a" + marshalbundle._EXT)
+        self.assertEqual(bundletest.sub.__path__,
+                         [self.filename + SEP + "bundletest" + SEP + "sub"])
+        self.assertEqual(bundletest.sub.__file__,
+                         self.filename + SEP + "bundletest" + SEP + "sub" + SEP
+                         + "__init__" + marshalbundle._EXT)
+
+    def test_install(self):
+        sys.path.insert(0, self.filename)
+        importer = marshalbundle.install("library.bundle")
+        self.assert_(importer is not None)
+        self.assertEqual(importer.archive, self.filename)
+        import bundletest_top
+        self.assertEqual(bundletest_top.f(), "top")
+        self.assertEqual(marshalbundle.install("other.bundle"), None)
+
+    def test_iter_modules(self):
+        importer = marshalbundle.BundleImporter(self.filename)
+        self.assertEqual(list(importer.iter_modules()),
+                         [("bundletest", True), ("bundletest_top", False)])
+        self.assertEqual(list(importer.iter_modules("bundletest.", "bundletest")),
+                         [("bundletest.a", False), ("bundletest.sub", True)])
+
+    def test_pkgutil(self):
+        sys.path.insert(0, self.filename)
+        marshalbundle.install("library.bundle")
+        import bundletest
+        names = [(name, ispkg) for loader, name, ispkg
+                 in pkgutil.walk_packages(bundletest.__path__, "bundletest.")]
+        self.assertEqual(names, [("bundletest.a", False), ("bundletest.sub", True),
+                                 ("bundletest.sub.b", False)])
+
+    def test_boot_code(self):
+        sys.path.insert(0, self.filename)
+        namespace = {}
+        exec marshalbundle.boot_code("library.bundle") in namespace
+        self.assertEqual(namespace.keys(), ["__builtins__"])
+        import bundletest.sub.b
+        self.assertEqual(bundletest.sub.b.VALUE, 41)
+
+if __name__ == "__main__":
+    unittest.main()
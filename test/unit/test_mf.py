@@ -0,0 +1,262 @@
+"""Tests for the ModuleFinder of py2exe.mf."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from py2exe import mf
+from py2exe.hooks import HookRegistry
+
+class FinderTestCase(unittest.TestCase):
+    # the modules in the lib directory, name -> source
+    files = {}
+    script = ""
+    # the hook files, module name -> source; None for no hooks
+    hooks = None
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.lib = os.path.join(self.dirname, "lib")
+        os.mkdir(self.lib)
+        for name, source in self.files.items():
+            self.write(name, source)
+        self.script_name = os.path.join(self.dirname, "app.py")
+        self.write_file(self.script_name, self.script)
+        registry = None
+        if self.hooks is not None:
+            hook_dir = os.path.join(self.dirname, "hooks")
+            os.mkdir(hook_dir)
+            for name, source in self.hooks.items():
+                self.write_file(os.path.join(hook_dir, "hook-%s.py" % name), source)
+            registry = HookRegistry([hook_dir])
+        self.finder = mf.ModuleFinder(path=[self.lib], hooks=registry)
+        self.finder.run_script(self.script_name)
+
+    def tearDown(self):
+        self.finder.close()
+        shutil.rmtree(self.dirname)
+
+    def write_file(self, pathname, source):
+        f = open(pathname, "w")
+        f.write(source)
+        f.close()
+
+    def path(self, name):
+        return os.path.join(self.lib, *name.split("/"))
+
+    def write(self, name, source):
+        if not os.path.isdir(os.path.dirname(self.path(name))):
+            os.makedirs(os.path.dirname(self.path(name)))
+        self.write_file(self.path(name), source)
+
+    def names(self):
+        names = self.finder.modules.keys()
+        names.sort()
+        return names
+
+class RescanTest(FinderTestCase):
+    files = {"a.py": "import b\nimport c\n",
+             "b.py": "",
+             "c.py": "",
+             "d.py": "import c\n"}
+    script = "import a\nimport d\n"
+
+    def test_found(self):
+        self.assertEqual(self.names(), ["__main__", "a", "b", "c", "d"])
+
+    def test_changed_module(self):
+        self.write("a.py", "import c\nimport e\n")
+        self.write("e.py", "")
+        self.assertEqual(self.finder.rescan([self.path("a.py")]),
+                         (set(["a"]), set(["e"]), set(["b"])))
+        self.assertEqual(self.names(), ["__main__", "a", "c", "d", "e"])
+
+    def test_still_imported(self):
+        # c is imported by a too
+        self.write("d.py", "")
+        self.assertEqual(self.finder.rescan([self.path("d.py")]),
+                         (set(["d"]), set(), set()))
+        self.write("a.py", "")
+        self.assertEqual(self.finder.rescan([self.path("a.py")]),
+                         (set(["a"]), set(), set(["b", "c"])))
+
+    def test_changed_script(self):
+        self.write_file(self.script_name, "import d\n")
+        self.assertEqual(self.finder.rescan([self.script_name]),
+                         (set(["__main__"]), set(), set(["a", "b"])))
+
+    def test_deleted_module(self):
+        # a is scanned again, and b is missing now
+        os.remove(self.path("b.py"))
+        self.assertEqual(self.finder.rescan([self.path("b.py")]),
+                         (set(["a"]), set(), set(["b"])))
+        self.assert_("b" in self.finder.badmodules)
+
+    def test_missing_module_added(self):
+        self.write("a.py", "import b\nimport later\n")
+        self.finder.rescan([self.path("a.py")])
+        self.assert_("later" in self.finder.badmodules)
+        self.write("later.py", "import c\n")
+        self.assertEqual(self.finder.rescan([self.path("a.py")]),
+                         (set(["a"]), set(["later"]), set()))
+        self.failIf("later" in self.finder.badmodules)
+
+    def test_unchanged(self):
+        self.assertEqual(self.finder.rescan([os.path.join(self.dirname, "other.txt")]),
+                         (set(), set(), set()))
+
+class PackageRescanTest(FinderTestCase):
+    files = {"pkg/__init__.py": "",
+             "pkg/one.py": "",
+             "pkg/two.py": ""}
+    script = "import pkg.one\n"
+
+    def test_package_module(self):
+        self.write("pkg/one.py", "from pkg import two\n")
+        self.assertEqual(self.finder.rescan([self.path("pkg/one.py")]),
+                         (set(["pkg.one"]), set(["pkg.two"]), set()))
+        self.write("pkg/one.py", "")
+        self.assertEqual(self.finder.rescan([self.path("pkg/one.py")]),
+                         (set(["pkg.one"]), set(), set(["pkg.two"])))
+        self.failIf("two" in self.finder.modules["pkg"].submodules)
+
+class RetainTest(FinderTestCase):
+    files = {"a.py": "import b\nimport __main__\n",
+             "b.py": "",
+             "c.py": "import pkg.sub.mod\n",
+             "pkg/__init__.py": "",
+             "pkg/other.py": "",
+             "pkg/sub/__init__.py": "",
+             "pkg/sub/mod.py": ""}
+    script = "import a\nimport c\nimport pkg.other\n"
+
+    def test_reachable(self):
+        self.assertEqual(self.finder.reachable(["c"]),
+                         set(["c", "pkg", "pkg.sub", "pkg.sub.mod"]))
+        # importing __main__ does not make a need the script
+        self.assertEqual(self.finder.reachable(["a"]), set(["a", "b"]))
+        self.assertEqual(self.finder.reachable(["missing"]), set())
+
+    def test_retain(self):
+        removed = self.finder.retain(["__main__", "a", "pkg.sub.mod"])
+        removed.sort()
+        self.assertEqual(removed, ["b", "c", "pkg.other"])
+        # the packages of the modules kept are kept too
+        self.assertEqual(self.names(), ["__main__", "a", "pkg", "pkg.sub", "pkg.sub.mod"])
+        self.failIf("other" in self.finder.modules["pkg"].submodules)
+        self.failIf("b" in self.finder._depgraph.get("a", ()))
+
+    def test_retain_reachable(self):
+        self.assertEqual(self.finder.retain(self.finder.reachable(["__main__"])), [])
+        self.assertEqual(len(self.names()), 8)
+
+class HookRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.dirs = [os.path.join(self.dirname, "one"), os.path.join(self.dirname, "two")]
+        for dirname in self.dirs:
+            os.mkdir(dirname)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write(self, dirname, fname, source):
+        f = open(os.path.join(dirname, fname), "w")
+        f.write(source)
+        f.close()
+
+    def test_get(self):
+        self.write(self.dirs[0], "hook-mod.py",
+                   "hiddenimports = ['hidden']\n"
+                   "excludes = ['big']\n"
+                   "aliases = {'_mod': 'mod'}\n"
+                   "ignores = ['optional']\n"
+                   "datafiles = [('data', ['*.txt'])]\n")
+        registry = HookRegistry(self.dirs)
+        self.assertEqual(registry.get("other"), None)
+        hook = registry.get("mod")
+        self.assert_(registry.get("mod") is hook)
+        self.assertEqual(hook.hiddenimports, ["hidden"])
+        self.assertEqual(hook.excludes, ["big"])
+        self.assertEqual(registry.aliases(), {"_mod": "mod"})
+        self.assertEqual(registry.ignores(), ["optional"])
+        self.assertEqual(hook.datafiles, [("data", ["*.txt"])])
+
+    def test_order(self):
+        self.write(self.dirs[0], "hook-mod.py", "hiddenimports = ['first']\n")
+        self.write(self.dirs[1], "hook-mod.py", "hiddenimports = ['second']\n")
+        self.write(self.dirs[1], "hook-other.py", "")
+        registry = HookRegistry(self.dirs)
+        self.assertEqual(registry.get("mod").hiddenimports, ["first"])
+        # only what has been asked for is loaded
+        self.assertEqual([hook.name for hook in registry.loaded()], ["mod"])
+        registry.get("other")
+        self.assertEqual([hook.name for hook in registry.loaded()], ["mod", "other"])
+
+    def test_builtin_hooks(self):
+        # the directory of py2exe.hooks comes last
+        self.write(self.dirs[0], "hook-time.py", "")
+        self.assertEqual(HookRegistry(self.dirs).get("time").hiddenimports, [])
+        self.assertEqual(HookRegistry().get("time").hiddenimports, ["_strptime"])
+
+    def test_platform_ignores(self):
+        self.write(self.dirs[1], "platform-testplatform.py", "ignores = ['posix']\n")
+        registry = HookRegistry(self.dirs)
+        self.assertEqual(registry.platform_ignores("testplatform"), ["posix"])
+        self.assertEqual(registry.platform_ignores("otherplatform"), [])
+
+class HiddenImportTest(FinderTestCase):
+    files = {"a.py": "",
+             "b.py": "import c\n",
+             "c.py": "",
+             "d.py": ""}
+    script = "import a\n"
+    hooks = {"a": "hiddenimports = ['b']\n"}
+
+    def test_hidden_imports(self):
+        self.assertEqual(self.names(), ["__main__", "a", "b", "c"])
+        self.assertEqual(set(self.finder._depgraph["a"]), set(["b"]))
+
+    def test_rescan(self):
+        # the hidden imports are done again for a module scanned again
+        self.write("a.py", "import d\n")
+        self.assertEqual(self.finder.rescan([self.path("a.py")]),
+                         (set(["a"]), set(["d"]), set()))
+        self.assertEqual(self.names(), ["__main__", "a", "b", "c", "d"])
+
+    def test_removed_module(self):
+        # a module removed before its hidden imports were done
+        self.finder._hook_imports.append(("gone", ["d"]))
+        self.finder.process_hook_imports()
+        self.failIf("d" in self.finder.modules)
+
+class HookExcludeTest(FinderTestCase):
+    files = {"big/__init__.py": "import shared\n",
+             "big/sub.py": "",
+             "shared.py": "",
+             "a.py": "import big.sub\n"}
+    # big is found before the hook of a, which excludes it, is loaded
+    script = "import big\nimport a\nimport shared\n"
+    hooks = {"a": "excludes = ['big']\n"}
+
+    def test_found_before_hook(self):
+        self.assert_("big" in self.finder.modules)
+        removed = self.finder.apply_hook_excludes()
+        removed.sort()
+        self.assertEqual(removed, ["big", "big.sub"])
+        # shared is imported by the script too
+        self.assertEqual(self.names(), ["__main__", "a", "shared"])
+        self.assert_("big" in self.finder.excludes)
+        self.assertEqual(self.finder.apply_hook_excludes(), [])
+
+    def test_rescan(self):
+        # rescan() applies the excludes too
+        self.write_file(self.script_name, "import big\nimport a\n")
+        self.assertEqual(self.finder.rescan([self.script_name]),
+                         (set(["__main__"]), set(), set(["big", "big.sub", "shared"])))
+
+if __name__ == "__main__":
+    unittest.main()
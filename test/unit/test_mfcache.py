@@ -0,0 +1,173 @@
+"""Tests for the ScanCache of py2exe.mfcache."""
+import imp
+import marshal
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from py2exe import mf, mfcache
+
+class CacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, "scan.cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write(self, name, source, mtime=None):
+        pathname = os.path.join(self.dirname, name)
+        f = open(pathname, "w")
+        f.write(source)
+        f.close()
+        if mtime is not None:
+            os.utime(pathname, (mtime, mtime))
+        return pathname
+
+class EventsTest(CacheTestCase):
+    def test_unchanged(self):
+        pathname = self.write("mod.py", "import b\n", 1000000)
+        cache = mfcache.ScanCache()
+        self.assertEqual(cache.get_events(pathname), None)
+        cache.put_events(pathname, imp.PY_SOURCE, ["events"])
+        self.assertEqual(cache.get_events(pathname), ["events"])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_touched(self):
+        pathname = self.write("mod.py", "import b\n", 1000000)
+        cache = mfcache.ScanCache()
+        cache.put_events(pathname, imp.PY_SOURCE, ["events"])
+        os.utime(pathname, (2000000, 2000000))
+        self.assertEqual(cache.get_events(pathname), ["events"])
+
+    def test_size_changed(self):
+        pathname = self.write("mod.py", "import b\n", 1000000)
+        cache = mfcache.ScanCache()
+        cache.put_events(pathname, imp.PY_SOURCE, ["events"])
+        self.write("mod.py", "import bc\n", 1000000)
+        self.assertEqual(cache.get_events(pathname), None)
+
+    def test_contents_changed(self):
+        # same size and modification time, like a file changed twice
+        # within the timestamp resolution
+        pathname = self.write("mod.py", "import b\n", 1000000)
+        cache = mfcache.ScanCache()
+        cache.put_events(pathname, imp.PY_SOURCE, ["events"])
+        self.write("mod.py", "import c\n", 1000000)
+        self.assertEqual(cache.get_events(pathname), None)
+
+    def test_deleted(self):
+        pathname = self.write("mod.py", "import b\n")
+        cache = mfcache.ScanCache()
+        cache.put_events(pathname, imp.PY_SOURCE, ["events"])
+        os.remove(pathname)
+        self.assertEqual(cache.get_events(pathname), None)
+
+class PersistenceTest(CacheTestCase):
+    def test_save_load(self):
+        pathname = self.write("mod.py", "import b\n")
+        cache = mfcache.ScanCache(self.filename)
+        cache.put_events(pathname, imp.PY_SOURCE, ["events"])
+        cache.save()
+        self.assertEqual(mfcache.ScanCache(self.filename).get_events(pathname), ["events"])
+        # the analysis methods do not share their events
+        self.assertEqual(mfcache.ScanCache(self.filename, "ast").get_events(pathname), None)
+
+    def test_version(self):
+        pathname = self.write("mod.py", "import b\n")
+        cache = mfcache.ScanCache(self.filename)
+        cache.put_events(pathname, imp.PY_SOURCE, ["events"])
+        cache.save()
+        data = marshal.load(open(self.filename, "rb"))
+        self.assertEqual(data["version"], mfcache.CACHE_VERSION)
+        data["version"] = mfcache.CACHE_VERSION - 1
+        marshal.dump(data, open(self.filename, "wb"))
+        self.assertEqual(mfcache.ScanCache(self.filename).get_events(pathname), None)
+
+    def test_corrupt(self):
+        open(self.filename, "wb").write("garbage")
+        self.assertEqual(mfcache.ScanCache(self.filename)._files, {})
+
+class LocationTest(CacheTestCase):
+    def setUp(self):
+        CacheTestCase.setUp(self)
+        self.path = []
+        for name in ["one", "two", "three"]:
+            dirname = os.path.join(self.dirname, name)
+            os.mkdir(dirname)
+            self.path.append(dirname)
+        self.found = (os.path.join(self.path[1], "mod.py"), (".py", "U", imp.PY_SOURCE))
+        self.set_mtimes(1000000)
+
+    def set_mtimes(self, mtime):
+        for dirname in self.path:
+            os.utime(dirname, (mtime, mtime))
+
+    def touch(self, dirname):
+        os.utime(dirname, (2000000, 2000000))
+
+    def test_found(self):
+        cache = mfcache.ScanCache()
+        cache.put_location("mod", self.path, self.found)
+        self.assertEqual(cache.get_location("mod", self.path), self.found)
+        self.assertRaises(KeyError, cache.get_location, "mod", self.path[1:])
+        # the directories after the one it was found in do not matter
+        self.touch(self.path[2])
+        cache.refresh()
+        self.assertEqual(cache.get_location("mod", self.path), self.found)
+        # a module added to a directory before it would be found first
+        self.touch(self.path[0])
+        # the directories are only looked at again after refresh()
+        self.assertEqual(cache.get_location("mod", self.path), self.found)
+        cache.refresh()
+        self.assertRaises(KeyError, cache.get_location, "mod", self.path)
+
+    def test_missing(self):
+        cache = mfcache.ScanCache()
+        cache.put_location("mod", self.path, None)
+        self.assertEqual(cache.get_location("mod", self.path), None)
+        self.touch(self.path[2])
+        cache.refresh()
+        self.assertRaises(KeyError, cache.get_location, "mod", self.path)
+
+class FinderCacheTest(CacheTestCase):
+    def setUp(self):
+        CacheTestCase.setUp(self)
+        self.lib = os.path.join(self.dirname, "lib")
+        os.mkdir(self.lib)
+        for name in ["a", "b", "c"]:
+            self.write(os.path.join("lib", name + ".py"), "")
+        self.script = self.write("app.py", "import a\n")
+
+    def run_finder(self):
+        cache = mfcache.ScanCache(self.filename)
+        finder = mf.ModuleFinder(path=[self.lib], cache=cache)
+        finder.run_script(self.script)
+        finder.close()
+        cache.save()
+        names = finder.modules.keys()
+        names.sort()
+        return names, cache
+
+    def test_replayed(self):
+        self.write(os.path.join("lib", "a.py"), "import b\n", 1000000)
+        names, cache = self.run_finder()
+        self.assertEqual(names, ["__main__", "a", "b"])
+        self.assertEqual(cache.hits, 0)
+        names, cache = self.run_finder()
+        self.assertEqual(names, ["__main__", "a", "b"])
+        self.assert_(cache.hits > 0)
+
+    def test_changed_within_timestamp(self):
+        self.write(os.path.join("lib", "a.py"), "import b\n", 1000000)
+        self.run_finder()
+        self.write(os.path.join("lib", "a.py"), "import c\n", 1000000)
+        names, cache = self.run_finder()
+        self.assertEqual(names, ["__main__", "a", "c"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Tests for py2exe.pathindex."""
+import imp
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from py2exe import pathindex
+
+EXTENSION = [suffix for suffix, mode, typ in imp.get_suffixes()
+             if typ == imp.C_EXTENSION][0]
+
+class ZipLookupTest(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.archive = os.path.join(self.dirname, "egg.zip")
+        self.write_archive([("mod.py", "x = 1\r\n"),
+                            ("pkg/__init__.py", ""),
+                            ("pkg/sub.py", "y = 2\n"),
+                            ("pkg/data.txt", "data"),
+                            ("ext" + EXTENSION, "")])
+        self.index = pathindex.PathIndex()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write_archive(self, files, mtime=None):
+        z = zipfile.ZipFile(self.archive, "w")
+        for name, data in files:
+            z.writestr(name, data)
+        z.close()
+        if mtime is not None:
+            os.utime(self.archive, (mtime, mtime))
+
+    def test_split_archive(self):
+        self.assertEqual(pathindex.split_archive(os.path.join(self.archive, "pkg", "sub.py")),
+                         (self.archive, "pkg/sub.py"))
+        self.assertEqual(pathindex.split_archive(self.archive), (self.archive, ""))
+        self.assertEqual(pathindex.split_archive(os.path.join(self.dirname, "missing.py")),
+                         None)
+
+    def test_lookup(self):
+        self.assertEqual(self.index.lookup("mod", self.archive),
+                         (os.path.join(self.archive, "mod.py"), (".py", "U", imp.PY_SOURCE)))
+        self.assertEqual(self.index.lookup("pkg", self.archive),
+                         (os.path.join(self.archive, "pkg"), ("", "", imp.PKG_DIRECTORY)))
+        self.assertEqual(self.index.lookup("sub", os.path.join(self.archive, "pkg"))[0],
+                         os.path.join(self.archive, "pkg", "sub.py"))
+        self.assertEqual(self.index.lookup("missing", self.archive), None)
+        # zipimport cannot import extension modules
+        self.assertEqual(self.index.lookup("ext", self.archive), None)
+
+    def test_find_module(self):
+        fp, pathname, desc = self.index.find_module("mod", [self.dirname, self.archive])
+        self.assertEqual(pathname, os.path.join(self.archive, "mod.py"))
+        self.assertEqual(desc[2], imp.PY_SOURCE)
+        # read with universal newlines
+        self.assertEqual(fp.read(), "x = 1\n")
+        self.assertRaises(ImportError, self.index.find_module, "missing", [self.archive])
+
+    def test_find_all_submodules(self):
+        self.assertEqual(self.index.find_all_submodules([os.path.join(self.archive, "pkg")]),
+                         ["sub"])
+
+    def test_open_file(self):
+        self.assertEqual(pathindex.open_file(os.path.join(self.archive, "pkg", "data.txt"),
+                                             "rb").read(), "data")
+        self.assertRaises(IOError, pathindex.open_file,
+                          os.path.join(self.archive, "pkg", "missing.txt"))
+
+    def test_getmtime(self):
+        os.utime(self.archive, (1000000, 1000000))
+        self.assertEqual(pathindex.getmtime(os.path.join(self.archive, "mod.py")), 1000000)
+
+    def test_refresh(self):
+        os.utime(self.archive, (1000000, 1000000))
+        self.assertEqual(self.index.lookup("new", self.archive), None)
+        self.write_archive([("new.py", "")], 2000000)
+        # the listing is kept until refresh()
+        self.assertEqual(self.index.lookup("new", self.archive), None)
+        self.index.refresh()
+        self.assertEqual(self.index.lookup("new", self.archive)[0],
+                         os.path.join(self.archive, "new.py"))
+        self.assertEqual(self.index.lookup("mod", self.archive), None)
+
+class DirectoryLookupTest(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.dirname, "both"))
+        for name in ["both.py", os.path.join("both", "__init__.py"), "mod.py",
+                     "mod" + EXTENSION]:
+            open(os.path.join(self.dirname, name), "w").close()
+        os.mkdir(os.path.join(self.dirname, "notapackage"))
+        self.index = pathindex.PathIndex()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_order(self):
+        # a package comes before a module, and the suffixes come in the
+        # order imp.get_suffixes() returns them
+        self.assertEqual(self.index.lookup("both", self.dirname)[1][2], imp.PKG_DIRECTORY)
+        fp, pathname, desc = imp.find_module("mod", [self.dirname])
+        fp.close()
+        self.assertEqual(self.index.lookup("mod", self.dirname), (pathname, desc))
+        self.assertEqual(self.index.lookup("notapackage", self.dirname), None)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""Tests for py2exe.streamzip."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import warnings
+import zipfile
+from distutils.dist import Distribution
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from py2exe import mf, streamzip
+from py2exe.build_exe import py2exe
+from py2exe.hooks import HookRegistry
+
+class StreamTest(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.lib = os.path.join(self.dirname, "lib")
+        os.mkdir(self.lib)
+        self.hook_dir = os.path.join(self.dirname, "hooks")
+        os.mkdir(self.hook_dir)
+        self.filename = os.path.join(self.dirname, "library.zip")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write(self, pathname, source):
+        if not os.path.isdir(os.path.dirname(pathname)):
+            os.makedirs(os.path.dirname(pathname))
+        f = open(pathname, "w")
+        f.write(source)
+        f.close()
+
+    def stream(self, script):
+        # Run the analysis with the archive as listener, like the
+        # stream option does.
+        self.write(os.path.join(self.dirname, "app.py"), script)
+        finder = mf.ModuleFinder(path=[self.lib], hooks=HookRegistry([self.hook_dir]))
+        archive = streamzip.StreamingArchive(self.filename, get_code=finder.get_code)
+        finder.listener = archive.add_module
+        finder.run_script(os.path.join(self.dirname, "app.py"))
+        finder.close()
+        return finder, archive
+
+    def names(self):
+        z = zipfile.ZipFile(self.filename)
+        try:
+            names = z.namelist()
+        finally:
+            z.close()
+        names.sort()
+        return names
+
+    def test_streamed(self):
+        self.write(os.path.join(self.lib, "a.py"), "import pkg.sub\n")
+        self.write(os.path.join(self.lib, "pkg", "__init__.py"), "")
+        self.write(os.path.join(self.lib, "pkg", "sub.py"), "")
+        finder, archive = self.stream("import a\n")
+        archive.add_data("extra.txt", "data")
+        archive.close()
+        self.assertEqual(self.names(), ["a.pyc", "extra.txt", "pkg\\__init__.pyc",
+                                        "pkg\\sub.pyc"])
+        self.assertEqual(sorted(archive.sizes),
+                         ["a.pyc", "extra.txt", "pkg\\__init__.pyc", "pkg\\sub.pyc"])
+
+    def test_hook_excludes(self):
+        # big is streamed before the hook of a, which excludes it, is
+        # loaded; the build removes it from the archive again
+        self.write(os.path.join(self.lib, "big", "__init__.py"), "import big.sub\n")
+        self.write(os.path.join(self.lib, "big", "sub.py"), "")
+        self.write(os.path.join(self.lib, "a.py"), "")
+        self.write(os.path.join(self.hook_dir, "hook-a.py"), "excludes = ['big']\n")
+        finder, archive = self.stream("import big\nimport a\n")
+        self.assertEqual(sorted(archive.modules), ["a", "big", "big.sub"])
+        cmd = py2exe(Distribution())
+        cmd.verbose = 0
+        cmd.stream_archive = archive
+        cmd.apply_hook_excludes(finder)
+        archive.close()
+        self.assertEqual(self.names(), ["a.pyc"])
+        self.assertEqual(archive.sizes.keys(), ["a.pyc"])
+        self.assertEqual(archive.modules.keys(), ["a"])
+
+    def test_removed_and_found_again(self):
+        self.write(os.path.join(self.lib, "a.py"), "")
+        finder, archive = self.stream("import a\n")
+        self.assertEqual(archive.remove_modules(["a", "other"]), ["a"])
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", "Duplicate name")
+            archive.add_module(finder.modules["a"])
+            archive.close()
+        self.assertEqual(self.names(), ["a.pyc"])
+
+    def test_rewrite_archive(self):
+        z = zipfile.ZipFile(self.filename, "w")
+        z.writestr("a.pyc", "old")
+        z.writestr("pkg\\b.pyc", "b")
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", "Duplicate name")
+            z.writestr("a.pyc", "new")
+        z.close()
+        self.assert_(streamzip.rewrite_archive(self.filename, set(["pkg/b.pyc"])) > 0)
+        self.assertEqual(self.names(), ["a.pyc"])
+        self.assertEqual(zipfile.ZipFile(self.filename).read("a.pyc"), "new")
+
+if __name__ == "__main__":
+    unittest.main()